@@ -0,0 +1,49 @@
+"""unique picture link
+
+Revision ID: 9b1f4c2e7a31
+Revises: 6cfc1ac9d42c
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1f4c2e7a31'
+down_revision: Union[str, None] = '6cfc1ac9d42c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # seed_pictures.py relies on ON CONFLICT (link); keep the lowest id of
+    # any link that an older seeder inserted twice. Challenges name their
+    # pictures by id, so point them at the kept id before deleting.
+    op.execute(
+        """
+        WITH duplicates AS (
+            SELECT p.pictureid AS old_id, min(q.pictureid) AS new_id
+            FROM pictures p
+            JOIN pictures q ON q.link = p.link AND q.pictureid < p.pictureid
+            GROUP BY p.pictureid
+        )
+        UPDATE challenges c SET versuslist = (
+            SELECT array_agg(coalesce(d.new_id, v.id) ORDER BY v.ord)
+            FROM unnest(c.versuslist) WITH ORDINALITY AS v(id, ord)
+            LEFT JOIN duplicates d ON d.old_id = v.id
+        )
+        WHERE c.versuslist && (SELECT array_agg(old_id) FROM duplicates)
+        """
+    )
+    op.execute(
+        "DELETE FROM pictures p USING pictures q "
+        "WHERE p.link = q.link AND p.pictureid > q.pictureid"
+    )
+    op.create_unique_constraint('pictures_link_key', 'pictures', ['link'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('pictures_link_key', 'pictures', type_='unique')
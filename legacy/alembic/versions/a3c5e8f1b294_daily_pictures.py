@@ -0,0 +1,33 @@
+"""daily pictures
+
+Revision ID: a3c5e8f1b294
+Revises: f2b6c9d4a107
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e8f1b294'
+down_revision: Union[str, None] = 'f2b6c9d4a107'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # one row per day, written the first time the day's picture is asked
+    # for, so syncing the catalog mid-day keeps today's picture
+    op.create_table(
+        'daily_pictures',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('pictureid', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('date'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_pictures')
@@ -0,0 +1,32 @@
+"""picture sync columns
+
+Revision ID: c4d8e2a6f915
+Revises: 9b1f4c2e7a31
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2a6f915'
+down_revision: Union[str, None] = '9b1f4c2e7a31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # checksum stays NULL until the first sync, which then rewrites every
+    # row once from its current Cloudinary metadata
+    op.add_column('pictures', sa.Column('checksum', sa.String(length=40), nullable=True))
+    op.add_column('pictures', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('pictures', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('pictures', 'deleted_at')
+    op.drop_column('pictures', 'updated_at')
+    op.drop_column('pictures', 'checksum')
@@ -0,0 +1,33 @@
+"""user seen pictures
+
+Revision ID: e7a3f0b5d218
+Revises: c4d8e2a6f915
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3f0b5d218'
+down_revision: Union[str, None] = 'c4d8e2a6f915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # one bitmap per user, one bit per picture id: about 12 kB for a
+    # 100k picture catalog, however many rounds were played
+    op.create_table(
+        'user_seen_pictures',
+        sa.Column('username', sa.String(length=255), nullable=False),
+        sa.Column('seen', sa.LargeBinary(), nullable=False, server_default=sa.text("''::bytea")),
+        sa.PrimaryKeyConstraint('username'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_seen_pictures')
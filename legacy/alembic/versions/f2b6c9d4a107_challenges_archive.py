@@ -0,0 +1,56 @@
+"""challenges archive
+
+Revision ID: f2b6c9d4a107
+Revises: e7a3f0b5d218
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6c9d4a107'
+down_revision: Union[str, None] = 'e7a3f0b5d218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows get the migration time, so they are archived by the
+    # first run after tomorrow's cutoff
+    op.add_column('challenges', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index('ix_challenges_challenger_id_id', 'challenges', ['challenger_id', 'id'])
+    op.create_index('ix_challenges_challengee_id_id', 'challenges', ['challengee_id', 'id'])
+    # the inbox joins each challenge to its match, and archiving deletes it
+    op.create_index('ix_matches_challenge_id', 'matches', ['challenge_id'])
+
+    op.create_table(
+        'challenges_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('challenger_id', sa.String(length=255), nullable=False),
+        sa.Column('challengee_id', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=255), nullable=False),
+        sa.Column('challenger_points', sa.Integer(), nullable=True),
+        sa.Column('challengee_points', sa.Integer(), nullable=True),
+        sa.Column('versuslist', postgresql.ARRAY(sa.Integer(), dimensions=1), nullable=True),
+        sa.Column('winner_id', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_challenges_archive_challenger_id_id', 'challenges_archive', ['challenger_id', 'id'])
+    op.create_index('ix_challenges_archive_challengee_id_id', 'challenges_archive', ['challengee_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_challenges_archive_challengee_id_id', table_name='challenges_archive')
+    op.drop_index('ix_challenges_archive_challenger_id_id', table_name='challenges_archive')
+    op.drop_table('challenges_archive')
+    op.drop_index('ix_matches_challenge_id', table_name='matches')
+    op.drop_index('ix_challenges_challengee_id_id', table_name='challenges')
+    op.drop_index('ix_challenges_challenger_id_id', table_name='challenges')
+    op.drop_column('challenges', 'created_at')
@@ -5,6 +5,10 @@
 # -----------------------------------------------------------------------
 
 # external libraries
+import time
+
+_started = time.perf_counter()
+
 import flask
 from flask import Flask
 import os
@@ -14,23 +18,59 @@ from sys import path
 # Tiger Spot files
 path.append("src")
 
-from db import get_session
+# the Databases modules import src.db; importing it under the same name
+# here avoids building a second engine and connection pool
+from src.db import engine, get_session, primary_reads
 from CAS import auth
 from Databases import challenges_database
-from Databases import matches_database
-from Databases import versus_database
 from Databases import pictures_database
 from Databases import user_database
 from Databases import daily_user_database
-from Databases import user_database
-import distance_func
-import points
+
+# imported through the src package so app.py and the Databases modules
+# share a single cache backend
+from src import assets
+from src import cache
+from src import compression
+from src import db
+from src import events
+from src import game
+from src import images
+from src import instrumentation
+from src.errors import DatabaseError
+from src import metrics
+from src import sessions
+from src import throttle
+from src import warmup
+from src import api
+
+_imported = time.perf_counter()
 
 # -----------------------------------------------------------------------
 
 dotenv.load_dotenv()
 app = Flask(__name__, template_folder="./templates", static_folder="./static")
 app.secret_key = os.environ["APP_SECRET_KEY"]
+sessions.init_app(app)
+db.init_app(app)
+compression.init_app(app)
+instrumentation.init_app(app)
+metrics.init_app(app, engine)
+images.init_app(app)
+assets.init_app(app)
+app.register_blueprint(api.blueprint)
+
+# compile every template now rather than on the first request each worker
+# serves; with gunicorn --preload this happens once, before forking
+warmup.configure_bytecode_cache(app)
+_template_timings = warmup.precompile_templates(app)
+warmup.report(
+    [
+        ("imports", _imported - _started),
+        ("templates", time.perf_counter() - _imported),
+    ],
+    _template_timings,
+)
 
 # -----------------------------------------------------------------------
 
@@ -41,11 +81,47 @@ app.secret_key = os.environ["APP_SECRET_KEY"]
 
 
 # For error handling
-# checks if a function call had a database error based on function's return value
-def database_check(list):
-    if "database error" in list:
-        return False
-    return True
+# any DatabaseError raised by the Databases modules ends up here; the
+# details have already been logged by errors.database_operation
+@app.errorhandler(DatabaseError)
+def database_error(error):
+    metrics.DATABASE_ERRORS.inc(endpoint=flask.request.endpoint)
+    html_code = flask.render_template("contact_admin.html")
+    return flask.make_response(html_code, 500)
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns a score-derived value from the shared cache. Misses are read
+# from the primary: every user is served the cached copy, so it must not
+# come from a replica that has not seen the latest submission yet.
+def cached_scores(name, fn, tags=(), **inputs):
+    with primary_reads():
+        return cache.cached_value(name, fn, tags=("scores",) + tags, **inputs)
+
+
+# Returns username's points, ranks and streak as the leaderboard pages
+# show them. Cached with the boards until the next score change, by date
+# so the daily figures start over at midnight, and under the user's own
+# tag, which /menu invalidates when it resets their daily row.
+def player_standing(username):
+    def load():
+        return {
+            "points": user_database.get_points(username),
+            "daily_points": daily_user_database.get_daily_points(username),
+            "rank": user_database.get_rank(username),
+            "daily_rank": daily_user_database.get_daily_rank(username),
+            "streak": daily_user_database.get_streak(username),
+        }
+
+    return cached_scores(
+        "player_standing",
+        load,
+        tags=("player:" + username,),
+        username=username,
+        date=pictures_database.get_current_date(),
+    )
 
 
 # -----------------------------------------------------------------------
@@ -67,10 +143,7 @@ def logoutcas():
 @app.route("/", methods=["GET"])
 @app.route("/index", methods=["GET"])
 def index():
-
-    html_code = flask.render_template("index.html")
-    response = flask.make_response(html_code)
-    return response
+    return cache.render_cached("index.html")
 
 
 # -----------------------------------------------------------------------
@@ -80,24 +153,21 @@ def index():
 @app.route("/menu", methods=["GET"])
 def menu():
     username = auth.authenticate()
-    user_insert = user_database.insert_player(username)
-    daily_insert = daily_user_database.insert_player_daily(username)
-    played_date = daily_user_database.get_last_played_date(username)
     current_date = pictures_database.get_current_date()
 
-    check = database_check([user_insert, daily_insert, played_date, current_date])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    # the rows only need creating once; after that, skip the round trip
+    # for the rest of the day
+    if flask.session.get("player_ensured") != current_date.isoformat():
+        user_database.ensure_player(username)
+        flask.session["player_ensured"] = current_date.isoformat()
+
+    played_date = daily_user_database.get_last_played_date(username)
 
     if played_date != current_date:
-        reset = daily_user_database.reset_player(username)
-        user_played = daily_user_database.player_played(username)
-        id = pictures_database.pic_of_day()
-        check = database_check([reset, user_played, id])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
+        daily_user_database.reset_player(username)
+        cache.invalidate("player:" + username)
+        daily_user_database.player_played(username)
+        pictures_database.pic_of_day()
 
     html_code = flask.render_template("menu.html", username=username)
     response = flask.make_response(html_code)
@@ -112,36 +182,21 @@ def menu():
 def requests():
     username = flask.request.args.get("username")
     username_auth = auth.authenticate()
-    last_date = daily_user_database.get_last_versus_date(username_auth)
-    current_date = pictures_database.get_current_date()
+    # older challenges are moved to the archive by archive_challenges.py
+    before = flask.request.args.get("before", type=int)
 
-    check = database_check([last_date, current_date])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-
-    if last_date != current_date:
-        clear = challenges_database.clear_user_challenges(username_auth)
-        update = daily_user_database.update_player_versus(username_auth)
-        check = database_check([clear, update])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
-
-    pending_challenges = challenges_database.get_user_challenges(username_auth)
+    pending_challenges = challenges_database.get_user_challenges(
+        username_auth, before=before
+    )
     users = user_database.get_players()
 
-    check = database_check([pending_challenges, users])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "Versus/challenges.html",
-            challenges=pending_challenges,
-            user=username_auth,
-            users=flask.json.dumps(users),
-            username=username,
-        )
+    html_code = flask.render_template(
+        "Versus/challenges.html",
+        challenges=pending_challenges,
+        user=username_auth,
+        users=flask.json.dumps(users),
+        username=username,
+    )
 
     response = flask.make_response(html_code)
     return response
@@ -153,38 +208,23 @@ def requests():
 # if there are no errors, loads the daily game
 # or if user has already played today's game, loads a page stating their points and distance between their guess and correct location
 @app.route("/game", methods=["GET"])
-def game():
-
-    id = pictures_database.pic_of_day()
-
+def game_page():
     username = auth.authenticate()
+    state = game.daily_state(username)
 
-    user_played = daily_user_database.player_played(username)
-    today_points = daily_user_database.get_daily_points(username)
-    today_distance = daily_user_database.get_daily_distance(username)
-
-    check = database_check([user_played, today_points, today_distance])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-
-    if user_played:
+    if state["played"]:
         html_code = flask.render_template(
             "alrplayed.html",
             username=username,
-            today_points=today_points,
-            today_distance=today_distance,
+            today_points=state["points"],
+            today_distance=state["distance"],
         )
         response = flask.make_response(html_code)
         return response
 
-    link = pictures_database.get_pic_info("link", id)
-
-    check = database_check([link])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template("gamepage.html", link=link, id=id)
+    html_code = flask.render_template(
+        "gamepage.html", link=state["link"], id=state["pictureid"]
+    )
 
     response = flask.make_response(html_code)
     return response
@@ -196,61 +236,43 @@ def game():
 # if there are no errors with database, calculates distance and points and updates usersDaily table with points and adds today's points to total points column in users table
 # Then loads the results page which displays the correct location, the distance from guess to acutal location, points earned, place where picture was taken
 @app.route("/submit", methods=["POST"])
+@throttle.rate_limited("daily")
 def submit():
-    id = pictures_database.pic_of_day()
     username = auth.authenticate()
 
-    user_played = daily_user_database.player_played(username)
-    today_points = daily_user_database.get_daily_points(username)
-    today_distance = daily_user_database.get_daily_distance(username)
+    # get user input using flask.request.args.get('')
+    # once user clicks submit then get coordinates
+    currLat = flask.request.form.get("currLat")  # Use .get for safe retrieval
+    currLon = flask.request.form.get("currLon")
 
-    check = database_check([user_played, today_points, today_distance])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    result = None
+    if currLat and currLon:
+        result = game.submit_daily(username, currLat, currLon)
 
-    if user_played:
+    if result is None:
+        state = game.daily_state(username)
+        if not state["played"]:
+            return flask.redirect(flask.url_for("game_page"))
         html_code = flask.render_template(
             "alrplayed.html",
             username=username,
-            today_points=today_points,
-            today_distance=today_distance,
+            today_points=state["points"],
+            today_distance=state["distance"],
         )
         response = flask.make_response(html_code)
         return response
 
-    # get user input using flask.request.args.get('')
-    # once user clicks submit then get coordinates
-    currLat = flask.request.form.get("currLat")  # Use .get for safe retrieval
-    currLon = flask.request.form.get("currLon")
-    if not currLat or not currLon:
-        return
-
-    coor = pictures_database.get_pic_info("coordinates", id)
-    place = pictures_database.get_pic_info("place", id)
-    distance = distance_func.calc_distance(currLat, currLon, coor)
-    today_points = points.calculate_today_points(distance)
-    total_points = points.calculate_total_points(username, today_points)
-    update = user_database.update_player(username, total_points)
-    daily_update = daily_user_database.update_player_daily(
-        username, today_points, distance
+    html_code = flask.render_template(
+        "results.html",
+        dis=result["distance"],
+        lat=currLat,
+        lon=currLon,
+        coor=result["coordinates"],
+        today_points=result["points"],
+        place=result["place"],
+        today_distance=result["distance"],
     )
 
-    check = database_check([coor, place, update, daily_update])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "results.html",
-            dis=distance,
-            lat=currLat,
-            lon=currLon,
-            coor=coor,
-            today_points=today_points,
-            place=place,
-            today_distance=distance,
-        )
-
     response = flask.make_response(html_code)
     return response
 
@@ -263,9 +285,7 @@ def submit():
 def rules():
     # user must be logged in to access page
     auth.authenticate()
-    html_code = flask.render_template("rules.html")
-    response = flask.make_response(html_code)
-    return response
+    return cache.render_cached("rules.html")
 
 
 # -----------------------------------------------------------------------
@@ -275,12 +295,7 @@ def rules():
 @app.route("/congrats", methods=["GET"])
 def congrats():
     username = auth.authenticate()
-    top_player = user_database.get_top_player()
-
-    check = database_check([top_player])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    top_player = cached_scores("top_player", user_database.get_top_player)
 
     top_player_username = top_player["username"]
 
@@ -295,11 +310,8 @@ def congrats():
         or username == "jy3107"
         or username == "ed8205"
     ):
-        html_code = flask.render_template("congrats.html")
-    else:
-        html_code = flask.render_template("secret.html")
-    response = flask.make_response(html_code)
-    return response
+        return cache.render_cached("congrats.html")
+    return cache.render_cached("secret.html")
 
 
 # -----------------------------------------------------------------------
@@ -310,20 +322,16 @@ def congrats():
 def team():
     # user must be logged in to access page
     username = auth.authenticate()
-    top_player = user_database.get_top_player()
-
-    check = database_check([top_player])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    top_player = cached_scores("top_player", user_database.get_top_player)
 
     top_player_username = top_player["username"]
 
-    html_code = flask.render_template(
-        "team.html", username=username, top_player_username=top_player_username
+    return cache.render_cached(
+        "team.html",
+        tags=("scores",),
+        username=username,
+        top_player_username=top_player_username,
     )
-    response = flask.make_response(html_code)
-    return response
 
 
 # -----------------------------------------------------------------------
@@ -332,33 +340,15 @@ def team():
 # Displays the leaderboard for overall points
 @app.route("/totalboard", methods=["GET"])
 def leaderboard():
-    top_players = user_database.get_top_players()
+    top_players = cached_scores("top_players", user_database.get_top_players)
     username = auth.authenticate()
-    points = user_database.get_points(username)
-    daily_points = daily_user_database.get_daily_points(username)
-    rank = user_database.get_rank(username)
-    daily_rank = daily_user_database.get_daily_rank(username)
-    streak = daily_user_database.get_streak(username)
-
-    check = database_check(
-        [top_players, points, daily_points, rank, daily_rank, streak]
-    )
 
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "totalboard.html",
-            top_players=top_players,
-            points=points,
-            daily_points=daily_points,
-            rank=rank,
-            daily_rank=daily_rank,
-            streak=streak,
-        )
-
-    response = flask.make_response(html_code)
-    return response
+    return cache.render_cached(
+        "totalboard.html",
+        tags=("scores",),
+        top_players=top_players,
+        **player_standing(username),
+    )
 
 
 # -----------------------------------------------------------------------
@@ -367,32 +357,20 @@ def leaderboard():
 # Displays the leaderboard for today's daily game points
 @app.route("/leaderboard", methods=["GET"])
 def totalleaderboard():
-    top_players = daily_user_database.get_daily_top_players()
-    username = auth.authenticate()
-    points = user_database.get_points(username)
-    daily_points = daily_user_database.get_daily_points(username)
-    rank = user_database.get_rank(username)
-    daily_rank = daily_user_database.get_daily_rank(username)
-    streak = daily_user_database.get_streak(username)
-
-    check = database_check(
-        [top_players, points, daily_points, rank, daily_rank, streak]
+    # keyed by date as well so yesterday's board is not served after midnight
+    top_players = cached_scores(
+        "daily_top_players",
+        daily_user_database.get_daily_top_players,
+        date=pictures_database.get_current_date(),
     )
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "leaderboard.html",
-            top_players=top_players,
-            points=points,
-            daily_points=daily_points,
-            rank=rank,
-            daily_rank=daily_rank,
-            streak=streak,
-        )
+    username = auth.authenticate()
 
-    response = flask.make_response(html_code)
-    return response
+    return cache.render_cached(
+        "leaderboard.html",
+        tags=("scores",),
+        top_players=top_players,
+        **player_standing(username),
+    )
 
 
 # -----------------------------------------------------------------------
@@ -404,13 +382,9 @@ def versus_func():
     users = user_database.get_players()
     username = flask.request.args.get("username")
 
-    check = database_check([users])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "Versus/challenges.html", users=flask.json.dumps(users), username=username
-        )
+    html_code = flask.render_template(
+        "Versus/challenges.html", users=flask.json.dumps(users), username=username
+    )
 
     response = flask.make_response(html_code)
     return response
@@ -425,11 +399,6 @@ def create_challenge_route():
     challengee_id = flask.request.form["challengee_id"].strip()  # Trim whitespace
     users = user_database.get_players()
 
-    check = database_check([users])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-
     # Ensure challengee_id is not empty and exists in the users list
     if (
         challengee_id == None
@@ -445,11 +414,7 @@ def create_challenge_route():
         result = challenges_database.create_challenge(
             auth.authenticate(), challengee_id
         )
-
-    check = database_check([result])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+        db.note_write()
 
     # Handle the response from the database function
     if "error" in result:
@@ -477,11 +442,7 @@ def accept_challenge_route():
     result = challenges_database.accept_challenge(
         challenge_id
     )  # Returns whether or not challenge acceptance was successful
-
-    check = database_check([result])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    db.note_write()
 
     if result == "accepted":
         flask.flash("Challenge accepted successfully.")
@@ -500,11 +461,7 @@ def accept_challenge_route():
 def decline_challenge_route():
     challenge_id = flask.request.form.get("challenge_id")
     result = challenges_database.decline_challenge(challenge_id)
-
-    check = database_check([result])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
+    db.note_write()
 
     if result == "declined":
         flask.flash("Challenge declined successfully.")
@@ -522,49 +479,10 @@ def decline_challenge_route():
 def play_button():
     challenge_id = flask.request.form.get("challenge_id")
     user = auth.authenticate()
-    status = challenges_database.get_playbutton_status(challenge_id, user)
-    check = database_check([status])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if status is None:
-        return flask.redirect(flask.url_for("requests"))
-    elif status is False:
-        button = challenges_database.update_playbutton_status(challenge_id, user)
-        check = database_check([button])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
+    if game.start_challenge(challenge_id, user) == "started":
         flask.session["challenge_id"] = challenge_id
         return flask.redirect(flask.url_for("play_button2"))
-    elif status is True:
-        for i in range(5):
-            pic = versus_database.update_versus_pic_status(challenge_id, user, i + 1)
-            check = database_check([pic])
-            if check is False:
-                html_code = flask.render_template("contact_admin.html")
-                return flask.make_response(html_code)
-        update = challenges_database.update_finish_status(challenge_id, user)
-        status = challenges_database.check_finish_status(challenge_id)
-        check = database_check([update, status])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
-        if status["status"] == "finished":
-            result = challenges_database.get_challenge_results(challenge_id)
-            complete = matches_database.complete_match(
-                challenge_id,
-                result["winner"],
-                result["challenger_points"],
-                result["challengee_points"],
-            )
-            check = database_check([status, complete])
-            if check is False:
-                html_code = flask.render_template("contact_admin.html")
-                return flask.make_response(html_code)
-            return flask.redirect(flask.url_for("requests"))
-        else:
-            return flask.redirect(flask.url_for("requests"))
+    return flask.redirect(flask.url_for("requests"))
 
 
 # -----------------------------------------------------------------------
@@ -595,28 +513,18 @@ def next_challenge():
 # Handles game page functionality of versus mode
 @app.route("/start_challenge", methods=["GET", "POST"])
 def start_challenge(challenge_id=None, index=None):
-    versusList = challenges_database.get_random_versus(challenge_id)
-    check = database_check([versusList])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if versusList is None:
+    pictures = game.versus_pictures(challenge_id)
+    if pictures is None:
         return flask.redirect(flask.url_for("requests"))
     index = int(index)
-    if index < len(versusList):
-        link = pictures_database.get_pic_info("link", versusList[index])
-        
-        # Fallback if link is None (e.g. invalid picture ID from old challenge)
-        if link is None:
-            print(f"Warning: Image link not found for ID {versusList[index]}. Using fallback.")
-            link = pictures_database.get_pic_info("link", 1)
-
-        check = database_check([link])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
+    if index < len(pictures):
+        links = [picture["link"] for picture in pictures]
         html_code = flask.render_template(
-            "Versus/versusgame.html", challenge_id=challenge_id, index=index, link=link
+            "Versus/versusgame.html",
+            challenge_id=challenge_id,
+            index=index,
+            link=links[index],
+            links=links,
         )
 
         return flask.make_response(html_code)
@@ -632,33 +540,8 @@ def start_challenge(challenge_id=None, index=None):
 def end_challenge():
     challenge_id = flask.request.form.get("challenge_id")
     user = auth.authenticate()
-    finish = challenges_database.update_finish_status(challenge_id, user)
-    check = database_check([finish])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if finish is None:
-        return flask.redirect(flask.url_for("requests"))
-    status = challenges_database.check_finish_status(challenge_id)
-    check = database_check([status])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if status["status"] == "finished":
-        result = challenges_database.get_challenge_results(challenge_id)
-        complete = matches_database.complete_match(
-            challenge_id,
-            result["winner"],
-            result["challenger_points"],
-            result["challengee_points"],
-        )
-        check = database_check([result, complete])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
-        return flask.redirect(flask.url_for("requests"))
-    else:
-        return flask.redirect(flask.url_for("requests"))
+    game.finish_challenge(challenge_id, user)
+    return flask.redirect(flask.url_for("requests"))
 
 
 # -----------------------------------------------------------------------
@@ -666,121 +549,84 @@ def end_challenge():
 
 # Handles the submission of a versus mode game, updating tables accordingly
 @app.route("/submit2", methods=["POST"])
+@throttle.rate_limited("round")
 def submit2():
     currLat = flask.request.form.get("currLat")
     currLon = flask.request.form.get("currLon")
-    points = 0
     index = int(flask.request.form.get("index"))
     challenge_id = flask.request.form.get("challenge_id")
-    versusList = challenges_database.get_random_versus(challenge_id)
-    coor = pictures_database.get_pic_info("coordinates", versusList[index])
-    place = pictures_database.get_pic_info("place", versusList[index])
-    
-    # Fallback if coor/place is None
-    if coor is None or place is None:
-        print(f"Warning: Coordinates/Place not found for ID {versusList[index]}. Using fallback.")
-        coor = pictures_database.get_pic_info("coordinates", 1)
-        place = pictures_database.get_pic_info("place", 1)
-
-    check = database_check([versusList, coor, place])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if not currLat or not currLon:
-        pic_status = versus_database.get_versus_pic_status(
-            challenge_id, auth.authenticate(), index + 1
-        )
-        check = database_check([pic_status])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
-        if pic_status is None:
-            return flask.redirect(flask.url_for("requests"))
-        if pic_status is False:
-            fin1 = versus_database.update_versus_pic_status(
-                challenge_id, auth.authenticate(), index + 1
-            )
-            if fin1 is None:
-                return flask.redirect(flask.url_for("requests"))
-            fin2 = versus_database.store_versus_pic_points(
-                challenge_id, auth.authenticate(), index + 1, points
-            )
-            if fin2 is None:
-                return flask.redirect(flask.url_for("requests"))
-            fin3 = versus_database.update_versus_points(
-                challenge_id, auth.authenticate(), points
-            )
-            if fin3 is None:
-                return flask.redirect(flask.url_for("requests"))
-            check = database_check([fin1, fin2, fin3])
-            if check is False:
-                html_code = flask.render_template("contact_admin.html")
-                return flask.make_response(html_code)
-        else:
-            points = "Already submitted."
-        index = int(index) + 1
-        html_code = flask.render_template(
-            "Versus/versusresults.html",
-            dis="No Submission",
-            lat=None,
-            lon=None,
-            coor=coor,
-            index=index,
-            challenge_id=challenge_id,
-            points=str(points),
-            place=place,
-        )
-        response = flask.make_response(html_code)
-        return response
-
-    time = int(flask.request.form.get("time"))
-    if versusList is None:
-        return flask.redirect(flask.url_for("requests"))
-    distance = round(distance_func.calc_distance(currLat, currLon, coor))
-    pic_status = versus_database.get_versus_pic_status(
-        challenge_id, auth.authenticate(), index + 1
+    result = game.submit_round(
+        auth.authenticate(),
+        challenge_id,
+        index,
+        currLat,
+        currLon,
+        flask.request.form.get("time"),
     )
-    check = database_check([pic_status])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-        return flask.make_response(html_code)
-    if pic_status is None:
+    if result is None:
         return flask.redirect(flask.url_for("requests"))
-    if pic_status is False:
-        points = round(versus_database.calculate_versus(distance, time))
-        fin1 = versus_database.store_versus_pic_points(
-            challenge_id, auth.authenticate(), index + 1, points
-        )
-        if fin1 is None:
-            return flask.redirect(flask.url_for("requests"))
-        fin2 = versus_database.update_versus_points(
-            challenge_id, auth.authenticate(), points
-        )
-        if fin2 is None:
-            return flask.redirect(flask.url_for("requests"))
-        fin3 = versus_database.update_versus_pic_status(
-            challenge_id, auth.authenticate(), index + 1
-        )
-        if fin3 is None:
-            return flask.redirect(flask.url_for("requests"))
-        check = database_check([fin1, fin2, fin3])
-        if check is False:
-            html_code = flask.render_template("contact_admin.html")
-            return flask.make_response(html_code)
-    else:
+
+    if result["already_submitted"]:
         points = "Already submitted."
-    index = int(index) + 1
+    else:
+        points = result["points"]
+    guessed = result["distance"] is not None
     html_code = flask.render_template(
         "Versus/versusresults.html",
-        dis=distance,
-        lat=currLat,
-        lon=currLon,
-        coor=coor,
-        index=index,
+        dis=result["distance"] if guessed else "No Submission",
+        lat=currLat if guessed else None,
+        lon=currLon if guessed else None,
+        coor=result["coordinates"],
+        index=index + 1,
         challenge_id=challenge_id,
         points=str(points),
-        place=place,
+        place=result["place"],
+    )
+    response = flask.make_response(html_code)
+    return response
+
+
+# -----------------------------------------------------------------------
+
+
+# Streams the user's challenge changes as server-sent events, so the
+# challenges page updates without polling /requests
+@app.route("/events", methods=["GET"])
+def challenge_events():
+    username = auth.authenticate()
+    subscriber = events.subscribe(username)
+    if subscriber is None:
+        # every stream slot in this worker is taken; the page retries later
+        return flask.Response(status=503, headers={"Retry-After": "30"})
+
+    response = flask.Response(
+        flask.stream_with_context(events.stream(username, subscriber)),
+        mimetype="text/event-stream",
     )
+    response.headers["Cache-Control"] = "no-cache"
+    # nginx and similar proxies would otherwise buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# -----------------------------------------------------------------------
+
+
+# Lists a page of the user's archived challenges, newest first
+@app.route("/history", methods=["GET"])
+def history():
+    username = auth.authenticate()
+    before = flask.request.args.get("before", type=int)
+    page = challenges_database.get_challenge_history(username, before=before)
+
+    html_code = flask.render_template(
+        "Versus/history.html",
+        history=page["challenges"],
+        next_before=page["next"],
+        first_page=before is None,
+        user=username,
+    )
+
     response = flask.make_response(html_code)
     return response
 
@@ -793,16 +639,13 @@ def submit2():
 def versus_stats():
     challenge_id = flask.request.form.get("challenge_id")
     results = challenges_database.get_challenge_results(challenge_id)
-    versusList = challenges_database.get_random_versus(challenge_id)
-    pictures = [pictures_database.get_pic_info("link", pic) for pic in versusList]
+    pictures = game.versus_pictures(challenge_id) or []
 
-    check = database_check([results, versusList, pictures])
-    if check is False:
-        html_code = flask.render_template("contact_admin.html")
-    else:
-        html_code = flask.render_template(
-            "Versus/versus_stats.html", results=results, images=pictures
-        )
+    html_code = flask.render_template(
+        "Versus/versus_stats.html",
+        results=results,
+        images=[picture["link"] for picture in pictures],
+    )
 
     response = flask.make_response(html_code)
     return response
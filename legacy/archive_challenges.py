@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# archive_challenges.py
+# Move old challenges and their match results into challenges_archive,
+# a batch at a time, so the active tables only hold recent challenges.
+# Completed and declined challenges go after --hours; pending and
+# accepted ones are still being played and only go after --stale-days.
+#
+# Usage (run hourly by scheduler.py, the Procfile's clock process):
+#   python archive_challenges.py
+#   python archive_challenges.py --hours 48 --batch-size 200 --pause 0.5
+# -----------------------------------------------------------------------
+
+import argparse
+import datetime
+import time
+
+from src.Databases.challenges_database import ARCHIVE_BATCH, archive_challenges
+from src.errors import DatabaseError
+
+# days a pending or accepted challenge may stay open before it is
+# archived unfinished
+STALE_DAYS = 7
+
+# -----------------------------------------------------------------------
+
+
+# Archives every finished challenge created more than hours ago, and
+# every unfinished one created more than stale_days ago, and returns how
+# many were moved. Each batch is its own short transaction, with a pause
+# in between so player requests are never queued behind the job.
+def archive(hours=24, stale_days=STALE_DAYS, batch_size=ARCHIVE_BATCH, pause=0.1):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(hours=hours)
+    stale_cutoff = now - datetime.timedelta(days=stale_days)
+    print(f"Archiving finished challenges created before {cutoff:%Y-%m-%d %H:%M} UTC")
+    print(f"  and unfinished ones created before {stale_cutoff:%Y-%m-%d %H:%M} UTC")
+
+    total = 0
+    batches = 0
+    while True:
+        moved = archive_challenges(cutoff, stale_cutoff, batch_size)
+        if moved == 0:
+            break
+        total += moved
+        batches += 1
+        print(f"  Batch {batches}: {moved} challenge(s)")
+        time.sleep(pause)
+
+    print(f"\nArchive complete!")
+    print(f"  Challenges archived: {total}")
+    print(f"  Batches: {batches}")
+
+    return total
+
+
+# -----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old challenges.")
+    parser.add_argument(
+        "--hours",
+        type=float,
+        default=24,
+        help="archive finished challenges created more than this many hours ago",
+    )
+    parser.add_argument(
+        "--stale-days",
+        type=float,
+        default=STALE_DAYS,
+        help="archive unfinished challenges created more than this many days ago",
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument(
+        "--pause", type=float, default=0.1, help="seconds to wait between batches"
+    )
+    args = parser.parse_args()
+
+    try:
+        archive(args.hours, args.stale_days, args.batch_size, args.pause)
+    except DatabaseError as error:
+        print(f"✗ Archiving failed: {error}")
+        raise SystemExit(1)
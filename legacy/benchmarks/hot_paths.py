@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# hot_paths.py
+# Times the scoring functions, the busiest database helpers and every
+# page's full request cycle through Flask's test client, against a
+# database seeded with 10k and 100k synthetic users. Each run is
+# appended to hot_paths_history.jsonl and compared with the last run at
+# the same size, so a regression shows up as a change in the delta
+# column (or a failure with --check).
+#
+# The synthetic rows are committed, because the routes open their own
+# sessions, and are deleted again when the run ends. Use a scratch
+# database: usernames starting with "bench_" and pictures linked as
+# "bench://" are removed.
+#
+# Usage (from legacy/, with DATABASE_URL pointing at a scratch database):
+#   python benchmarks/hot_paths.py
+#   python benchmarks/hot_paths.py --users 10000 --runs 50 --check
+# -----------------------------------------------------------------------
+
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+LEGACY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEGACY_DIR)
+sys.path.append(os.path.join(LEGACY_DIR, "src"))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+# the same module names app.py and src/game.py import
+import distance_func  # noqa: E402
+import points  # noqa: E402
+from app import app  # noqa: E402
+from Databases import challenges_database, user_database  # noqa: E402
+from Databases import versus_database  # noqa: E402
+from src import cache, instrumentation  # noqa: E402
+from src.db import get_session  # noqa: E402
+from src.models import Challenge, Match, Picture, SeenPictures, User, UserDaily  # noqa: E402
+
+HISTORY_FILE = os.path.join(LEGACY_DIR, "benchmarks", "hot_paths_history.jsonl")
+
+# a median this much slower than the previous run's is a regression
+TOLERANCE = 0.25
+
+# the player whose inbox and rank are measured; they have INBOX_SIZE
+# challenges, on top of the two every synthetic user takes part in
+PLAYER = "bench_player"
+INBOX_SIZE = 200
+
+# roughly the campus bounds used by the game map
+LAT_RANGE = (40.3395, 40.3524)
+LON_RANGE = (-74.6621, -74.6501)
+
+BATCH = 5000
+
+# pages read with the session of PLAYER
+GET_ROUTES = [
+    "/",
+    "/menu",
+    "/rules",
+    "/team",
+    "/leaderboard",
+    "/totalboard",
+    "/requests",
+    "/history",
+    "/game",
+    "/versus",
+    "/health",
+    "/api/v1/daily",
+]
+
+# -----------------------------------------------------------------------
+
+
+def bench_name(i):
+    return f"bench_{i:06d}"
+
+
+def random_guess(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+
+
+# Inserts rows into model's table BATCH rows at a time
+def insert_rows(session, model, rows):
+    for start in range(0, len(rows), BATCH):
+        session.execute(insert(model), rows[start : start + BATCH])
+
+
+# Returns five live picture ids, adding synthetic pictures when the
+# catalog is too small to build a challenge
+def ensure_pictures(session):
+    ids = session.scalars(
+        select(Picture.pictureid).where(Picture.deleted_at.is_(None)).limit(5)
+    ).all()
+    if len(ids) == 5:
+        return ids
+    next_id = session.scalar(select(func.coalesce(func.max(Picture.pictureid), 0))) + 1
+    rows = [
+        {
+            "pictureid": next_id + i,
+            "coordinates": [40.34, -74.65],
+            "link": f"bench://{next_id + i}",
+            "place": "Benchmark",
+        }
+        for i in range(100)
+    ]
+    insert_rows(session, Picture, rows)
+    return ids + [row["pictureid"] for row in rows][: 5 - len(ids)]
+
+
+# Returns accepted challenges from challenger to each challengee, ready
+# to play, as a list of ids
+def add_challenges(session, pairs, versuslist):
+    rows = [
+        {
+            "challenger_id": challenger,
+            "challengee_id": challengee,
+            "status": "accepted",
+            "versuslist": versuslist,
+            "playger_button_status": True,
+            "playgee_button_status": True,
+        }
+        for challenger, challengee in pairs
+    ]
+    ids = []
+    for start in range(0, len(rows), BATCH):
+        ids += session.scalars(
+            insert(Challenge).returning(Challenge.id), rows[start : start + BATCH]
+        ).all()
+    return ids
+
+
+# Grows the synthetic users from current to size: a total score, an
+# unplayed daily row and two challenges each. PLAYER and their inbox are
+# added with the first batch.
+def grow_users(session, current, size, versuslist):
+    rng = random.Random(size)
+    names = [bench_name(i) for i in range(current, size)]
+    if current == 0:
+        insert_rows(session, User, [{"username": PLAYER, "points": 50000}])
+        insert_rows(session, UserDaily, [{"username": PLAYER, "played": False}])
+        add_challenges(
+            session,
+            [(PLAYER, bench_name(i)) for i in range(INBOX_SIZE)],
+            versuslist,
+        )
+    insert_rows(
+        session,
+        User,
+        [{"username": name, "points": rng.randrange(100000)} for name in names],
+    )
+    insert_rows(
+        session, UserDaily, [{"username": name, "played": False} for name in names]
+    )
+    pairs = []
+    for i in range(current, size):
+        pairs.append((bench_name(i), bench_name((i + 1) % size)))
+        pairs.append((bench_name(i), bench_name((i + 7) % size)))
+    add_challenges(session, pairs, versuslist)
+
+
+# Removes everything the benchmark added
+def remove_synthetic(session):
+    challenges = select(Challenge.id).where(Challenge.challenger_id.like("bench\\_%"))
+    session.execute(delete(Match).where(Match.challenge_id.in_(challenges)))
+    session.execute(delete(Challenge).where(Challenge.challenger_id.like("bench\\_%")))
+    for model in (SeenPictures, UserDaily, User):
+        session.execute(delete(model).where(model.username.like("bench\\_%")))
+    session.execute(delete(Picture).where(Picture.link.like("bench://%")))
+
+
+# -----------------------------------------------------------------------
+
+
+# Calls fn(run) runs times, after prepare(run) when given, and returns
+# the median and 95th percentile in ms and the statements per call.
+# Only fn is timed.
+def measure(fn, runs, prepare=None):
+    timings = []
+    statements = 0
+    for run in range(runs):
+        if prepare is not None:
+            prepare(run)
+        with instrumentation.collect() as stats:
+            start = time.perf_counter()
+            fn(run)
+            timings.append(time.perf_counter() - start)
+        statements += stats.statements
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 4),
+        "p95_ms": round(timings[min(runs - 1, int(runs * 0.95))] * 1000, 4),
+        "queries": round(statements / runs, 2),
+    }
+
+
+def sign_in(client, username):
+    with client.session_transaction() as session:
+        session["username"] = username
+
+
+# -----------------------------------------------------------------------
+
+
+# The scoring functions: no database, so they are timed over many more
+# calls than the rest
+def scoring_benchmarks(runs):
+    rng = random.Random(0)
+    guesses = [random_guess(rng) for _ in range(runs)]
+    target = [40.3461, -74.6552]
+    distances = [rng.randrange(0, 400) for _ in range(runs)]
+    seconds = [rng.randrange(0, 120) for _ in range(runs)]
+    return {
+        "calc_distance": measure(
+            lambda run: distance_func.calc_distance(*guesses[run], target), runs
+        ),
+        "calculate_today_points": measure(
+            lambda run: points.calculate_today_points(distances[run]), runs
+        ),
+        "calculate_versus": measure(
+            lambda run: versus_database.calculate_versus(distances[run], seconds[run]),
+            runs,
+        ),
+    }
+
+
+def data_benchmarks(size, runs):
+    results = {}
+    with get_session() as session:
+        challenges = session.scalars(
+            select(Challenge).where(Challenge.challenger_id == PLAYER).limit(runs)
+        ).all()
+        results["create_random_versus"] = measure(
+            lambda run: challenges_database.create_random_versus(
+                session, challenges[run % len(challenges)]
+            ),
+            runs,
+        )
+    results["get_rank"] = measure(
+        lambda run: user_database.get_rank(bench_name(size // 2)), runs
+    )
+    results["get_user_challenges"] = measure(
+        lambda run: challenges_database.get_user_challenges(PLAYER), runs
+    )
+    return results
+
+
+# Every page as PLAYER, then the two submit routes. Each submission is
+# made by a different synthetic user, so it does the full scoring and
+# writes rather than hitting the "already played" path or the limiter.
+def route_benchmarks(size, runs, round_challenges):
+    client = app.test_client()
+    results = {}
+    sign_in(client, PLAYER)
+    for path in GET_ROUTES:
+        client.get(path)  # the first request fills the page cache
+        results[f"GET {path}"] = measure(lambda run: client.get(path), runs)
+
+    rng = random.Random(size)
+
+    def submit(run):
+        lat, lon = random_guess(rng)
+        client.post("/submit", data={"currLat": str(lat), "currLon": str(lon)})
+
+    def submit_round(run):
+        lat, lon = random_guess(rng)
+        client.post(
+            "/submit2",
+            data={
+                "currLat": str(lat),
+                "currLon": str(lon),
+                "index": "0",
+                "challenge_id": str(round_challenges[run]),
+                "time": "20",
+            },
+        )
+
+    results["POST /submit"] = measure(
+        submit, runs, prepare=lambda run: sign_in(client, bench_name(size - 1 - run))
+    )
+    results["POST /submit2"] = measure(
+        submit_round, runs, prepare=lambda run: sign_in(client, bench_name(run))
+    )
+    return results
+
+
+# -----------------------------------------------------------------------
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=LEGACY_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Returns the most recent recorded run with size users, or None
+def previous_run(size):
+    if not os.path.exists(HISTORY_FILE):
+        return None
+    last = None
+    with open(HISTORY_FILE) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["users"] == size:
+                last = entry
+    return last
+
+
+def record(entry):
+    with open(HISTORY_FILE, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+# Prints the results with the change in median since previous, and
+# returns the names of the benchmarks that got slower than TOLERANCE
+def report(size, results, previous):
+    print(f"\n{size} users")
+    print(f"{'benchmark':<28} {'median ms':>10} {'p95 ms':>9} {'queries':>8} {'delta':>8}")
+    regressions = []
+    for name, row in results.items():
+        delta = ""
+        before = previous["results"].get(name) if previous else None
+        if before and before["median_ms"]:
+            change = row["median_ms"] / before["median_ms"] - 1
+            delta = f"{change:+.0%}"
+            if change > TOLERANCE:
+                regressions.append(name)
+        print(
+            f"{name:<28} {row['median_ms']:>10.4f} {row['p95_ms']:>9.4f} "
+            f"{row['queries']:>8.2f} {delta:>8}"
+        )
+    return regressions
+
+
+# -----------------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path benchmarks")
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument(
+        "--scoring-runs", type=int, default=10000, help="calls per scoring function"
+    )
+    parser.add_argument("--check", action="store_true", help="fail on regression")
+    parser.add_argument(
+        "--no-record", action="store_true", help="do not append to the history"
+    )
+    args = parser.parse_args()
+
+    regressions = []
+    current = 0
+    try:
+        for size in sorted(args.users):
+            with get_session() as session:
+                versuslist = ensure_pictures(session)
+                grow_users(session, current, size, versuslist)
+                # one fresh challenge per /submit2 run
+                round_challenges = add_challenges(
+                    session,
+                    [(bench_name(run), PLAYER) for run in range(args.runs)],
+                    versuslist,
+                )
+            current = size
+            # a fresh cache, so nothing carries over from the last size
+            cache.set_backend(cache.MemoryBackend())
+
+            results = scoring_benchmarks(args.scoring_runs)
+            results.update(data_benchmarks(size, args.runs))
+            results.update(route_benchmarks(size, args.runs, round_challenges))
+
+            regressions += [
+                f"{name} ({size} users)"
+                for name in report(size, results, previous_run(size))
+            ]
+            if not args.no_record:
+                record(
+                    {
+                        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(
+                            timespec="seconds"
+                        ),
+                        "commit": git_commit(),
+                        "users": size,
+                        "runs": args.runs,
+                        "results": results,
+                    }
+                )
+    finally:
+        with get_session() as session:
+            remove_synthetic(session)
+
+    if args.check and regressions:
+        print()
+        for name in regressions:
+            print(f"FAIL: {name} is more than {TOLERANCE:.0%} slower")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# loadtest.py
+# Drives the real daily and versus flows with synthetic CAS users and
+# reports per-route latency percentiles and queries per request.
+#
+# Usage (three terminals, from legacy/):
+#   python -m src.CAS.fake_cas --port 8765
+#   CAS_URL=http://127.0.0.1:8765/cas/ SQL_STATS_HEADERS=1 \
+#       gunicorn -w 4 -b 127.0.0.1:5173 app:app
+#   python benchmarks/loadtest.py --users 2000 --concurrency 50
+# -----------------------------------------------------------------------
+
+import argparse
+import http.client
+import http.cookies
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# roughly the campus bounds used by the game map
+LAT_RANGE = (40.3395, 40.3524)
+LON_RANGE = (-74.6621, -74.6501)
+
+# -----------------------------------------------------------------------
+
+
+class Stats:
+    """Thread-safe per-route samples of latency, status and query count."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, status, queries):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if queries is not None:
+                self.queries[route].append(queries)
+            if status >= 400:
+                self.errors[route] += 1
+
+    def summary(self):
+        rows = []
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            queries = self.queries.get(route)
+            rows.append(
+                {
+                    "route": route,
+                    "requests": len(samples),
+                    "errors": self.errors.get(route, 0),
+                    "p50_ms": _percentile(samples, 0.50) * 1000,
+                    "p95_ms": _percentile(samples, 0.95) * 1000,
+                    "p99_ms": _percentile(samples, 0.99) * 1000,
+                    "queries": statistics.mean(queries) if queries else None,
+                }
+            )
+        return rows
+
+
+def _percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+# -----------------------------------------------------------------------
+
+
+class Browser:
+    """
+    One synthetic player: a cookie jar and a keep-alive connection per
+    host. Redirects are followed by hand so every hop is timed as its
+    own route, the way the browser experiences it.
+    """
+
+    def __init__(self, netid, stats):
+        self.netid = netid
+        self.stats = stats
+        self.cookies = {}
+        self._conns = {}
+
+    def _conn(self, url):
+        key = (url.scheme, url.netloc)
+        if key not in self._conns:
+            cls = (
+                http.client.HTTPSConnection
+                if url.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            self._conns[key] = cls(url.netloc, timeout=30)
+        return self._conns[key]
+
+    def _send(self, method, url, body, headers):
+        target = url.path + ("?" + url.query if url.query else "")
+        for attempt in range(2):
+            conn = self._conn(url)
+            try:
+                conn.request(method, target, body, headers)
+                return conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                # the server may have closed an idle keep-alive connection
+                self._conns.pop((url.scheme, url.netloc)).close()
+                if attempt:
+                    raise
+
+    def request(self, method, url, form=None):
+        while True:
+            parsed = urllib.parse.urlsplit(url)
+            headers = {}
+            body = None
+            jar = self.cookies.get(parsed.netloc)
+            if jar:
+                headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in jar.items())
+            if form is not None:
+                body = urllib.parse.urlencode(form)
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+            start = time.perf_counter()
+            response = self._send(method, parsed, body, headers)
+            data = response.read()
+            elapsed = time.perf_counter() - start
+
+            queries = response.getheader("X-DB-Statements")
+            route = parsed.path
+            if "/cas/" in route:
+                route = "CAS " + route
+            self.stats.record(
+                f"{method} {route}",
+                elapsed,
+                response.status,
+                int(queries) if queries is not None else None,
+            )
+
+            for header in response.headers.get_all("Set-Cookie") or []:
+                cookie = http.cookies.SimpleCookie(header)
+                for name, morsel in cookie.items():
+                    self.cookies.setdefault(parsed.netloc, {})[name] = morsel.value
+
+            location = response.getheader("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
+                if response.status in (301, 302, 303):
+                    method, form = "GET", None
+                continue
+            return response.status, data
+
+    def get(self, url):
+        return self.request("GET", url)
+
+    def post(self, url, form):
+        return self.request("POST", url, form)
+
+
+# -----------------------------------------------------------------------
+
+
+def _guess():
+    return {
+        "currLat": f"{random.uniform(*LAT_RANGE):.5f}",
+        "currLon": f"{random.uniform(*LON_RANGE):.5f}",
+    }
+
+
+# Logs in through CAS and plays the daily game: /menu, /game, /submit
+def daily_flow(browser, app_url, cas_url):
+    service = app_url + "/menu"
+    browser.get(
+        cas_url
+        + "login?"
+        + urllib.parse.urlencode({"service": service, "netid": browser.netid})
+    )
+    browser.get(app_url + "/game")
+    browser.post(app_url + "/submit", _guess())
+    browser.get(app_url + "/leaderboard")
+
+
+# Plays all five rounds of an accepted challenge and finishes it
+def play_match(browser, app_url, challenge_id):
+    browser.post(app_url + "/play_button", {"challenge_id": challenge_id})
+    for index in range(5):
+        form = _guess()
+        form.update(
+            {
+                "index": index,
+                "challenge_id": challenge_id,
+                "time": random.randint(5, 60),
+            }
+        )
+        browser.post(app_url + "/submit2", form)
+        if index < 4:
+            browser.post(app_url + "/next_challenge", {"index": index + 1})
+    browser.post(app_url + "/end_challenge", {"challenge_id": challenge_id})
+
+
+# Runs the create/accept/play/finish cycle between two logged-in players
+def versus_flow(challenger, challengee, app_url):
+    challenger.get(app_url + "/requests")
+    status, body = challenger.post(
+        app_url + "/create-challenge", {"challengee_id": challengee.netid}
+    )
+    try:
+        challenge_id = json.loads(body)["challenge_id"]
+    except (ValueError, KeyError):
+        return
+    challengee.get(app_url + "/requests")
+    challengee.post(app_url + "/accept_challenge", {"challenge_id": challenge_id})
+    play_match(challenger, app_url, challenge_id)
+    play_match(challengee, app_url, challenge_id)
+    challenger.get(app_url + "/requests")
+
+
+# -----------------------------------------------------------------------
+
+
+def report(rows, elapsed, file=sys.stdout):
+    total = sum(row["requests"] for row in rows)
+    print(
+        f"{total} requests in {elapsed:.1f} s ({total / elapsed:.1f} req/s)", file=file
+    )
+    print(file=file)
+    print(
+        f"{'route':<32} {'reqs':>7} {'errs':>5} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'queries':>8}",
+        file=file,
+    )
+    for row in rows:
+        queries = f"{row['queries']:.1f}" if row["queries"] is not None else "-"
+        print(
+            f"{row['route']:<32} {row['requests']:>7} {row['errors']:>5} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+            f"{queries:>8}",
+            file=file,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TigerSpot load test")
+    parser.add_argument("--app-url", default="http://127.0.0.1:5173")
+    parser.add_argument("--cas-url", default="http://127.0.0.1:8765/cas/")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--prefix", default="load")
+    parser.add_argument("--skip-versus", action="store_true")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    stats = Stats()
+    browsers = [
+        Browser(f"{args.prefix}{i:05d}", stats) for i in range(args.users)
+    ]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # every player must have logged in before anyone can challenge them
+        list(
+            pool.map(
+                lambda browser: daily_flow(browser, args.app_url, args.cas_url),
+                browsers,
+            )
+        )
+        if not args.skip_versus:
+            pairs = zip(browsers[0::2], browsers[1::2])
+            list(
+                pool.map(
+                    lambda pair: versus_flow(pair[0], pair[1], args.app_url), pairs
+                )
+            )
+    elapsed = time.perf_counter() - start
+
+    rows = stats.summary()
+    report(rows, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"elapsed": elapsed, "routes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# round_selection.py
+# Compares the old "load every id and sample" round selection with
+# src/rounds.py across catalog sizes. Synthetic pictures are inserted in
+# a transaction that is rolled back, so the database is left unchanged.
+#
+# Usage (from legacy/, with DATABASE_URL pointing at a scratch database):
+#   python benchmarks/round_selection.py
+#   python benchmarks/round_selection.py --sizes 1000 100000 --runs 200
+# -----------------------------------------------------------------------
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from src import cache, instrumentation, rounds  # noqa: E402
+from src.db import engine  # noqa: E402
+from src.models import Picture  # noqa: E402
+
+# -----------------------------------------------------------------------
+
+
+# the selection create_random_versus used before src/rounds.py
+def load_all_and_sample(session):
+    picture_ids = [p[0] for p in session.query(Picture.pictureid).all()]
+    return random.sample(picture_ids, 5)
+
+
+def select_with_service(session):
+    return rounds.select_rounds(session, avoid=rounds.bitmap(range(1, 50)))
+
+
+# Grows the catalog to size pictures, with a gap every tenth id to
+# stand in for soft-deleted and skipped ones
+def grow_catalog(session, size):
+    current = session.scalar(select(func.count(Picture.pictureid)))
+    next_id = session.scalar(select(func.coalesce(func.max(Picture.pictureid), 0))) + 1
+    rows = []
+    while current + len(rows) < size:
+        if next_id % 10:
+            rows.append(
+                {
+                    "pictureid": next_id,
+                    "coordinates": [40.34, -74.65],
+                    "link": f"bench://{next_id}",
+                    "place": "Benchmark",
+                }
+            )
+        next_id += 1
+    for start in range(0, len(rows), 5000):
+        session.execute(insert(Picture), rows[start : start + 5000])
+
+
+# Returns (median ms, statements per call) for fn over runs calls
+def measure(session, fn, runs):
+    timings = []
+    with instrumentation.collect() as stats:
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn(session)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, stats.statements / runs
+
+
+# -----------------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round selection benchmark")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'pictures':>10} {'load-all ms':>12} {'rounds ms':>10} {'queries':>8}")
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        session = Session(bind=connection)
+        try:
+            for size in sorted(args.sizes):
+                grow_catalog(session, size)
+                session.flush()
+                # a fresh cache so the catalog is read for this size
+                cache.set_backend(cache.MemoryBackend())
+                old_ms, _ = measure(session, load_all_and_sample, args.runs)
+                new_ms, queries = measure(session, select_with_service, args.runs)
+                print(f"{size:>10} {old_ms:>12.2f} {new_ms:>10.2f} {queries:>8.2f}")
+        finally:
+            session.close()
+            transaction.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# wire_bytes.py
+# Bytes on the wire per route with and without response compression,
+# and what a repeat visit downloads for static files, through Flask's
+# test client.
+#
+# Usage (from legacy/, with DATABASE_URL pointing at a seeded database):
+#   python benchmarks/wire_bytes.py
+#   python benchmarks/wire_bytes.py --user testuser --json wire.json
+# -----------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask  # noqa: E402
+
+from app import app  # noqa: E402
+from src import compression  # noqa: E402
+
+# pages that need no session, then pages that do
+PUBLIC_ROUTES = ["/", "/index"]
+SIGNED_IN_ROUTES = [
+    "/menu",
+    "/rules",
+    "/team",
+    "/leaderboard",
+    "/totalboard",
+    "/requests",
+    "/history",
+    "/game",
+    "/api/v1/daily",
+]
+
+STATIC_FILES = ["styles/styles.css", "styles/logo.png", "styles/palette.svg"]
+
+# -----------------------------------------------------------------------
+
+
+def body_bytes(client, path, encoding):
+    response = client.get(path, headers={"Accept-Encoding": encoding})
+    return response.status_code, len(response.get_data())
+
+
+# Returns one row per route: status and bytes sent for identity, gzip
+# and (when the brotli package is installed) br
+def measure_routes(client, routes):
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli else [])
+    rows = []
+    for path in routes:
+        row = {"route": path}
+        for encoding in encodings:
+            row["status"], row[encoding] = body_bytes(client, path, encoding)
+        rows.append(row)
+    return rows
+
+
+# Returns, per static file, the bytes of a first visit before (plain
+# name, uncompressed) and after (hashed name, gzip where it helps), and
+# whether a repeat visit must ask the server again
+def measure_static(client):
+    rows = []
+    with app.test_request_context():
+        urls = {name: flask.url_for("static", filename=name) for name in STATIC_FILES}
+    for name, url in urls.items():
+        plain = client.get(f"/static/{name}", headers={"Accept-Encoding": "identity"})
+        hashed = client.get(url, headers={"Accept-Encoding": "gzip"})
+        rows.append(
+            {
+                "route": url,
+                "before": len(plain.get_data()),
+                "after": len(hashed.get_data()),
+                "before_revalidates": "immutable" not in plain.headers.get("Cache-Control", ""),
+                "after_revalidates": "immutable" not in hashed.headers.get("Cache-Control", ""),
+            }
+        )
+        plain.close()
+        hashed.close()
+    return rows
+
+
+def print_routes(rows):
+    print(f"{'route':<20} {'status':>6} {'identity':>9} {'gzip':>8} {'br':>8} {'saved':>6}")
+    for row in rows:
+        best = min(row.get("br", row["gzip"]), row["gzip"])
+        saved = 1 - best / row["identity"] if row["identity"] else 0
+        print(
+            f"{row['route']:<20} {row['status']:>6} {row['identity']:>9} "
+            f"{row['gzip']:>8} {row.get('br', '-'):>8} {saved:>6.0%}"
+        )
+
+
+def print_static(rows):
+    print(f"\n{'static file':<42} {'before':>8} {'after':>8} {'repeat visit':>14}")
+    for row in rows:
+        repeat = "revalidates" if row["after_revalidates"] else "from cache"
+        print(f"{row['route']:<42} {row['before']:>8} {row['after']:>8} {repeat:>14}")
+
+
+# -----------------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes on the wire per route")
+    parser.add_argument("--user", default="benchmark", help="session username")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rows = measure_routes(client, PUBLIC_ROUTES)
+    with client.session_transaction() as session:
+        session["username"] = args.user
+    rows += measure_routes(client, SIGNED_IN_ROUTES)
+    static_rows = measure_static(client)
+
+    print_routes(rows)
+    print_static(static_rows)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"routes": rows, "static": static_rows}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
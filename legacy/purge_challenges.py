@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# purge_challenges.py
+# Nightly cleanup of old versus data, in small batches off the request
+# path: archived challenges past their retention and match rows whose
+# challenge is gone
+#
+# Usage (run nightly by scheduler.py, after archive_challenges.py):
+#   python purge_challenges.py
+#   python purge_challenges.py --retention-days 30 --report purge.json
+# -----------------------------------------------------------------------
+
+import argparse
+import datetime
+import json
+import time
+
+from src.Databases.challenges_database import (
+    PURGE_BATCH,
+    PURGE_TARGETS,
+    purge_batch,
+)
+from src.errors import DatabaseError
+
+# -----------------------------------------------------------------------
+
+
+# Purges every target and returns the report: per target the rows
+# deleted, the number of batches, the seconds spent selecting the rows
+# of each batch and the total seconds
+def purge(retention_days=180, batch_size=PURGE_BATCH, pause=0.1):
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        days=retention_days
+    )
+    report = {"cutoff": cutoff.isoformat(), "batch_size": batch_size, "targets": {}}
+
+    for target in PURGE_TARGETS:
+        started = time.perf_counter()
+        totals = {"rows": 0, "batches": 0, "select_seconds": 0.0}
+        while True:
+            deleted, select_seconds = purge_batch(target, cutoff, batch_size)
+            totals["select_seconds"] += select_seconds
+            if deleted == 0:
+                break
+            totals["rows"] += deleted
+            totals["batches"] += 1
+            time.sleep(pause)
+        totals["seconds"] = time.perf_counter() - started
+        report["targets"][target] = totals
+
+    return report
+
+
+def print_report(report):
+    print(f"Purged rows older than {report['cutoff']}")
+    print(f"{'target':<22} {'rows':>8} {'batches':>8} {'select s':>12} {'total s':>9}")
+    for target, totals in report["targets"].items():
+        print(
+            f"{target:<22} {totals['rows']:>8} {totals['batches']:>8} "
+            f"{totals['select_seconds']:>12.3f} {totals['seconds']:>9.2f}"
+        )
+
+
+# -----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge old versus data.")
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=180,
+        help="delete archived challenges older than this many days",
+    )
+    parser.add_argument("--batch-size", type=int, default=PURGE_BATCH)
+    parser.add_argument(
+        "--pause", type=float, default=0.1, help="seconds to wait between batches"
+    )
+    parser.add_argument("--report", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    try:
+        report = purge(args.retention_days, args.batch_size, args.pause)
+    except DatabaseError as error:
+        print(f"✗ Purge failed: {error}")
+        raise SystemExit(1)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -----------------------------------------------------------------------
+# scheduler.py
+# Runs the challenge maintenance jobs on a schedule: the archive every
+# hour and the purge nightly. This is the Procfile's clock process; run
+# one instance per deployment.
+#
+# Usage:
+#   python scheduler.py            run forever
+#   python scheduler.py --once     run every job now and exit
+# -----------------------------------------------------------------------
+
+import argparse
+import datetime
+import time
+
+import pytz
+
+from archive_challenges import archive
+from purge_challenges import print_report, purge
+from src.errors import DatabaseError
+
+# seconds between archive runs; each run moves the challenges that have
+# turned 24 hours old since the last one
+ARCHIVE_EVERY = 3600
+
+# the purge runs once a day, at the first check after this hour
+PURGE_HOUR = 4
+EASTERN = pytz.timezone("America/New_York")
+
+# seconds between checks for due jobs
+TICK = 30
+
+# -----------------------------------------------------------------------
+
+
+# Runs one job, reporting a database failure instead of stopping the
+# scheduler; the job is tried again when it is next due
+def run(name, job):
+    print(f"[scheduler] {name} starting")
+    try:
+        job()
+    except DatabaseError as error:
+        print(f"[scheduler] ✗ {name} failed: {error}")
+
+
+def run_archive():
+    archive(hours=24)
+
+
+def run_purge():
+    print_report(purge(retention_days=180))
+
+
+# -----------------------------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the maintenance jobs.")
+    parser.add_argument("--once", action="store_true", help="run every job now and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        run("archive", run_archive)
+        run("purge", run_purge)
+        return
+
+    last_archive = None
+    last_purge = None
+    while True:
+        now = time.monotonic()
+        if last_archive is None or now - last_archive >= ARCHIVE_EVERY:
+            last_archive = now
+            run("archive", run_archive)
+
+        local = datetime.datetime.now(EASTERN)
+        if local.hour >= PURGE_HOUR and last_purge != local.date():
+            last_purge = local.date()
+            run("purge", run_purge)
+        time.sleep(TICK)
+
+
+if __name__ == "__main__":
+    main()
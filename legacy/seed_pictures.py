@@ -2,94 +2,279 @@
 # -----------------------------------------------------------------------
 # seed_pictures.py
 # Seed the pictures table with images from Cloudinary
+#
+# Usage:
+#   python seed_pictures.py
+#   python seed_pictures.py --sync
+#   python seed_pictures.py --fixture fixtures/cloudinary_resources.json
+#   python seed_pictures.py --record fixtures/cloudinary_resources.json
 # -----------------------------------------------------------------------
 
-from dotenv import load_dotenv
-import cloudinary
-import cloudinary.api
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from src import cache
 from src import cloud
-from src.models import Picture
 from src.db import get_session
-import os
+from src.errors import DatabaseError, database_operation
+from src.models import Picture
+
+# -----------------------------------------------------------------------
+
+
+# Yields the pages from iter_pages, fetching the next page in a
+# background thread while the caller inserts the current one
+def prefetched(pages):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(next, pages, None)
+        while True:
+            page = future.result()
+            if page is None:
+                return
+            future = executor.submit(next, pages, None)
+            yield page
+
+
+# Returns the pictures row built from resource, without an id, or None
+# if its metadata is incomplete
+def picture_row(resource, now):
+    try:
+        link, latitude, longitude, place = cloud.image_data(resource)
+    except (TypeError, ValueError):
+        print(f"  Skipped (missing metadata): {resource.get('public_id')}")
+        return None
+    return {
+        "coordinates": [latitude, longitude],
+        "link": link,
+        "place": place,
+        "checksum": cloud.checksum(resource),
+        "updated_at": now,
+    }
+
 
-load_dotenv()
-cloud_name = os.environ["CLOUDINARY_CLOUD_NAME"]
-api_key = os.environ["CLOUDINARY_API_KEY"]
-api_secret = os.environ["CLOUDINARY_API_SECRET"]
+# Returns the rows of page that are not in known_links, with ids from
+# next_id on, plus how many resources were skipped for bad metadata.
+# known_links is updated so a link listed twice is only inserted once.
+def new_rows(page, known_links, next_id):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = []
+    invalid = 0
+    for resource in page.get("resources", []):
+        row = picture_row(resource, now)
+        if row is None:
+            invalid += 1
+            continue
+        if row["link"] in known_links:
+            continue
+        known_links.add(row["link"])
+        row["pictureid"] = next_id + len(rows)
+        rows.append(row)
+    return rows, invalid
 
 
-def seed_pictures():
+def _lock_pictures(session):
+    # one seeder or sync at a time, so ids read from max() stay unique
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('pictures'))"))
+
+
+def _next_id(session):
+    return session.scalar(select(func.coalesce(func.max(Picture.pictureid), 0))) + 1
+
+
+# Inserts rows in one statement and returns how many were new
+def insert_rows(session, rows):
+    if not rows:
+        return 0
+    inserted = session.execute(
+        insert(Picture)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Picture.link])
+        .returning(Picture.pictureid)
+    )
+    return len(inserted.all())
+
+
+# -----------------------------------------------------------------------
+
+
+@database_operation(retries=0)
+def seed_pictures(fetch=None):
     """
     Load pictures from Cloudinary and populate the pictures table.
-    """
-    try:
-        # Configure and connect to cloudinary account
-        cloudinary.config(
-            cloud_name=cloud_name,
-            api_key=api_key,
-            api_secret=api_secret,
-        )
 
-        # Name of folder to extract resources from
-        folder_name = "TigerSpot/Checked"
+    Streams the folder listing page by page, and inserts each page's new
+    pictures with one INSERT ... ON CONFLICT (link) DO NOTHING. Existing
+    links are read once up front, and new ids continue from
+    max(pictureid), so re-runs never reuse an id. fetch defaults to the
+    live Cloudinary API; cloud.fixture_fetcher serves a recorded one.
+    """
+    if fetch is None:
+        fetch = cloud.api_fetcher()
 
-        print(f"Fetching images from Cloudinary folder: {folder_name}")
+    print(f"Fetching images from Cloudinary folder: {cloud.FOLDER_NAME}")
 
-        # Extract all resources from folder
-        resources = cloudinary.api.resources(
-            type="upload", prefix=folder_name, max_results=500, context=True
-        )
+    with get_session() as session:
+        known_links = set(session.scalars(select(Picture.link)))
 
-        pictureID = 0
-        added_count = 0
-        skipped_count = 0
+    existing = len(known_links)
+    added_count = 0
+    invalid_count = 0
+    listed_count = 0
 
+    for page in prefetched(cloud.iter_pages(fetch)):
+        listed_count += len(page.get("resources", []))
         with get_session() as session:
-            # Loop through folder and retrieve image url, coordinates, place, and set pictureid per resource
-            for resource in resources.get("resources", []):
-                link, latitude, longitude, place = cloud.image_data(resource)
-                coordinates = [latitude, longitude]
-
-                # Check if picture already exists
-                existing = (
-                    session.query(Picture).filter_by(link=link).first()
-                )
-
-                if not existing:
-                    pictureID += 1
-                    new_picture = Picture(
-                        pictureid=pictureID,
-                        coordinates=coordinates,
-                        link=link,
-                        place=place,
-                    )
-                    session.add(new_picture)
-                    added_count += 1
-                    print(f"  Added: {place} (ID: {pictureID})")
-                else:
-                    skipped_count += 1
-                    print(f"  Skipped (already exists): {place}")
-
-        print(f"\nSeed complete!")
-        print(f"  Pictures added: {added_count}")
-        print(f"  Pictures skipped: {skipped_count}")
-        print(f"  Total pictures: {added_count + skipped_count}")
-
-        return "success"
-
-    except Exception as error:
-        print(f"Error seeding pictures: {error}")
-        return "database error"
+            _lock_pictures(session)
+            rows, invalid = new_rows(page, known_links, _next_id(session))
+            added = insert_rows(session, rows)
+
+        for row in rows:
+            print(f"  Added: {row['place']} (ID: {row['pictureid']})")
+        added_count += added
+        invalid_count += invalid
+
+    print(f"\nSeed complete!")
+    print(f"  Resources listed: {listed_count}")
+    print(f"  Pictures added: {added_count}")
+    print(f"  Pictures skipped (bad metadata): {invalid_count}")
+    print(f"  Total pictures: {existing + added_count}")
+
+    if added_count:
+        cache.invalidate("pictures")
+
+    return {"listed": listed_count, "added": added_count, "invalid": invalid_count}
+
+
+# -----------------------------------------------------------------------
+
+
+@database_operation(retries=0)
+def sync_pictures(fetch=None):
+    """
+    Bring the pictures table in line with the Cloudinary folder.
+
+    Every resource's metadata is fingerprinted with cloud.checksum and
+    compared with the checksum stored on its row, so only new, edited,
+    removed or re-added pictures are written: new ones in one INSERT,
+    edits and restores in one bulk UPDATE by id, removals as one soft
+    delete (deleted_at). Cached picture data is invalidated if anything
+    changed. Cheap enough to run hourly from a scheduler.
+    """
+    if fetch is None:
+        fetch = cloud.api_fetcher()
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    listed = {}
+    invalid_count = 0
+    for page in prefetched(cloud.iter_pages(fetch)):
+        for resource in page.get("resources", []):
+            row = picture_row(resource, now)
+            if row is None:
+                invalid_count += 1
+            else:
+                listed[row["link"]] = row
+
+    with get_session() as session:
+        _lock_pictures(session)
+        stored = session.execute(
+            select(
+                Picture.pictureid,
+                Picture.link,
+                Picture.checksum,
+                Picture.deleted_at,
+            )
+        ).all()
+        known = {picture.link: picture for picture in stored}
+
+        changed = []
+        for link, row in listed.items():
+            picture = known.get(link)
+            if picture is None:
+                continue
+            if picture.checksum != row["checksum"] or picture.deleted_at is not None:
+                changed.append(dict(row, pictureid=picture.pictureid, deleted_at=None))
+
+        # an empty listing is far more likely an api problem than an
+        # emptied folder, so it never deletes anything
+        removed = []
+        if listed:
+            removed = [
+                picture.pictureid
+                for picture in stored
+                if picture.link not in listed and picture.deleted_at is None
+            ]
+
+        new = [row for link, row in listed.items() if link not in known]
+        next_id = _next_id(session)
+        for offset, row in enumerate(new):
+            row["pictureid"] = next_id + offset
+
+        added = insert_rows(session, new)
+        if changed:
+            session.execute(update(Picture), changed)
+        if removed:
+            session.execute(
+                update(Picture)
+                .where(Picture.pictureid.in_(removed))
+                .values(deleted_at=now, updated_at=now)
+            )
+
+    if added or changed or removed:
+        cache.invalidate("pictures")
+
+    print(f"\nSync complete!")
+    print(f"  Resources listed: {len(listed)}")
+    print(f"  Pictures added: {added}")
+    print(f"  Pictures updated: {len(changed)}")
+    print(f"  Pictures removed: {len(removed)}")
+    print(f"  Pictures skipped (bad metadata): {invalid_count}")
+
+    return {
+        "listed": len(listed),
+        "added": added,
+        "updated": len(changed),
+        "removed": len(removed),
+        "invalid": invalid_count,
+    }
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the pictures table.")
+    parser.add_argument(
+        "--fixture", help="read the listing from a recorded JSON file instead"
+    )
+    parser.add_argument(
+        "--record", help="save the live listing to this file and exit"
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="also apply metadata edits and removals to existing pictures",
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        pages = cloud.record_pages(args.record)
+        print(f"Recorded {pages} page(s) to {args.record}")
+        raise SystemExit(0)
+
     print("=" * 60)
     print("TigerSpot Picture Seeder")
     print("=" * 60)
     print()
-    result = seed_pictures()
+    fetch = cloud.fixture_fetcher(args.fixture) if args.fixture else None
+    try:
+        if args.sync:
+            sync_pictures(fetch)
+        else:
+            seed_pictures(fetch)
+    except DatabaseError as error:
+        print()
+        print(f"✗ Seeding failed: {error}")
+        raise SystemExit(1)
     print()
-    if result == "success":
-        print("✓ Seeding completed successfully!")
-    else:
-        print("✗ Seeding failed. See error above.")
+    print("✓ Seeding completed successfully!")
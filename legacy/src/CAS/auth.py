@@ -2,14 +2,31 @@
 # auth.py
 # -----------------------------------------------------------------------
 
-import urllib.request
+import logging
+import os
+import time
 import urllib.parse
 import re
 import flask
 
+from src import metrics
+from src.CAS.client import CASClient, CASUnavailableError
+
+logger = logging.getLogger("tigerspot.cas")
+
 # -----------------------------------------------------------------------
 
-_CAS_URL = "https://fed.princeton.edu/cas/"
+# overridable so development and load tests can use src/CAS/fake_cas.py
+_CAS_URL = os.environ.get("CAS_URL", "https://fed.princeton.edu/cas/")
+
+# one client per worker so its keep-alive connections are shared by
+# every request the worker serves
+_client = CASClient(
+    _CAS_URL,
+    connect_timeout=float(os.environ.get("CAS_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.environ.get("CAS_READ_TIMEOUT", "5")),
+    verify=os.environ.get("FLASK_ENV") != "development",
+)
 
 # -----------------------------------------------------------------------
 
@@ -29,32 +46,20 @@ def strip_ticket(url):
 
 # Validate a login ticket by contacting the CAS server. If
 # valid, return the user's username; otherwise, return None.
+# Raises CASUnavailableError if CAS does not answer in time.
 
 
 def validate(ticket):
-    val_url = (
-        _CAS_URL
-        + "validate"
-        + "?service="
-        + urllib.parse.quote(strip_ticket(flask.request.url))
-        + "&ticket="
-        + urllib.parse.quote(ticket)
-    )
-    lines = []
-    import ssl
-    import os
-    context = None
-    if os.environ.get("FLASK_ENV") == "development":
-        context = ssl._create_unverified_context()
-    with urllib.request.urlopen(val_url, context=context) as flo:
-        lines = flo.readlines()  # Should return 2 lines.
-    if len(lines) != 2:
-        return None
-    first_line = lines[0].decode("utf-8")
-    second_line = lines[1].decode("utf-8")
-    if not first_line.startswith("yes"):
-        return None
-    return second_line
+    outcome = "unavailable"
+    start = time.perf_counter()
+    try:
+        username = _client.validate(strip_ticket(flask.request.url), ticket)
+        outcome = "valid" if username is not None else "invalid"
+        return username
+    finally:
+        metrics.CAS_VALIDATION_SECONDS.observe(
+            time.perf_counter() - start, outcome=outcome
+        )
 
 
 # -----------------------------------------------------------------------
@@ -78,8 +83,13 @@ def authenticate():
         flask.abort(flask.redirect(login_url))
 
     # If the login ticket is invalid, then redirect the browser
-    # to the login page to get a new one.
-    username = validate(ticket)
+    # to the login page to get a new one. If CAS cannot be reached
+    # in time, fail the request rather than tying up the worker.
+    try:
+        username = validate(ticket)
+    except CASUnavailableError as error:
+        logger.warning("CAS validation failed: %s", error)
+        flask.abort(503)
     if username is None:
         login_url = (
             _CAS_URL
@@ -0,0 +1,155 @@
+# -----------------------------------------------------------------------
+# client.py
+# CAS ticket validation over pooled keep-alive connections
+# -----------------------------------------------------------------------
+
+import http.client
+import queue
+import ssl
+import time
+import urllib.parse
+
+from src.cache import MemoryBackend
+
+# -----------------------------------------------------------------------
+
+
+class CASUnavailableError(Exception):
+    """
+    Raised when CAS could not be reached after retrying, or did not
+    answer a validation in time.
+    """
+
+
+# -----------------------------------------------------------------------
+
+
+class CASClient:
+    """
+    Validates CAS login tickets.
+
+    Connections to the CAS host are kept alive and reused from a small
+    pool, so a login storm pays for one TLS handshake per pooled
+    connection instead of one per login. Every request is bounded by a
+    connect and a read timeout. Only connecting is retried, with
+    exponential backoff: once a ticket has been sent CAS may have
+    consumed it, and tickets are single use, so a read timeout or a
+    dropped response fails the validation instead. Pooled connections
+    idle longer than idle_timeout are not reused, since the server may
+    have closed them. Tickets that CAS rejected are remembered for a
+    short while, so a replayed ?ticket= URL (a refresh or a back button)
+    is answered without another round trip.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        connect_timeout=3.0,
+        read_timeout=5.0,
+        retries=2,
+        backoff=0.2,
+        pool_size=4,
+        idle_timeout=4.0,
+        negative_ttl=300,
+        verify=True,
+    ):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path if parsed.path.endswith("/") else parsed.path + "/"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.negative_ttl = negative_ttl
+        self._context = None
+        if self.scheme == "https":
+            self._context = (
+                ssl.create_default_context()
+                if verify
+                else ssl._create_unverified_context()
+            )
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._rejected = MemoryBackend(max_entries=10000)
+
+    # -------------------------------------------------------------------
+
+    def _connect(self):
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.connect_timeout, context=self._context
+            )
+        else:
+            conn = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.connect_timeout
+            )
+        conn.connect()
+        # the connect timeout only covers the handshake; reads get their own
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    # Returns a pooled connection that has not sat idle too long, or
+    # opens a new one, retrying with backoff while CAS cannot be reached
+    def _acquire(self):
+        while True:
+            try:
+                conn, released_at = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - released_at < self.idle_timeout:
+                return conn
+            conn.close()
+
+        attempt = 0
+        while True:
+            try:
+                return self._connect()
+            except OSError as error:
+                if attempt >= self.retries:
+                    raise CASUnavailableError(str(error)) from error
+                time.sleep(self.backoff * (2**attempt))
+                attempt += 1
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    # Sends one GET and returns the body. Nothing is retried after the
+    # request is sent (see the class docstring).
+    def _get(self, path):
+        conn = self._acquire()
+        try:
+            conn.request("GET", path, headers={"Connection": "keep-alive"})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as error:
+            conn.close()
+            raise CASUnavailableError(str(error)) from error
+        if response.status >= 500:
+            conn.close()
+            raise CASUnavailableError(f"CAS returned {response.status}")
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return body
+
+    # -------------------------------------------------------------------
+
+    # Returns the username for a valid ticket, otherwise None
+    def validate(self, service, ticket):
+        if self._rejected.get(ticket) is not None:
+            return None
+
+        query = urllib.parse.urlencode({"service": service, "ticket": ticket})
+        body = self._get(self.path + "validate?" + query)
+
+        lines = body.decode("utf-8").splitlines()  # Should return 2 lines.
+        if len(lines) != 2 or not lines[0].startswith("yes"):
+            self._rejected.set(ticket, True, self.negative_ttl)
+            return None
+        return lines[1]
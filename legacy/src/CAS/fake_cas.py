@@ -0,0 +1,139 @@
+# -----------------------------------------------------------------------
+# fake_cas.py
+# Local stand-in for Princeton CAS, for development and load testing.
+# Never point production at it: it logs in anyone as any netid.
+#
+# Usage:
+#   python -m src.CAS.fake_cas --port 8765
+#   CAS_URL=http://localhost:8765/cas/ python dev.py
+# -----------------------------------------------------------------------
+
+import argparse
+import html
+import secrets
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------------------------------
+
+
+class TicketStore:
+    """Single-use service tickets, as issued by a real CAS server."""
+
+    def __init__(self):
+        self._tickets = {}
+        self._lock = threading.Lock()
+
+    def issue(self, netid, service):
+        ticket = "ST-" + secrets.token_urlsafe(24)
+        with self._lock:
+            self._tickets[ticket] = (netid, service)
+        return ticket
+
+    # Returns the netid for ticket if it was issued for service; tickets
+    # are consumed by validation whether or not it succeeds
+    def redeem(self, ticket, service):
+        with self._lock:
+            issued = self._tickets.pop(ticket, None)
+        if issued is None or issued[1] != service:
+            return None
+        return issued[0]
+
+
+# -----------------------------------------------------------------------
+
+
+_LOGIN_FORM = """<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="UTF-8"><title>Fake CAS</title></head>
+<body>
+  <h1>Fake CAS login</h1>
+  <form method="get" action="login">
+    <input type="hidden" name="service" value="{service}">
+    <label>NetID <input type="text" name="netid" autofocus></label>
+    <button type="submit">Log in</button>
+  </form>
+</body>
+</html>
+"""
+
+
+class FakeCASHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = TicketStore()
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        action = url.path.rstrip("/").rsplit("/", 1)[-1]
+        service = params.get("service", "")
+
+        if action == "login":
+            # load tests skip the form by passing ?netid= directly
+            netid = params.get("netid")
+            if not netid:
+                self._send(200, _LOGIN_FORM.format(service=html.escape(service)))
+                return
+            ticket = self.store.issue(netid, service)
+            separator = "&" if "?" in service else "?"
+            self._redirect(service + separator + "ticket=" + ticket)
+        elif action == "validate":
+            netid = self.store.redeem(params.get("ticket", ""), service)
+            if netid is None:
+                self._send(200, "no\n\n", "text/plain")
+            else:
+                self._send(200, f"yes\n{netid}\n", "text/plain")
+        elif action == "logout":
+            self._redirect(service or "/")
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status, body, content_type="text/html"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# -----------------------------------------------------------------------
+
+
+# Starts a fake CAS server in a background thread and returns it; its
+# base url is f"http://{host}:{server.server_port}/cas/"
+def start(host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), FakeCASHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake CAS server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeCASHandler)
+    server.daemon_threads = True
+    print(f"Fake CAS listening on http://{args.host}:{args.port}/cas/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
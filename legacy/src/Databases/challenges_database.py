@@ -2,451 +2,577 @@
 # challenges_database.py
 # -----------------------------------------------------------------------
 
-import random
+import logging
+import time
 
-from sqlalchemy import text
+from sqlalchemy import select, text, union
 
-from src.db import get_session
-import sys, traceback
-from src.models import Challenge, Match
+from src import events, rounds
+from src.db import get_session, read_only, transactional
+from src.errors import database_operation
+from src.models import Challenge, ChallengeArchive, Match
 from src.models import Picture
 
+logger = logging.getLogger("tigerspot.challenges")
 
-# -----------------------------------------------------------------------
-# Reset challenges tables
-def clear_challenges_table():
-    try:
-        with get_session() as session:
-            # Delete all records from the challenges table
-            session.query(Challenge).delete()
-            print("Challenges table cleared.")
+# challenges per page of the /requests inbox and /history
+INBOX_PAGE = 20
 
-            # Delete all records from matches table
-            session.query(Match).delete()
-            print("Matches table cleared.")
+# challenges moved per archive transaction
+ARCHIVE_BATCH = 500
 
-            # Reset sequences
-            session.execute(text("ALTER SEQUENCE challenges_id_seq RESTART WITH 1"))
-            print("Challenges id sequence reset.")
+# statuses a challenge never leaves, so it can be archived once old
+ARCHIVE_STATUSES = "('completed', 'declined')"
 
-            session.execute(text("ALTER SEQUENCE matches_id_seq RESTART WITH 1"))
-            print("Matches id sequence reset.")
+# rows deleted per purge transaction
+PURGE_BATCH = 1000
 
-        return "success"
-
-    except Exception as error:
-        print(f"Error clearing challenges table: {error}")
-        return "database error"
+# what purge_batch can delete: table name and the condition on its rows
+PURGE_TARGETS = {
+    "archived_challenges": ("challenges_archive", "archived_at < :cutoff"),
+    "orphaned_matches": (
+        "matches",
+        "NOT EXISTS (SELECT 1 FROM challenges c WHERE c.id = matches.challenge_id)",
+    ),
+}
 
 
 # -----------------------------------------------------------------------
-# Reset challenges pertaining to a certain user
-def clear_user_challenges(user_id):
-    try:
-        with get_session() as session:
-            # Find challenges related to the user_id
-            challenges = (
-                session.query(Challenge)
-                .filter(
-                    (Challenge.challenger_id == user_id)
-                    | (Challenge.challengee_id == user_id)
-                )
-                .all()
-            )
+# Reset challenges tables
+@database_operation
+def clear_challenges_table():
+    with get_session() as session:
+        # Delete all records from the challenges table
+        session.query(Challenge).delete()
+        print("Challenges table cleared.")
 
-            challenge_ids = [c.id for c in challenges]
+        # Delete all records from matches table
+        session.query(Match).delete()
+        print("Matches table cleared.")
 
-            if challenge_ids:
-                # Delete matching entries from the matches table
-                session.query(Match).filter(
-                    Match.challenge_id.in_(challenge_ids)
-                ).delete(synchronize_session=False)
+        # archived ids would collide with the restarted sequence
+        session.query(ChallengeArchive).delete()
+        print("Challenges archive cleared.")
 
-                # Delete entries from the challenges table
-                session.query(Challenge).filter(Challenge.id.in_(challenge_ids)).delete(
-                    synchronize_session=False
-                )
+        # Reset sequences
+        session.execute(text("ALTER SEQUENCE challenges_id_seq RESTART WITH 1"))
+        print("Challenges id sequence reset.")
 
-        return "success"
+        session.execute(text("ALTER SEQUENCE matches_id_seq RESTART WITH 1"))
+        print("Matches id sequence reset.")
 
-    except Exception as error:
-        print(f"Error clearing entries for user_id {user_id}: {error}")
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
 
-# Create a new challenge row between new users
-def create_challenge(challenger_id, challengee_id):
-    try:
-        with get_session() as session:
-            # Check for existing challenge between the two users
-            existing_challenge = (
-                session.query(Challenge)
-                .filter(
-                    (
-                        (Challenge.challenger_id == challenger_id)
-                        & (Challenge.challengee_id == challengee_id)
-                    )
-                    | (
-                        (Challenge.challenger_id == challengee_id)
-                        & (Challenge.challengee_id == challenger_id)
-                    )
-                )
-                .filter(Challenge.status.in_(["pending", "accepted"]))
-                .first()
+# Create a new challenge row between new users. Runs SERIALIZABLE so two
+# simultaneous requests cannot both pass the existing-challenge check; the
+# loser is retried by @transactional and then finds the winner's row.
+@transactional(isolation_level="SERIALIZABLE")
+def create_challenge(session, challenger_id, challengee_id):
+    # Check for existing challenge between the two users
+    existing_challenge = (
+        session.query(Challenge)
+        .filter(
+            (
+                (Challenge.challenger_id == challenger_id)
+                & (Challenge.challengee_id == challengee_id)
             )
-
-            if existing_challenge:
-                return {
-                    "error": "Challenge already exists",
-                    "challenge_id": existing_challenge.id,
-                }
-
-            # No existing challenge found, proceed to create a new one
-            new_challenge = Challenge(
-                challenger_id=challenger_id,
-                challengee_id=challengee_id,
-                status="pending",
+            | (
+                (Challenge.challenger_id == challengee_id)
+                & (Challenge.challengee_id == challenger_id)
             )
-            session.add(new_challenge)
-            session.flush()  # Flush to get the ID
-
-            challenge_id = new_challenge.id
+        )
+        .filter(Challenge.status.in_(["pending", "accepted"]))
+        .first()
+    )
 
+    if existing_challenge:
         return {
-            "success": "Challenge created successfully",
-            "challenge_id": challenge_id,
+            "error": "Challenge already exists",
+            "challenge_id": existing_challenge.id,
         }
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    # No existing challenge found, proceed to create a new one
+    new_challenge = Challenge(
+        challenger_id=challenger_id,
+        challengee_id=challengee_id,
+        status="pending",
+    )
+    session.add(new_challenge)
+    session.flush()  # Flush to get the ID
+    events.notify(session, "created", new_challenge)
+
+    return {
+        "success": "Challenge created successfully",
+        "challenge_id": new_challenge.id,
+    }
 
 
 # -----------------------------------------------------------------------
 
 
 # Accept a challenge
+@database_operation
 def accept_challenge(challenge_id):
-    status = "database error"  # Default status in case of error
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge:
-                challenge.status = "accepted"
-                # FIX: Pass the current session to the helper function
-                challenge.versuslist = create_random_versus(session)
-                status = "accepted"
-            
-            # The commit happens automatically when this 'with' block exits successfully
-
-        return status
+    status = None  # Stays None if the challenge does not exist
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+
+        if challenge:
+            challenge.status = "accepted"
+            # FIX: Pass the current session to the helper function
+            challenge.versuslist = create_random_versus(session, challenge)
+            status = "accepted"
+            events.notify(session, "accepted", challenge)
+        
+        # The commit happens automatically when this 'with' block exits successfully
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return status
 
 
 # -----------------------------------------------------------------------
 
 
 # Decline a challenge
+@database_operation
 def decline_challenge(challenge_id):
-    status = "database error"  # Default status in case of error
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+    status = None  # Stays None if the challenge does not exist
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+
+        if challenge:
+            challenge.status = "declined"
+            status = "declined"
+            events.notify(session, "declined", challenge)
+
+    return status
 
-            if challenge:
-                challenge.status = "declined"
-                status = "declined"
 
-        return status
+# -----------------------------------------------------------------------
+
+
+# Returns up to limit rows of query that user_id took part in with an id
+# below before, newest first, plus the id to pass as before for the next
+# page (None on the last page). Each side is read from its own
+# (user, id) index, so the cost depends on limit, not on history length.
+def _keyset_page(session, query, table, user_id, before, limit):
+    def side(column):
+        page = query.where(column == user_id)
+        if before is not None:
+            page = page.where(table.id < before)
+        return page.order_by(table.id.desc()).limit(limit + 1)
+
+    both = union(side(table.challenger_id), side(table.challengee_id)).subquery()
+    rows = session.execute(
+        select(both).order_by(both.c.id.desc()).limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+# Retrieve a page of the challenges that a user is involved in, newest
+# first, split into initiated and received. "next" is the before value
+# for the following page, or None.
+@database_operation
+@read_only
+def get_user_challenges(user_id, before=None, limit=INBOX_PAGE):
+    with get_session() as session:
+        query = select(
+            Challenge.id,
+            Challenge.challenger_id,
+            Challenge.challengee_id,
+            Challenge.status,
+            Challenge.challenger_finished,
+            Challenge.challengee_finished,
+            Match.winner_id,
+        ).outerjoin(Match, Match.challenge_id == Challenge.id)
+        rows, next_before = _keyset_page(
+            session, query, Challenge, user_id, before, limit
+        )
+
+    # Initialize dictionaries to hold the two types of challenges
+    user_challenges = {"initiated": [], "received": [], "next": next_before}
+
+    for row in rows:
+        challenge_dict = {
+            "id": row.id,
+            "challenger_id": row.challenger_id,
+            "challengee_id": row.challengee_id,
+            "status": row.status,
+            "challenger_finished": row.challenger_finished,
+            "challengee_finished": row.challengee_finished,
+            "winner_id": row.winner_id,
+        }
+
+        if row.challenger_id == user_id:  # User is the challenger
+            user_challenges["initiated"].append(challenge_dict)
+        else:  # User is the challengee
+            user_challenges["received"].append(challenge_dict)
+
+    return user_challenges
+
+
+# Retrieve a page of a user's archived challenges, newest first, with
+# the points each side scored. "next" is the before value for the
+# following page, or None.
+@database_operation
+@read_only
+def get_challenge_history(user_id, before=None, limit=INBOX_PAGE):
+    with get_session() as session:
+        query = select(
+            ChallengeArchive.id,
+            ChallengeArchive.challenger_id,
+            ChallengeArchive.challengee_id,
+            ChallengeArchive.status,
+            ChallengeArchive.challenger_points,
+            ChallengeArchive.challengee_points,
+            ChallengeArchive.winner_id,
+            ChallengeArchive.created_at,
+        )
+        rows, next_before = _keyset_page(
+            session, query, ChallengeArchive, user_id, before, limit
+        )
+
+    history = []
+    for row in rows:
+        initiated = row.challenger_id == user_id
+        history.append(
+            {
+                "id": row.id,
+                "opponent": row.challengee_id if initiated else row.challenger_id,
+                "initiated": initiated,
+                "status": row.status,
+                "points": row.challenger_points if initiated else row.challengee_points,
+                "opponent_points": (
+                    row.challengee_points if initiated else row.challenger_points
+                ),
+                "winner_id": row.winner_id,
+                "created_at": row.created_at,
+            }
+        )
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return {"challenges": history, "next": next_before}
 
 
 # -----------------------------------------------------------------------
 
 
-# Retrieve all challenges that a user is involved in
-def get_user_challenges(user_id):
-    try:
-        with get_session() as session:
-            # Query for both challenges initiated by the user and challenges where the user is the challengee
-            challenges = (
-                session.query(Challenge)
-                .filter(
-                    (Challenge.challenger_id == user_id)
-                    | (Challenge.challengee_id == user_id)
-                )
-                .all()
+# Moves up to batch_size challenges into challenges_archive, together
+# with their match result, in one transaction: completed and declined
+# challenges created before cutoff, and pending or accepted ones created
+# before stale_cutoff, which nobody is going to finish. Rows locked by a
+# request are skipped and picked up by a later batch. The archive rows
+# are inserted before anything is deleted, and an id already in the
+# archive fails the batch instead of losing the challenge. Returns how
+# many challenges were moved.
+@transactional
+def archive_challenges(session, cutoff, stale_cutoff, batch_size=ARCHIVE_BATCH):
+    ids = session.scalars(
+        text(
+            f"""
+            SELECT id FROM challenges
+            WHERE (status IN {ARCHIVE_STATUSES} AND created_at < :cutoff)
+               OR created_at < :stale_cutoff
+            ORDER BY id
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+            """
+        ),
+        {
+            "cutoff": cutoff,
+            "stale_cutoff": stale_cutoff,
+            "batch_size": int(batch_size),
+        },
+    ).all()
+    if not ids:
+        return 0
+
+    session.execute(
+        text(
+            """
+            INSERT INTO challenges_archive (
+                id, challenger_id, challengee_id, status,
+                challenger_points, challengee_points, versuslist,
+                winner_id, created_at
             )
+            SELECT c.id, c.challenger_id, c.challengee_id, c.status,
+                   c.challenger_points, c.challengee_points, c.versuslist,
+                   (SELECT m.winner_id FROM matches m
+                    WHERE m.challenge_id = c.id
+                    ORDER BY m.id DESC LIMIT 1),
+                   c.created_at
+            FROM challenges c
+            WHERE c.id = ANY(:ids)
+            """
+        ),
+        {"ids": ids},
+    )
+    session.execute(
+        text("DELETE FROM matches WHERE challenge_id = ANY(:ids)"), {"ids": ids}
+    )
+    session.execute(text("DELETE FROM challenges WHERE id = ANY(:ids)"), {"ids": ids})
+
+    return len(ids)
+
+
+# -----------------------------------------------------------------------
 
-            # Initialize dictionaries to hold the two types of challenges
-            user_challenges = {"initiated": [], "received": []}
-
-            # Iterate through the results and categorize each challenge
-            for challenge in challenges:
-                try:
-                    cid = challenge.id
-                    challenger_id = challenge.challenger_id
-                    challengee_id = challenge.challengee_id
-                    status = challenge.status
-                    challenger_finished = challenge.challenger_finished
-                    challengee_finished = challenge.challengee_finished
-                except Exception as ex:
-                    print(f"get_user_challenges attr error: {type(ex).__name__}: {ex}", file=sys.stderr)
-                    traceback.print_exc()
-                    raise
-
-                # compute winner using the same session to avoid detaching current objects
-                winner_row = session.query(Match).filter_by(challenge_id=cid).first()
-                winner_id = winner_row.winner_id if winner_row is not None else None
-
-                challenge_dict = {
-                    "id": cid,
-                    "challenger_id": challenger_id,
-                    "challengee_id": challengee_id,
-                    "status": status,
-                    "challenger_finished": challenger_finished,
-                    "challengee_finished": challengee_finished,
-                    "winner_id": winner_id,
-                }
-
-                if challenger_id == user_id:  # User is the challenger
-                    user_challenges["initiated"].append(challenge_dict)
-                else:  # User is the challengee
-                    user_challenges["received"].append(challenge_dict)
-
-        return user_challenges
-
-    except Exception as error:
-        print(f"Error getting user challenges: {type(error).__name__}: {error}", file=sys.stderr)
-        traceback.print_exc()
-        return "database error"
+
+# Deletes up to batch_size rows of a PURGE_TARGETS target, older than
+# cutoff where the target has an age. The rows are locked first with
+# SKIP LOCKED, so rows a request is using are left for the next batch,
+# then deleted by ctid. SKIP LOCKED never waits on a row lock, so the
+# select's time is query time, not lock waiting. Returns (rows deleted,
+# seconds spent in the select).
+@transactional
+def purge_batch(session, target, cutoff, batch_size=PURGE_BATCH, lock_timeout="2s"):
+    table, condition = PURGE_TARGETS[target]
+    # a table lock held elsewhere fails the batch instead of queueing
+    # requests behind it
+    session.execute(
+        text("SELECT set_config('lock_timeout', :lock_timeout, true)"),
+        {"lock_timeout": lock_timeout},
+    )
+
+    started = time.perf_counter()
+    ctids = session.scalars(
+        text(
+            f"""
+            SELECT ctid::text FROM {table}
+            WHERE {condition}
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+            """
+        ),
+        {"cutoff": cutoff, "batch_size": int(batch_size)},
+    ).all()
+    select_seconds = time.perf_counter() - started
+
+    if ctids:
+        session.execute(
+            text(f"DELETE FROM {table} WHERE ctid = ANY(CAST(:ctids AS tid[]))"),
+            {"ctids": ctids},
+        )
+
+    return len(ctids), select_seconds
 
 
 # -----------------------------------------------------------------------
 
 
 # Update if a given user has finished a given challenge
+@database_operation
 def update_finish_status(challenge_id, user_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-            if challenge is None:
-                return
+        if challenge is None:
+            return
 
-            # Depending on whether the user is the challenger or the challengee
-            if user_id == challenge.challenger_id:
-                challenge.challenger_finished = True
-            elif user_id == challenge.challengee_id:
-                challenge.challengee_finished = True
-            else:
-                return
+        # Depending on whether the user is the challenger or the challengee
+        if user_id == challenge.challenger_id:
+            challenge.challenger_finished = True
+        elif user_id == challenge.challengee_id:
+            challenge.challengee_finished = True
+        else:
+            return
 
-        return "success"
+        events.notify(session, "finished", challenge, user_id=user_id)
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
 
 # Check if both users have finished a given challenge
+@database_operation
 def check_finish_status(challenge_id):
     status = {"status": "unfinished"}  # Default status
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge:
-                if challenge.challenger_finished and challenge.challengee_finished:
-                    status = {"status": "finished"}
-            else:
-                print("No match found with the given challenge_id.")
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-        return status
+        if challenge:
+            if challenge.challenger_finished and challenge.challengee_finished:
+                status = {"status": "finished"}
+        else:
+            logger.warning("Challenge %s not found.", challenge_id)
 
-    except Exception as error:
-        print(f"Error checking finish status: {error}")
-        return "database error"
+    return status
 
 
 # -----------------------------------------------------------------------
 
 
 # Get the participants of a given challenge
+@database_operation
 def get_challenge_participants(challenge_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge:
-                participants = {
-                    "challenger_id": challenge.challenger_id,
-                    "challengee_id": challenge.challengee_id,
-                }
-                return participants
-            else:
-                return None
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-    except Exception as error:
-        print(f"Database error: {error}")
-        return "database error"
+        if challenge:
+            participants = {
+                "challenger_id": challenge.challenger_id,
+                "challengee_id": challenge.challengee_id,
+            }
+            return participants
+        else:
+            return None
 
 
 # -----------------------------------------------------------------------
 
 
 # Get the results of a given challenge and return a dictionary of related result information
+@database_operation
 def get_challenge_results(challenge_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                print("Challenge not found.")
-                return
-
-            # Determine the winner or if it's a tie
-            if challenge.challenger_points > challenge.challengee_points:
-                winner = challenge.challenger_id
-            elif challenge.challengee_points > challenge.challenger_points:
-                winner = challenge.challengee_id
-            else:
-                winner = "Tie"
-
-            # Return a dictionary with the results
-            return {
-                "winner": winner,
-                "challenger_id": challenge.challenger_id,
-                "challengee_id": challenge.challengee_id,
-                "challenger_points": challenge.challenger_points,
-                "challengee_points": challenge.challengee_points,
-                "challenge_id": challenge.id,
-                "challenger_pic_points": challenge.challenger_pic_points,
-                "challengee_pic_points": challenge.challengee_pic_points,
-            }
-
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
-
-
-# -----------------------------------------------------------------------
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
+        if challenge is None:
+            logger.warning("Challenge %s not found.", challenge_id)
+            return
 
-# pseudo randomly create a list of 5 picture IDs for a challenge
-def create_random_versus(session):
-    random.seed()
+        # Determine the winner or if it's a tie
+        if challenge.challenger_points > challenge.challengee_points:
+            winner = challenge.challenger_id
+        elif challenge.challengee_points > challenge.challenger_points:
+            winner = challenge.challengee_id
+        else:
+            winner = "Tie"
 
-    try:
-        # USE the passed 'session' variable directly
-        
-        # Query all picture IDs using the passed session
-        # picture_ids = [p.pictureid for p in session.query(Picture.pictureid).all()]
+        # Return a dictionary with the results
+        return {
+            "winner": winner,
+            "challenger_id": challenge.challenger_id,
+            "challengee_id": challenge.challengee_id,
+            "challenger_points": challenge.challenger_points,
+            "challengee_points": challenge.challengee_points,
+            "challenge_id": challenge.id,
+            "challenger_pic_points": challenge.challenger_pic_points,
+            "challengee_pic_points": challenge.challengee_pic_points,
+        }
 
-        # Access p[0] because query(Column) returns a list of tuples [(1,), (2,)...]
-        picture_ids = [p[0] for p in session.query(Picture.pictureid).all()]
 
-        if not picture_ids:
-            print("No pictures found in database.")
-            return [1] * 5
+# -----------------------------------------------------------------------
 
-        # Generate 5 unique pseudo-random IDs from the available IDs
-        # If fewer than 5 pictures exist, sample with replacement or just take all
-        if len(picture_ids) < 5:
-            random_indices = random.choices(picture_ids, k=5)
-        else:
-            random_indices = random.sample(picture_ids, 5)
 
-        return random_indices
+# pseudo randomly create a list of 5 distinct picture IDs for a
+# challenge, avoiding pictures either player had in a recent challenge
+def create_random_versus(session, challenge=None):
+    if challenge is None:
+        return rounds.select_rounds(session)
 
-    except Exception as error:
-        print(f"Error creating random versus list: {error}")
-        return [1, 2, 3, 4, 5]
+    players = [challenge.challenger_id, challenge.challengee_id]
+    return rounds.select_rounds(
+        session,
+        rng=rounds.rng_for(challenge.id),
+        avoid=rounds.seen_by(session, players),
+    )
 
 
 # -----------------------------------------------------------------------
 
 
 # Return the versusList for a given challenge ID
+@database_operation
 def get_random_versus(challenge_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-            if challenge is None:
-                return None
+        if challenge is None:
+            return None
 
-            return challenge.versuslist
+        return challenge.versuslist
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+
+# -----------------------------------------------------------------------
+
+
+# Returns the pictures of an accepted or completed challenge in round
+# order, as dicts of pictureid, link, coordinates and place, using one
+# query. Entries whose picture no longer exists have link None. Returns
+# None if the challenge does not exist or has not been accepted.
+@database_operation
+def get_versus_pictures(challenge_id):
+    with get_session() as session:
+        rows = session.execute(
+            text(
+                """
+                SELECT v.pictureid, p.link, p.coordinates, p.place
+                FROM challenges c
+                CROSS JOIN LATERAL unnest(c.versuslist)
+                    WITH ORDINALITY AS v(pictureid, round)
+                LEFT JOIN pictures p ON p.pictureid = v.pictureid
+                WHERE c.id = :challenge_id
+                  AND c.status IN ('accepted', 'completed')
+                ORDER BY v.round
+                """
+            ),
+            {"challenge_id": int(challenge_id)},
+        ).all()
+
+        if not rows:
+            return None
+
+        return [
+            {
+                "pictureid": row.pictureid,
+                "link": row.link,
+                "coordinates": row.coordinates,
+                "place": row.place,
+            }
+            for row in rows
+        ]
 
 
 # -----------------------------------------------------------------------
 
 
 # Update if a player has started a given challenge or not
+@database_operation
 def update_playbutton_status(challenge_id, user_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                return
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-            # Depending on whether the user is the challenger or the challengee
-            if user_id == challenge.challenger_id:
-                challenge.playger_button_status = True
-            elif user_id == challenge.challengee_id:
-                challenge.playgee_button_status = True
-            else:
-                return
+        if challenge is None:
+            return
 
-        return "success"
+        # Depending on whether the user is the challenger or the challengee
+        if user_id == challenge.challenger_id:
+            challenge.playger_button_status = True
+        elif user_id == challenge.challengee_id:
+            challenge.playgee_button_status = True
+        else:
+            return
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
 
 # Get the play button status for a given user in a given challenge
+@database_operation
 def get_playbutton_status(challenge_id, user_id):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                print("Challenge not found.")
-                return None
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-            # Depending on whether the user is the challenger or the challengee
-            if user_id == challenge.challenger_id:
-                return challenge.playger_button_status
-            elif user_id == challenge.challengee_id:
-                return challenge.playgee_button_status
-            else:
-                return None
+        if challenge is None:
+            logger.info("Challenge %s not found.", challenge_id)
+            return None
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+        # Depending on whether the user is the challenger or the challengee
+        if user_id == challenge.challenger_id:
+            return challenge.playger_button_status
+        elif user_id == challenge.challengee_id:
+            return challenge.playgee_button_status
+        else:
+            return None
 
 
 # -----------------------------------------------------------------------
@@ -471,6 +597,4 @@ if __name__ == "__main__":
     print(get_random_versus("1"))
     print(update_playbutton_status("1", "123"))
     print(get_playbutton_status("1", "123"))
-    print(clear_user_challenges("123"))
-    print(clear_user_challenges("abc"))
     print(clear_challenges_table())
@@ -2,80 +2,90 @@
 # daily_user_database.py
 # -----------------------------------------------------------------------
 
+import datetime
+
 from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
 
-from src.db import get_session
-from src.models import UserDaily
+from src.db import get_session, read_only, transactional
+from src.errors import RecordNotFoundError, database_operation
+from src.models import User, UserDaily
 
 # -----------------------------------------------------------------------
 
-# Inserts username into usersDaily table.
+# Inserts username into usersDaily table unless it is already there.
 
 
+@database_operation
 def insert_player_daily(username):
-    try:
-        with get_session() as session:
-            session.execute(text("SET TIME ZONE 'America/New_York'"))
-            existing = session.query(UserDaily).filter_by(username=username).first()
-
-            if existing is None:
-                new_user = UserDaily(
-                    username=username,
-                    points=0,
-                    distance=0,
-                    played=False,
-                    first_played=func.current_date(),
-                    last_played=None,
-                    last_versus=None,
-                    current_streak=0,
-                )
-                session.add(new_user)
-
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    with get_session() as session:
+        session.execute(
+            insert(UserDaily)
+            .values(
+                username=username,
+                points=0,
+                distance=0,
+                played=False,
+                first_played=func.date(
+                    func.timezone("America/New_York", func.now())
+                ),
+                last_played=None,
+                last_versus=None,
+                current_streak=0,
+            )
+            .on_conflict_do_nothing(index_elements=[UserDaily.username])
+        )
+
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
-# Updates username's daily stats with new points and distance.
-# Updates that username has played at current date and updates streaks.
+# Records username's daily guess: their daily points, distance and
+# streak, and points added to their total in users, in one transaction.
+# The usersDaily row lock makes concurrent submissions queue up, and a
+# day already recorded returns "already_played" without writing, so a
+# retry or a duplicate request cannot count the points twice.
 
 
-def update_player_daily(username, points, distance):
-    try:
-        with get_session() as session:
-            # Set timezone
-            session.execute(text("SET TIME ZONE 'America/New_York'"))
+@transactional
+def update_player_daily(session, username, points, distance):
+    # Set timezone
+    session.execute(text("SET TIME ZONE 'America/New_York'"))
 
-            user = session.query(UserDaily).filter_by(username=username).first()
+    # row lock so concurrent submissions for one user queue up
+    user = (
+        session.query(UserDaily)
+        .filter_by(username=username)
+        .with_for_update()
+        .first()
+    )
 
-            if user is None:
-                return "database error"
+    if user is None:
+        raise RecordNotFoundError(f"no usersDaily row for {username}")
 
-            # Calculate new streak and record first play date when needed
-            if user.last_played is None:
-                new_streak = 1
-            elif user.last_played == func.date(
-                func.current_date() - text("INTERVAL '1 day'")
-            ):
-                new_streak = user.current_streak + 1
-            else:
-                new_streak = 1
+    today = session.execute(text("SELECT current_date")).scalar()
+    if user.played and user.last_played == today:
+        return "already_played"
 
-            user.points = points
-            user.distance = distance
-            user.played = True
-            user.current_streak = new_streak
-            user.last_played = func.current_date()
+    # Calculate new streak and record first play date when needed
+    if user.last_played == today - datetime.timedelta(days=1):
+        new_streak = user.current_streak + 1
+    else:
+        new_streak = 1
 
-        return "success"
+    user.points = points
+    user.distance = distance
+    user.played = True
+    user.current_streak = new_streak
+    user.last_played = today
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    # added in the database, so no total read earlier can be written back
+    session.query(User).filter_by(username=username).update(
+        {User.points: User.points + points}, synchronize_session=False
+    )
+
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -83,21 +93,17 @@ def update_player_daily(username, points, distance):
 # Updates username's last_versus to current date.
 
 
+@database_operation
 def update_player_versus(username):
-    try:
-        with get_session() as session:
-            session.execute(text("SET TIME ZONE 'America/New_York'"))
-
-            user = session.query(UserDaily).filter_by(username=username).first()
+    with get_session() as session:
+        session.execute(text("SET TIME ZONE 'America/New_York'"))
 
-            if user:
-                user.last_versus = func.current_date()
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-        return "success"
+        if user:
+            user.last_versus = func.current_date()
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -105,19 +111,15 @@ def update_player_versus(username):
 # Returns whether username has played for the day or not.
 
 
+@database_operation
 def player_played(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            if user is None:
-                return False
+        if user is None:
+            return False
 
-            return user.played
-
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.played
 
 
 # -----------------------------------------------------------------------
@@ -125,22 +127,18 @@ def player_played(username):
 # Resets the user's daily points, distance, and if they have played.
 
 
+@database_operation
 def reset_player(username):
-    try:
-        with get_session() as session:
-            session.query(UserDaily).filter_by(username=username).update(
-                {
-                    UserDaily.played: False,
-                    UserDaily.points: 0,
-                    UserDaily.distance: 0,
-                }
-            )
+    with get_session() as session:
+        session.query(UserDaily).filter_by(username=username).update(
+            {
+                UserDaily.played: False,
+                UserDaily.points: 0,
+                UserDaily.distance: 0,
+            }
+        )
 
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -148,24 +146,20 @@ def reset_player(username):
 # Resets all players' daily points, distance, and if they have played.
 
 
+@database_operation
 def reset_players():
-    try:
-        with get_session() as session:
-            session.query(UserDaily).update(
-                {
-                    UserDaily.played: False,
-                    UserDaily.points: 0,
-                    UserDaily.distance: 0,
-                    UserDaily.last_played: None,
-                    UserDaily.current_streak: 0,
-                }
-            )
+    with get_session() as session:
+        session.query(UserDaily).update(
+            {
+                UserDaily.played: False,
+                UserDaily.points: 0,
+                UserDaily.distance: 0,
+                UserDaily.last_played: None,
+                UserDaily.current_streak: 0,
+            }
+        )
 
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -173,19 +167,15 @@ def reset_players():
 # Returns the date when the username last played.
 
 
+@database_operation
 def get_last_played_date(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
-
-            if user is None or user.last_played is None:
-                return 0
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            return user.last_played
+        if user is None or user.last_played is None:
+            return 0
 
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.last_played
 
 
 # -----------------------------------------------------------------------
@@ -193,19 +183,15 @@ def get_last_played_date(username):
 # Returns the date when the username last used the versus mode.
 
 
+@database_operation
 def get_last_versus_date(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
-
-            if user is None or user.last_versus is None:
-                return 0
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            return user.last_versus
+        if user is None or user.last_versus is None:
+            return 0
 
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.last_versus
 
 
 # -----------------------------------------------------------------------
@@ -213,19 +199,15 @@ def get_last_versus_date(username):
 # Returns username's streak.
 
 
+@database_operation
 def get_streak(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            if user is None:
-                return 0
+        if user is None:
+            return 0
 
-            return user.current_streak
-
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.current_streak
 
 
 # -----------------------------------------------------------------------
@@ -233,19 +215,15 @@ def get_streak(username):
 # Returns username's daily points.
 
 
+@database_operation
 def get_daily_points(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
-
-            if user is None:
-                return 0
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            return user.points
+        if user is None:
+            return 0
 
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.points
 
 
 # -----------------------------------------------------------------------
@@ -253,19 +231,15 @@ def get_daily_points(username):
 # Returns username's guess distance.
 
 
+@database_operation
 def get_daily_distance(username):
-    try:
-        with get_session() as session:
-            user = session.query(UserDaily).filter_by(username=username).first()
+    with get_session() as session:
+        user = session.query(UserDaily).filter_by(username=username).first()
 
-            if user is None:
-                return 0
+        if user is None:
+            return 0
 
-            return user.distance
-
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.distance
 
 
 # -----------------------------------------------------------------------
@@ -274,29 +248,26 @@ def get_daily_distance(username):
 # scoring players for the day.
 
 
+@database_operation
+@read_only
 def get_daily_top_players():
-    try:
-        with get_session() as session:
-            daily_top_players = []
-            session.execute(text("SET TIME ZONE 'America/New_York'"))
-
-            users = (
-                session.query(UserDaily)
-                .filter(UserDaily.last_played == func.current_date())
-                .order_by(UserDaily.points.desc(), UserDaily.username.asc())
-                .limit(10)
-                .all()
-            )
+    with get_session() as session:
+        daily_top_players = []
+        session.execute(text("SET TIME ZONE 'America/New_York'"))
 
-            for user in users:
-                player_stats = {"username": user.username, "points": user.points}
-                daily_top_players.append(player_stats)
+        users = (
+            session.query(UserDaily)
+            .filter(UserDaily.last_played == func.current_date())
+            .order_by(UserDaily.points.desc(), UserDaily.username.asc())
+            .limit(10)
+            .all()
+        )
 
-        return daily_top_players
+        for user in users:
+            player_stats = {"username": user.username, "points": user.points}
+            daily_top_players.append(player_stats)
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return daily_top_players
 
 
 # -----------------------------------------------------------------------
@@ -304,32 +275,29 @@ def get_daily_top_players():
 # Returns username's daily rank among all players who played for the day.
 
 
+@database_operation
+@read_only
 def get_daily_rank(username):
-    try:
-        with get_session() as session:
-            session.execute(text("SET TIME ZONE 'America/New_York'"))
-
-            ranked_query = (
-                session.query(
-                    UserDaily.username,
-                    UserDaily.points,
-                    func.dense_rank()
-                    .over(order_by=(UserDaily.points.desc(), UserDaily.username.asc()))
-                    .label("rank"),
-                )
-                .filter(UserDaily.last_played == func.current_date())
-                .all()
+    with get_session() as session:
+        session.execute(text("SET TIME ZONE 'America/New_York'"))
+
+        ranked_query = (
+            session.query(
+                UserDaily.username,
+                UserDaily.points,
+                func.dense_rank()
+                .over(order_by=(UserDaily.points.desc(), UserDaily.username.asc()))
+                .label("rank"),
             )
+            .filter(UserDaily.last_played == func.current_date())
+            .all()
+        )
 
-            for player in ranked_query:
-                if player.username == username:
-                    return player.rank
+        for player in ranked_query:
+            if player.username == username:
+                return player.rank
 
-            return "Play Today's Game!"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+        return "Play Today's Game!"
 
 
 # -----------------------------------------------------------------------
@@ -337,16 +305,12 @@ def get_daily_rank(username):
 # Removes username from the usersDaily table.
 
 
+@database_operation
 def remove_daily_user(username):
-    try:
-        with get_session() as session:
-            session.query(UserDaily).filter_by(username=username).delete()
-
-        return "success"
+    with get_session() as session:
+        session.query(UserDaily).filter_by(username=username).delete()
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
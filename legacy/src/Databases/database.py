@@ -7,73 +7,64 @@
 from sqlalchemy import func
 
 from src.db import get_session
+from src.errors import database_operation
 from src.models import Challenge, Match, Picture, User, UserDaily
 
 # -----------------------------------------------------------------------
 
 
 # returns all the values from a specified column in a table in the form of an array of tuples
+@database_operation
 def query(column, table):
-    try:
-        # Map table names to models
-        model_map = {
-            "users": User,
-            "usersdaily": UserDaily,
-            "pictures": Picture,
-            "challenges": Challenge,
-            "matches": Match,
-        }
-
-        model = model_map.get(table.lower())
-
-        if model is None:
-            print(f"Unknown table: {table}")
-            return "database error"
-
-        with get_session() as session:
-            if column == "*":
-                # Return all columns
-                rows = session.query(model).all()
-                return [(row,) for row in rows]
-            else:
-                # Return specific column
-                rows = session.query(getattr(model, column)).all()
-                return rows
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    # Map table names to models
+    model_map = {
+        "users": User,
+        "usersdaily": UserDaily,
+        "pictures": Picture,
+        "challenges": Challenge,
+        "matches": Match,
+    }
+
+    model = model_map.get(table.lower())
+
+    if model is None:
+        raise ValueError(f"Unknown table: {table}")
+
+    with get_session() as session:
+        if column == "*":
+            # Return all columns
+            rows = session.query(model).all()
+            return [(row,) for row in rows]
+        else:
+            # Return specific column
+            rows = session.query(getattr(model, column)).all()
+            return rows
 
 
 # -----------------------------------------------------------------------
 
 
 # Returns the number of rows in a table
+@database_operation
 def get_table_size(table):
-    try:
-        # Map table names to models
-        model_map = {
-            "users": User,
-            "usersdaily": UserDaily,
-            "pictures": Picture,
-            "challenges": Challenge,
-            "matches": Match,
-        }
-
-        model = model_map.get(table.lower())
-
-        if model is None:
-            print(f"Unknown table: {table}")
-            return "database error"
-
-        with get_session() as session:
-            count = session.query(func.count()).select_from(model).scalar()
-            print(f"Returning number of rows in table '{table}'")
-            return count
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    # Map table names to models
+    model_map = {
+        "users": User,
+        "usersdaily": UserDaily,
+        "pictures": Picture,
+        "challenges": Challenge,
+        "matches": Match,
+    }
+
+    model = model_map.get(table.lower())
+
+    if model is None:
+        raise ValueError(f"Unknown table: {table}")
+
+    with get_session() as session:
+        count = session.query(func.count()).select_from(model).scalar()
+        print(f"Returning number of rows in table '{table}'")
+        return count
 
 
 # -----------------------------------------------------------------------
@@ -2,50 +2,56 @@
 # matches_database.py
 # -----------------------------------------------------------------------
 
-from src.db import get_session
+from src import events
+from src.db import get_session, transactional
+from src.errors import database_operation
 from src.models import Challenge, Match
 
 
 # -----------------------------------------------------------------------
 # Clear the matches table
+@database_operation
 def clear_matches_table():
-    try:
-        with get_session() as session:
-            session.query(Match).delete()
+    with get_session() as session:
+        session.query(Match).delete()
 
-        return "success"
-
-    except Exception as error:
-        print(f"Error clearing matches table: {error}")
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
 
-# Complete a match
-def complete_match(challenge_id, winner_id, challenger_score, challengee_score):
-    try:
-        with get_session() as session:
-            # Update challenge status
-            session.query(Challenge).filter_by(id=challenge_id).update(
-                {Challenge.status: "completed"}
-            )
-
-            # Create match record
-            new_match = Match(
-                challenge_id=challenge_id,
-                winner_id=winner_id,
-                challenger_score=challenger_score,
-                challengee_score=challengee_score,
-            )
-            session.add(new_match)
+# Complete a match. Both players can finish at the same moment, so the
+# challenge row is locked and a second call adds no second match row.
+@transactional
+def complete_match(
+    session, challenge_id, winner_id, challenger_score, challengee_score
+):
+    challenge = (
+        session.query(Challenge).filter_by(id=challenge_id).with_for_update().first()
+    )
+
+    if challenge is None:
+        return None
 
+    existing = session.query(Match.id).filter_by(challenge_id=challenge_id).first()
+    if existing is not None:
         return "success"
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    # Update challenge status
+    challenge.status = "completed"
+
+    # Create match record
+    new_match = Match(
+        challenge_id=challenge_id,
+        winner_id=winner_id,
+        challenger_score=challenger_score,
+        challengee_score=challengee_score,
+    )
+    session.add(new_match)
+    events.notify(session, "completed", challenge, winner_id=winner_id)
+
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -3,39 +3,48 @@
 # -----------------------------------------------------------------------
 
 import datetime
+import logging
 
-import pytz
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
 
-from src.db import get_session
-from src.models import Picture
+from src import cache
+from src.db import get_session, transactional
+from src.errors import database_operation
+from src.models import DailyPicture, Picture
+
+logger = logging.getLogger("tigerspot.pictures")
 
 # -----------------------------------------------------------------------
 
 
 # Inserts a new row into pictures database table
+@database_operation
 def insert_picture(pictureid, coordinates, link, place):
-    try:
-        with get_session() as session:
-            new_picture = Picture(
-                pictureid=pictureid, coordinates=coordinates, link=link, place=place
-            )
-            session.add(new_picture)
-
-        return "success"
+    with get_session() as session:
+        new_picture = Picture(
+            pictureid=pictureid, coordinates=coordinates, link=link, place=place
+        )
+        session.add(new_picture)
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
 
 
+# pytz is loaded on first use and the zone object reused afterwards
+_eastern = None
+
+
 # Returns the date based on eastern time zone
 def get_current_date():
-    eastern = pytz.timezone("America/New_York")
-    eastern_timezone = datetime.datetime.now(eastern)
+    global _eastern
+    if _eastern is None:
+        import pytz
+
+        _eastern = pytz.timezone("America/New_York")
+    eastern_timezone = datetime.datetime.now(_eastern)
     eastern_date = eastern_timezone.date()
     return eastern_date
 
@@ -43,41 +52,118 @@ def get_current_date():
 # -----------------------------------------------------------------------
 
 
-# Checks the current date and returns associated picture id
+# Returns the id of the picture for day_of_year: pictures take turns in
+# id order, skipping ones removed from Cloudinary. Only used to pick a
+# date's picture the first time it is asked for (see _pin_pic_for_day).
+def _pic_for_day(session, day_of_year):
+    picture_count = (
+        session.query(func.count(Picture.pictureid))
+        .filter(Picture.deleted_at.is_(None))
+        .scalar()
+    )
+    if not picture_count:
+        return None
+
+    return (
+        session.query(Picture.pictureid)
+        .filter(Picture.deleted_at.is_(None))
+        .order_by(Picture.pictureid)
+        .offset((day_of_year - 1) % picture_count)
+        .limit(1)
+        .scalar()
+    )
+
+
+# Returns the picture id pinned to date, choosing and storing it first if
+# the date has none. A picture added or removed later in the day changes
+# the rotation but not a date already pinned, so a guess is always scored
+# against the picture the player was shown. Concurrent first requests
+# both insert with ON CONFLICT DO NOTHING and read back the same row.
+# Returns None if there are no pictures to choose from.
+@transactional
+def _pin_pic_for_day(session, date):
+    pinned = select(DailyPicture.pictureid).where(DailyPicture.date == date)
+    pictureid = session.scalar(pinned)
+    if pictureid is not None:
+        return pictureid
+
+    pictureid = _pic_for_day(session, date.timetuple().tm_yday)
+    if pictureid is None:
+        return None
+    session.execute(
+        insert(DailyPicture)
+        .values(date=date, pictureid=pictureid)
+        .on_conflict_do_nothing(index_elements=[DailyPicture.date])
+    )
+    return session.scalar(pinned)
+
+
+# Checks the current date and returns associated picture id, or 1 while
+# the catalog is empty. Cached for the day; the cached value only ever
+# comes from the date's pinned row.
 def pic_of_day():
     eastern_date = get_current_date()
-    day_of_year = eastern_date.timetuple().tm_yday
-
-    # Get total number of pictures
-    try:
-        with get_session() as session:
-            picture_count = session.query(func.count(Picture.pictureid)).scalar()
-    except Exception as error:
-        print(error)
+    pictureid = cache.cached_value(
+        "pic_of_day",
+        lambda: _pin_pic_for_day(eastern_date),
+        tags=("pictures",),
+        date=eastern_date.isoformat(),
+    )
+    if pictureid is None:
+        logger.warning("No pictures found in database.")
         return 1
-
-    picture_id = (day_of_year - 1) % picture_count + 1
-    return picture_id
+    return pictureid
 
 
 # -----------------------------------------------------------------------
 
 
-# Returns specified information of picture using its id
-def get_pic_info(col, id):
-    try:
-        with get_session() as session:
-            picture = session.query(Picture).filter_by(pictureid=id).first()
+def _pic_info(col, id):
+    with get_session() as session:
+        picture = session.query(Picture).filter_by(pictureid=id).first()
+
+        if picture is None:
+            return None
 
-            if picture is None:
-                return None
+        # Return the requested column
+        return getattr(picture, col)
 
-            # Return the requested column
-            return getattr(picture, col)
 
-    except Exception as error:
-        print(error)
-        return "database error"
+# Returns specified information of picture using its id
+@database_operation
+def get_pic_info(col, id):
+    return cache.cached_value(
+        "pic_info",
+        lambda: _pic_info(col, id),
+        tags=("pictures",),
+        col=col,
+        id=str(id),
+    )
+
+
+
+def _picture(id):
+    with get_session() as session:
+        picture = session.query(Picture).filter_by(pictureid=id).first()
+
+        if picture is None:
+            return None
+
+        return {
+            "pictureid": picture.pictureid,
+            "link": picture.link,
+            "coordinates": picture.coordinates,
+            "place": picture.place,
+        }
+
+
+# Returns a picture's id, link, coordinates and place in one query, or
+# None if there is no such picture
+@database_operation
+def get_picture(id):
+    return cache.cached_value(
+        "picture", lambda: _picture(id), tags=("pictures",), id=str(id)
+    )
 
 
 # -----------------------------------------------------------------------
@@ -0,0 +1,47 @@
+# -----------------------------------------------------------------------
+# seen_database.py
+# -----------------------------------------------------------------------
+
+from sqlalchemy import text
+
+from src.db import get_session
+from src.errors import database_operation
+
+# -----------------------------------------------------------------------
+
+
+# Sets picture pictureid's bit in username's seen bitmap, growing the
+# bitmap with zero bytes when the id is past its end. One statement and
+# no read back, so a round costs the same however much was seen before.
+@database_operation
+def mark_seen(username, pictureid):
+    if pictureid is None or pictureid < 0:
+        return "success"
+
+    with get_session() as session:
+        session.execute(
+            text(
+                """
+                INSERT INTO user_seen_pictures (username, seen)
+                VALUES (
+                    :username,
+                    set_bit(decode(repeat('00', :pictureid / 8 + 1), 'hex'), :pictureid, 1)
+                )
+                ON CONFLICT (username) DO UPDATE SET seen = set_bit(
+                    CASE
+                        WHEN length(user_seen_pictures.seen) > :pictureid / 8
+                        THEN user_seen_pictures.seen
+                        ELSE user_seen_pictures.seen || decode(
+                            repeat('00', :pictureid / 8 + 1 - length(user_seen_pictures.seen)),
+                            'hex'
+                        )
+                    END,
+                    :pictureid,
+                    1
+                )
+                """
+            ),
+            {"username": username, "pictureid": int(pictureid)},
+        )
+
+    return "success"
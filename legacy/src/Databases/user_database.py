@@ -3,30 +3,64 @@
 # -----------------------------------------------------------------------
 
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 
-from src.db import get_session
-from src.models import User
+from src.db import get_session, read_only
+from src.errors import database_operation
+from src.models import User, UserDaily
 
 # -----------------------------------------------------------------------
 
-# Inserts username into users table.
+# Inserts username into users table unless it is already there.
 
 
+@database_operation
 def insert_player(username):
-    try:
-        with get_session() as session:
-            # Check if username exists
-            existing = session.query(User).filter_by(username=username).first()
+    with get_session() as session:
+        session.execute(
+            insert(User)
+            .values(username=username, points=0)
+            .on_conflict_do_nothing(index_elements=[User.username])
+        )
 
-            if existing is None:
-                new_user = User(username=username, points=0)
-                session.add(new_user)
+    return "success"
 
-        return "success"
 
-    except Exception as error:
-        print(error)
-        return "database error"
+# -----------------------------------------------------------------------
+
+# Makes sure username has a row in both users and usersDaily, in one
+# statement and one round trip. ON CONFLICT DO NOTHING makes it safe for
+# two tabs logging in at once.
+
+
+@database_operation
+def ensure_player(username):
+    new_user = (
+        insert(User)
+        .values(username=username, points=0)
+        .on_conflict_do_nothing(index_elements=[User.username])
+        .cte("new_user")
+    )
+    statement = (
+        insert(UserDaily)
+        .values(
+            username=username,
+            points=0,
+            distance=0,
+            played=False,
+            first_played=func.date(func.timezone("America/New_York", func.now())),
+            last_played=None,
+            last_versus=None,
+            current_streak=0,
+        )
+        .on_conflict_do_nothing(index_elements=[UserDaily.username])
+        .add_cte(new_user)
+    )
+
+    with get_session() as session:
+        session.execute(statement)
+
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -34,21 +68,17 @@ def insert_player(username):
 # Resets username's total points to 0.
 
 
+@database_operation
 def reset_player_total_points(username):
-    try:
-        with get_session() as session:
-            user = session.query(User).filter_by(username=username).first()
+    with get_session() as session:
+        user = session.query(User).filter_by(username=username).first()
 
-            if user is None:
-                return
+        if user is None:
+            return
 
-            user.points = 0
+        user.points = 0
 
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -56,16 +86,12 @@ def reset_player_total_points(username):
 # Resets all players to 0 points.
 
 
+@database_operation
 def reset_all_players_total_points():
-    try:
-        with get_session() as session:
-            session.query(User).update({User.points: 0})
-
-        return "success"
+    with get_session() as session:
+        session.query(User).update({User.points: 0})
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -73,18 +99,14 @@ def reset_all_players_total_points():
 # Updates username's total points with points.
 
 
+@database_operation
 def update_player(username, points):
-    try:
-        with get_session() as session:
-            session.query(User).filter_by(username=username).update(
-                {User.points: points}
-            )
+    with get_session() as session:
+        session.query(User).filter_by(username=username).update(
+            {User.points: points}
+        )
 
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -92,19 +114,15 @@ def update_player(username, points):
 # Returns username's points.
 
 
+@database_operation
 def get_points(username):
-    try:
-        with get_session() as session:
-            user = session.query(User).filter_by(username=username).first()
-
-            if user is None:
-                return 0
+    with get_session() as session:
+        user = session.query(User).filter_by(username=username).first()
 
-            return user.points
+        if user is None:
+            return 0
 
-    except Exception as error:
-        print(error)
-        return "database error"
+        return user.points
 
 
 # -----------------------------------------------------------------------
@@ -112,27 +130,24 @@ def get_points(username):
 # Returns username's total rank among all players.
 
 
+@database_operation
+@read_only
 def get_rank(username):
-    try:
-        with get_session() as session:
-            # Use window function to calculate rank
-            ranked_query = session.query(
-                User.username,
-                User.points,
-                func.dense_rank()
-                .over(order_by=(User.points.desc(), User.username.asc()))
-                .label("rank"),
-            ).all()
-
-            for player in ranked_query:
-                if player.username == username:
-                    return player.rank
+    with get_session() as session:
+        # Use window function to calculate rank
+        ranked_query = session.query(
+            User.username,
+            User.points,
+            func.dense_rank()
+            .over(order_by=(User.points.desc(), User.username.asc()))
+            .label("rank"),
+        ).all()
 
-            return "Player not found"
+        for player in ranked_query:
+            if player.username == username:
+                return player.rank
 
-    except Exception as error:
-        print(error)
-        return "database error"
+        return "Player not found"
 
 
 # -----------------------------------------------------------------------
@@ -141,26 +156,23 @@ def get_rank(username):
 # scoring players.
 
 
+@database_operation
+@read_only
 def get_top_players():
-    try:
-        with get_session() as session:
-            top_players = []
-            users = (
-                session.query(User)
-                .order_by(User.points.desc(), User.username.asc())
-                .limit(10)
-                .all()
-            )
-
-            for user in users:
-                player_stats = {"username": user.username, "points": user.points}
-                top_players.append(player_stats)
-
-        return top_players
+    with get_session() as session:
+        top_players = []
+        users = (
+            session.query(User)
+            .order_by(User.points.desc(), User.username.asc())
+            .limit(10)
+            .all()
+        )
+
+        for user in users:
+            player_stats = {"username": user.username, "points": user.points}
+            top_players.append(player_stats)
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return top_players
 
 
 # -----------------------------------------------------------------------
@@ -168,16 +180,12 @@ def get_top_players():
 # Removes username from the users table.
 
 
+@database_operation
 def remove_from_user_table(username):
-    try:
-        with get_session() as session:
-            session.query(User).filter_by(username=username).delete()
+    with get_session() as session:
+        session.query(User).filter_by(username=username).delete()
 
-        return "success"
-
-    except Exception as error:
-        print(error)
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -185,19 +193,15 @@ def remove_from_user_table(username):
 # Returns all players in users table.
 
 
+@database_operation
 def get_players():
-    try:
-        with get_session() as session:
-            # SQLAlchemy 2.x returns Row objects/tuples for column queries;
-            # unwrap first column to plain strings for robustness
-            users = session.query(User.username).all()
-            user_ids = [row[0] for row in users]
-
-        return user_ids
+    with get_session() as session:
+        # SQLAlchemy 2.x returns Row objects/tuples for column queries;
+        # unwrap first column to plain strings for robustness
+        users = session.query(User.username).all()
+        user_ids = [row[0] for row in users]
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return user_ids
 
 
 # -----------------------------------------------------------------------
@@ -205,26 +209,22 @@ def get_players():
 # Returns number one player's username and points
 
 
+@database_operation
 def get_top_player():
-    try:
-        with get_session() as session:
-            user = (
-                session.query(User)
-                .order_by(User.points.desc(), User.username.asc())
-                .limit(1)
-                .first()
-            )
-
-            if user is None:
-                return {"username": None, "points": 0}
+    with get_session() as session:
+        user = (
+            session.query(User)
+            .order_by(User.points.desc(), User.username.asc())
+            .limit(1)
+            .first()
+        )
 
-            player_stats = {"username": user.username, "points": user.points}
+        if user is None:
+            return {"username": None, "points": 0}
 
-        return player_stats
+        player_stats = {"username": user.username, "points": user.points}
 
-    except Exception as error:
-        print(error)
-        return "database error"
+    return player_stats
 
 
 # -----------------------------------------------------------------------
@@ -234,6 +234,7 @@ if __name__ == "__main__":
     print(get_top_player())
     print(get_players())
     print(insert_player("test"))
+    print(ensure_player("test"))
     print(update_player("test", 30000))
     print(get_points("test"))
     print(get_rank("test"))
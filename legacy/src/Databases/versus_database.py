@@ -2,38 +2,51 @@
 # versus_database.py
 # -----------------------------------------------------------------------
 
-from src.db import get_session
+from src.db import get_session, transactional
+from src.errors import database_operation
 from src.models import Challenge, Match
 
 # -----------------------------------------------------------------------
 
 
-# Update cumulative points for a user in a given challenge
-def update_versus_points(challenge_id, user_id, additional_points):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                return
-
-            # Determine if user is challenger or challengee
-            if user_id == challenge.challenger_id:
-                challenge.challenger_points = (
-                    challenge.challenger_points or 0
-                ) + additional_points
-            elif user_id == challenge.challengee_id:
-                challenge.challengee_points = (
-                    challenge.challengee_points or 0
-                ) + additional_points
-            else:
-                return
+# Records user_id's points for round index (1-based) of challenge_id:
+# the round's points, the running total and the round's status, in one
+# transaction. The round only counts while it is not yet answered, so a
+# retry after a lost commit, or a second submit, cannot add it twice.
+# Returns "success", "already_submitted", or None if the challenge does
+# not exist or user_id is not in it.
+@transactional
+def record_round(session, challenge_id, user_id, index, points):
+    # row lock so both players' rounds add up instead of overwriting
+    challenge = (
+        session.query(Challenge).filter_by(id=challenge_id).with_for_update().first()
+    )
+
+    if challenge is None:
+        return None
+
+    # Determine if user is challenger or challengee
+    if user_id == challenge.challenger_id:
+        side = "challenger"
+    elif user_id == challenge.challengee_id:
+        side = "challengee"
+    else:
+        return None
 
-        return "success"
+    answered = list(getattr(challenge, f"{side}_bool") or [False] * 5)
+    if answered[index - 1]:
+        return "already_submitted"
+    answered[index - 1] = True
+    pic_points = list(getattr(challenge, f"{side}_pic_points") or [0] * 5)
+    pic_points[index - 1] = points
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+    # new lists rather than in-place edits, so the arrays are written
+    setattr(challenge, f"{side}_bool", answered)
+    setattr(challenge, f"{side}_pic_points", pic_points)
+    setattr(
+        challenge, f"{side}_points", (getattr(challenge, f"{side}_points") or 0) + points
+    )
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -56,123 +69,116 @@ def calculate_versus(distance, time):
 
 # -----------------------------------------------------------------------
 # Return winner of a given challenge
+@database_operation
 def get_winner(challenge_id):
-    try:
-        with get_session() as session:
-            match = session.query(Match).filter_by(challenge_id=challenge_id).first()
+    with get_session() as session:
+        match = session.query(Match).filter_by(challenge_id=challenge_id).first()
 
-            if match is None:
-                return None
-            else:
-                return match.winner_id
-
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+        if match is None:
+            return None
+        else:
+            return match.winner_id
 
 
 # -----------------------------------------------------------------------
 
 
-# Update the status of a versus challenge picture
-def update_versus_pic_status(challenge_id, user_id, index):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+# Marks rounds (1-based) of challenge_id as answered by user_id, under
+# the same row lock as record_round so neither overwrites the other's
+# array. Returns None if the challenge does not exist or user_id is not
+# in it.
+def _mark_answered(session, challenge_id, user_id, rounds):
+    challenge = (
+        session.query(Challenge).filter_by(id=challenge_id).with_for_update().first()
+    )
 
-            if challenge is None:
-                return
+    if challenge is None:
+        return None
 
-            # Determine if user is challenger or challengee
-            if user_id == challenge.challenger_id:
-                if challenge.challenger_bool is None:
-                    challenge.challenger_bool = [False] * 5
-                # PostgreSQL arrays are 1-indexed, Python lists are 0-indexed
-                challenge.challenger_bool[index - 1] = True
-            elif user_id == challenge.challengee_id:
-                if challenge.challengee_bool is None:
-                    challenge.challengee_bool = [False] * 5
-                challenge.challengee_bool[index - 1] = True
-            else:
-                return
+    # Determine if user is challenger or challengee
+    if user_id == challenge.challenger_id:
+        side = "challenger"
+    elif user_id == challenge.challengee_id:
+        side = "challengee"
+    else:
+        return None
 
-            # Mark the object as modified (needed for mutable types like arrays)
-            from sqlalchemy.orm.attributes import flag_modified
+    answered = list(getattr(challenge, f"{side}_bool") or [False] * 5)
+    for index in rounds:
+        answered[index - 1] = True
+    setattr(challenge, f"{side}_bool", answered)
+    return "success"
 
-            flag_modified(challenge, "challenger_bool")
-            flag_modified(challenge, "challengee_bool")
 
-        return "success"
+# Update the status of a versus challenge picture
+@transactional
+def update_versus_pic_status(session, challenge_id, user_id, index):
+    return _mark_answered(session, challenge_id, user_id, [index])
+
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+# Marks every round of challenge_id as answered by user_id, in one
+# transaction, when they forfeit by pressing Play a second time
+@transactional
+def forfeit_rounds(session, challenge_id, user_id):
+    return _mark_answered(session, challenge_id, user_id, range(1, 6))
 
 
 # -----------------------------------------------------------------------
 
 
 # Get the status of a versus challenge picture
+@database_operation
 def get_versus_pic_status(challenge_id, user_id, index):
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                return None
-
-            # Determine if user is challenger or challengee
-            if user_id == challenge.challenger_id:
-                if challenge.challenger_bool is None:
-                    return False
-                return challenge.challenger_bool[index - 1]
-            elif user_id == challenge.challengee_id:
-                if challenge.challengee_bool is None:
-                    return False
-                return challenge.challengee_bool[index - 1]
-            else:
-                return None
-
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
+
+        if challenge is None:
+            return None
+
+        # Determine if user is challenger or challengee
+        if user_id == challenge.challenger_id:
+            if challenge.challenger_bool is None:
+                return False
+            return challenge.challenger_bool[index - 1]
+        elif user_id == challenge.challengee_id:
+            if challenge.challengee_bool is None:
+                return False
+            return challenge.challengee_bool[index - 1]
+        else:
+            return None
 
 
 # -----------------------------------------------------------------------
 
 
 # Store the points for a versus challenge picture
+@database_operation
 def store_versus_pic_points(challenge_id, user_id, index, points):
     from sqlalchemy.orm.attributes import flag_modified
 
-    try:
-        with get_session() as session:
-            challenge = session.query(Challenge).filter_by(id=challenge_id).first()
-
-            if challenge is None:
-                return
+    with get_session() as session:
+        challenge = session.query(Challenge).filter_by(id=challenge_id).first()
 
-            # Determine if user is challenger or challengee
-            if user_id == challenge.challenger_id:
-                if challenge.challenger_pic_points is None:
-                    challenge.challenger_pic_points = [0] * 5
-                challenge.challenger_pic_points[index - 1] = points
+        if challenge is None:
+            return
 
-                flag_modified(challenge, "challenger_pic_points")
-            elif user_id == challenge.challengee_id:
-                if challenge.challengee_pic_points is None:
-                    challenge.challengee_pic_points = [0] * 5
-                challenge.challengee_pic_points[index - 1] = points
+        # Determine if user is challenger or challengee
+        if user_id == challenge.challenger_id:
+            if challenge.challenger_pic_points is None:
+                challenge.challenger_pic_points = [0] * 5
+            challenge.challenger_pic_points[index - 1] = points
 
-                flag_modified(challenge, "challengee_pic_points")
-            else:
-                return
+            flag_modified(challenge, "challenger_pic_points")
+        elif user_id == challenge.challengee_id:
+            if challenge.challengee_pic_points is None:
+                challenge.challengee_pic_points = [0] * 5
+            challenge.challengee_pic_points[index - 1] = points
 
-        return "success"
+            flag_modified(challenge, "challengee_pic_points")
+        else:
+            return
 
-    except Exception as error:
-        print(f"Error: {error}")
-        return "database error"
+    return "success"
 
 
 # -----------------------------------------------------------------------
@@ -180,7 +186,7 @@ def store_versus_pic_points(challenge_id, user_id, index, points):
 # Testing
 if __name__ == "__main__":
     print("Testing")
-    print(update_versus_points("1", "123", 100))
+    print(record_round("1", "123", 2, 100))
     print(calculate_versus(2, 1))
     print(get_winner("1"))
     print(update_versus_pic_status("1", "123", 2))
@@ -0,0 +1,159 @@
+# -----------------------------------------------------------------------
+# api.py
+# Versioned JSON API for the daily game and versus rounds. Uses the same
+# game.py actions as the HTML routes, but answers a round in a single
+# request instead of a page, a redirect and a results page.
+# -----------------------------------------------------------------------
+
+import flask
+
+from src import game
+from src import images
+from src import metrics
+from src import throttle
+from src.errors import DatabaseError
+
+blueprint = flask.Blueprint("api", __name__, url_prefix="/api/v1")
+
+# -----------------------------------------------------------------------
+
+
+# Returns the signed-in username; the API never redirects to CAS, so a
+# client without a session gets a 401 and signs in through the site
+def _username():
+    username = flask.session.get("username")
+    if username is None:
+        flask.abort(_error(401, "not signed in"))
+    return username
+
+
+def _error(status, message):
+    response = flask.jsonify({"error": message})
+    response.status_code = status
+    return response
+
+
+# Returns the JSON body of the request, or aborts with a 400
+def _body():
+    body = flask.request.get_json(silent=True)
+    if not isinstance(body, dict):
+        flask.abort(_error(400, "expected a JSON object"))
+    return body
+
+
+# The picture of a round as the client needs it to show it; where it was
+# taken is only sent back with the result of a guess
+def _picture(link):
+    return {"src": images.variant_url(link), "srcset": images.srcset(link)}
+
+
+@blueprint.errorhandler(DatabaseError)
+def _database_error(error):
+    metrics.DATABASE_ERRORS.inc()
+    return _error(500, "database error")
+
+
+# -----------------------------------------------------------------------
+
+
+@blueprint.route("/daily", methods=["GET"])
+def daily():
+    username = _username()
+    state = game.daily_state(username)
+    payload = {
+        "played": state["played"],
+        "points": state["points"],
+        "distance": state["distance"],
+        "picture": _picture(state["link"]) if state["link"] else None,
+    }
+    return flask.jsonify(payload)
+
+
+# Body: {"lat": 40.34, "lon": -74.65}
+@blueprint.route("/daily", methods=["POST"])
+@throttle.rate_limited("daily")
+def daily_guess():
+    username = _username()
+    body = _body()
+    if body.get("lat") is None or body.get("lon") is None:
+        return _error(400, "lat and lon are required")
+
+    result = game.submit_daily(username, str(body["lat"]), str(body["lon"]))
+    if result is None:
+        return _error(409, "already played today")
+    return flask.jsonify(result)
+
+
+# -----------------------------------------------------------------------
+
+
+# The Play button: starts the challenge, or forfeits it if it was
+# already started (see game.start_challenge)
+@blueprint.route("/challenges/<int:challenge_id>/start", methods=["POST"])
+def challenge_start(challenge_id):
+    username = _username()
+    status = game.start_challenge(challenge_id, username)
+    if status is None:
+        return _error(404, "no such challenge")
+    payload = {"status": status}
+    if status == "started":
+        pictures = game.versus_pictures(challenge_id)
+        if pictures:
+            payload["rounds"] = len(pictures)
+            payload["next"] = {"round": 0, "picture": _picture(pictures[0]["link"])}
+    return flask.jsonify(payload)
+
+
+@blueprint.route("/challenges/<int:challenge_id>/rounds/<int:index>", methods=["GET"])
+def challenge_round(challenge_id, index):
+    username = _username()
+    if not game.has_started(challenge_id, username):
+        return _error(409, "press play first")
+    pictures = game.versus_pictures(challenge_id)
+    if pictures is None or not 0 <= index < len(pictures):
+        return _error(404, "no such round")
+    return flask.jsonify(
+        {
+            "round": index,
+            "rounds": len(pictures),
+            "picture": _picture(pictures[index]["link"]),
+        }
+    )
+
+
+# Body: {"lat": 40.34, "lon": -74.65, "time": 12}, or {} when the timer
+# ran out. The response has the round's result and either the next
+# round's picture or, after the last round, the challenge's status.
+@blueprint.route(
+    "/challenges/<int:challenge_id>/rounds/<int:index>", methods=["POST"]
+)
+@throttle.rate_limited("round")
+def challenge_guess(challenge_id, index):
+    username = _username()
+    if not game.has_started(challenge_id, username):
+        return _error(409, "press play first")
+    body = _body()
+    lat, lon = body.get("lat"), body.get("lon")
+    result = game.submit_round(
+        username,
+        challenge_id,
+        index,
+        str(lat) if lat is not None else None,
+        str(lon) if lon is not None else None,
+        body.get("time"),
+    )
+    if result is None:
+        return _error(404, "no such round")
+
+    # a copy: a repeated guess shares the first guess's result
+    result = dict(result)
+    if index + 1 < result["rounds"]:
+        pictures = game.versus_pictures(challenge_id)
+        result["next"] = {
+            "round": index + 1,
+            "picture": _picture(pictures[index + 1]["link"]),
+        }
+    else:
+        result["next"] = None
+        result["challenge"] = game.finish_challenge(challenge_id, username)
+    return flask.jsonify(result)
@@ -0,0 +1,98 @@
+# -----------------------------------------------------------------------
+# assets.py
+# Content-hashed static file names, so browsers can cache static files
+# for a year and still pick up every change
+# -----------------------------------------------------------------------
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+import flask
+
+# how long browsers and CDNs may keep a fingerprinted file
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# characters of the sha256 kept in the file name
+HASH_LENGTH = 10
+
+# static files worth gzipping; images are compressed already
+COMPRESSIBLE = {"text/css", "text/javascript", "application/javascript", "image/svg+xml"}
+
+# styles/styles.3f2a9c01be.css -> (styles/styles, 3f2a9c01be, .css)
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % HASH_LENGTH)
+
+# -----------------------------------------------------------------------
+
+
+# Returns {filename: digest} for every file under folder, with
+# filenames relative to folder and using forward slashes
+def build_manifest(folder):
+    manifest = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()[:HASH_LENGTH]
+            filename = os.path.relpath(path, folder).replace(os.sep, "/")
+            manifest[filename] = digest
+    return manifest
+
+
+# Returns filename with digest inserted before its extension
+def hashed_name(filename, digest):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+# -----------------------------------------------------------------------
+
+
+# Serves static files under their hashed names with immutable caching;
+# plain names still work, with Flask's default revalidating headers
+def init_app(app):
+    manifest = build_manifest(app.static_folder)
+    # gzipped copies of compressible files, made on first request
+    compressed = {}
+    serve_plain = app.view_functions["static"]
+
+    @app.url_defaults
+    def _hashed_static_url(endpoint, values):
+        if endpoint != "static" or "filename" not in values:
+            return
+        digest = manifest.get(values["filename"])
+        if digest is not None:
+            values["filename"] = hashed_name(values["filename"], digest)
+
+    def serve(filename):
+        match = _HASHED_NAME.match(filename)
+        if match is None:
+            return serve_plain(filename=filename)
+        original = match.group("stem") + match.group("ext")
+        if manifest.get(original) != match.group("digest"):
+            # a name from an old deploy: serve the current file, uncached
+            return serve_plain(filename=original)
+
+        mimetype = mimetypes.guess_type(original)[0] or "application/octet-stream"
+        accepts_gzip = "gzip" in flask.request.headers.get("Accept-Encoding", "")
+        if mimetype in COMPRESSIBLE and accepts_gzip:
+            body = compressed.get(original)
+            if body is None:
+                with open(os.path.join(app.static_folder, original), "rb") as file:
+                    body = gzip.compress(file.read(), compresslevel=9)
+                compressed[original] = body
+            response = flask.Response(body, mimetype=mimetype)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = flask.send_from_directory(
+                app.static_folder, original, conditional=False
+            )
+        response.headers["Vary"] = "Accept-Encoding"
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = serve
@@ -0,0 +1,249 @@
+# -----------------------------------------------------------------------
+# cache.py
+# Pluggable key/value cache backends and the rendered-page cache
+# -----------------------------------------------------------------------
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import flask
+from dotenv import load_dotenv
+
+load_dotenv()
+CACHE_URL = os.environ.get("CACHE_URL", "memory://")
+
+# default lifetime of a rendered page or cached value, in seconds
+DEFAULT_TTL = 300
+
+# -----------------------------------------------------------------------
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache with per-key expiry.
+    Each gunicorn worker gets its own copy, so invalidation only
+    reaches the worker that performed it; use RedisBackend when
+    several workers must agree.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # counters live outside the LRU so they are never evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        # stores value only if key is absent; returns whether it was stored
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry[1] is None or entry[1] >= time.monotonic()
+            ):
+                return False
+            expires = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+# -----------------------------------------------------------------------
+
+
+class RedisBackend:
+    """
+    Cache shared by every worker through a Redis-compatible server
+    (the legacy docker-compose file runs one locally on port 6380).
+    """
+
+    def __init__(self, url, prefix="tigerspot:"):
+        # imported here so the redis package is only needed when used
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._scripts = {}
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def add(self, key, value, ttl=None):
+        return bool(
+            self._client.set(self.prefix + key, pickle.dumps(value), ex=ttl, nx=True)
+        )
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key):
+        # counters are stored as plain integers, not pickles
+        return self._client.incr(self.prefix + "n:" + key)
+
+    def get_counter(self, key):
+        raw = self._client.get(self.prefix + "n:" + key)
+        return int(raw) if raw is not None else 0
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+    # Runs a Lua script atomically on the server, with keys prefixed;
+    # the script is sent once and called by its digest afterwards
+    def run_script(self, source, keys, args):
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self._client.register_script(source)
+        return script(keys=[self.prefix + key for key in keys], args=args)
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns a backend for a cache url: memory:// or redis://host:port/db
+def create_backend(url):
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Returns the process-wide backend configured by CACHE_URL
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(CACHE_URL)
+    return _backend
+
+
+# Replaces the process-wide backend (used by benchmarks and load tests)
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+# -----------------------------------------------------------------------
+
+# Tags group entries that are invalidated together, e.g. "scores" for
+# everything derived from users/usersDaily points. Each tag has a
+# generation number that is folded into every key depending on it, so
+# invalidating a tag is a single increment rather than a key scan.
+
+
+def _generation(tag):
+    return get_backend().get_counter("gen:" + tag)
+
+
+# Invalidates every cached page and value that depends on the given tags
+def invalidate(*tags):
+    backend = get_backend()
+    for tag in tags:
+        backend.incr("gen:" + tag)
+
+
+def _make_key(kind, name, inputs, tags):
+    generations = [(tag, _generation(tag)) for tag in sorted(tags)]
+    digest = hashlib.sha1(
+        repr((sorted(inputs.items()), generations)).encode("utf-8")
+    ).hexdigest()
+    return f"{kind}:{name}:{digest}"
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns the cached result of fn() under name and inputs, computing and
+# storing it on a miss. Exceptions from fn propagate and nothing is stored;
+# a None result is not stored either, so "not there yet" is asked again.
+def cached_value(name, fn, tags=(), ttl=DEFAULT_TTL, **inputs):
+    key = _make_key("value", name, inputs, tags)
+    backend = get_backend()
+    entry = backend.get(key)
+    if entry is not None:
+        return entry[0]
+
+    value = fn()
+    if value is not None:
+        backend.set(key, (value,), ttl)
+    return value
+
+
+# -----------------------------------------------------------------------
+
+
+# Renders template with context, reusing a previously rendered body for
+# the same template and inputs. The response carries an ETag and a
+# Last-Modified header and answers conditional GETs with 304.
+def render_cached(template, tags=(), ttl=DEFAULT_TTL, **context):
+    key = _make_key("page", template, context, tags)
+    backend = get_backend()
+    entry = backend.get(key)
+    if entry is None:
+        body = flask.render_template(template, **context)
+        etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        entry = (body, etag, int(time.time()))
+        backend.set(key, entry, ttl)
+
+    body, etag, last_modified = entry
+    response = flask.make_response(body)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # pages sit behind CAS, so browsers may keep them but must revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
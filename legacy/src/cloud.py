@@ -1,15 +1,38 @@
 # -----------------------------------------------------------------------
 # cloud.py
+# Reads the Cloudinary folder listing for seed_pictures.py, which is
+# the only writer of the picture catalog
 # -----------------------------------------------------------------------
 
-import cloudinary.api
-from dotenv import load_dotenv
+import hashlib
+import json
 import os
 
-load_dotenv()
-cloud_name = os.environ["CLOUDINARY_CLOUD_NAME"]
-api_key = os.environ["CLOUDINARY_API_KEY"]
-api_secret = os.environ["CLOUDINARY_API_SECRET"]
+from dotenv import load_dotenv
+
+# name of folder to extract resources from
+FOLDER_NAME = "TigerSpot/Checked"
+
+# the most resources the admin api returns per call
+PAGE_SIZE = 500
+
+# -----------------------------------------------------------------------
+
+
+# configures the cloudinary sdk from the environment and returns it.
+# cloudinary and its credentials are only needed by the seeding scripts,
+# so nothing is imported or read until one of them asks for it
+def configure():
+    import cloudinary
+    import cloudinary.api
+
+    load_dotenv()
+    cloudinary.config(
+        cloud_name=os.environ["CLOUDINARY_CLOUD_NAME"],
+        api_key=os.environ["CLOUDINARY_API_KEY"],
+        api_secret=os.environ["CLOUDINARY_API_SECRET"],
+    )
+    return cloudinary
 
 
 # -----------------------------------------------------------------------
@@ -26,29 +49,67 @@ def image_data(resource):
     return url, latitude, longitude, place
 
 
+# returns a fingerprint of everything image_data reads from resource, so
+# a sync can tell whether a picture's row needs rewriting
+def checksum(resource):
+    custom_metadata = resource.get("context", {}).get("custom", {})
+    payload = json.dumps([resource["url"], custom_metadata], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
 # -----------------------------------------------------------------------
 
-if __name__ == "__main__":
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret,
-    )
 
-    # name of folder to extract resources from
-    folder_name = "TigerSpot/Checked"
+# returns a function that fetches one page of the folder listing from
+# the live admin api, given the next_cursor of the previous page (None
+# for the first)
+def api_fetcher():
+    cloudinary = configure()
 
-    # extracts all resources from folder
-    resources = cloudinary.api.resources(
-        type="upload", prefix=folder_name, max_results=500, context=True
-    )
+    def fetch(cursor):
+        options = {}
+        if cursor is not None:
+            options["next_cursor"] = cursor
+        return cloudinary.api.resources(
+            type="upload",
+            prefix=FOLDER_NAME,
+            max_results=PAGE_SIZE,
+            context=True,
+            **options,
+        )
+
+    return fetch
+
+
+# returns a fetch function like api_fetcher's that serves pages recorded
+# by record_pages, so seeding can run without cloudinary credentials
+def fixture_fetcher(path):
+    with open(path) as f:
+        pages = json.load(f)
+    by_cursor = {None: pages[0]}
+    for previous, page in zip(pages, pages[1:]):
+        by_cursor[previous["next_cursor"]] = page
+
+    def fetch(cursor):
+        return by_cursor[cursor]
+
+    return fetch
+
+
+# yields pages of the folder listing in order, following next_cursor
+def iter_pages(fetch):
+    cursor = None
+    while True:
+        page = fetch(cursor)
+        yield page
+        cursor = page.get("next_cursor")
+        if not cursor:
+            return
 
-    # extracts and writes all image data to picturedata.txt
-    with open("picturedata.txt", "w") as f:
-        for resource in resources.get("resources", []):
-            url, latitude, longitude, place = image_data(resource)
-            f.write(f"{place}\n")
-            f.write(f"{latitude}, {longitude}\n")
-            f.write(url + "\n\n")
 
-    print("TigerSpot's image data saved to picturedata.txt")
+# writes every page of the live listing to path as a fixture
+def record_pages(path):
+    pages = [dict(page) for page in iter_pages(api_fetcher())]
+    with open(path, "w") as f:
+        json.dump(pages, f, indent=2)
+    return len(pages)
@@ -0,0 +1,89 @@
+# -----------------------------------------------------------------------
+# compression.py
+# Compresses HTML and JSON responses for browsers that accept it
+# -----------------------------------------------------------------------
+
+import gzip
+
+import flask
+
+# brotli is optional; without it every client that accepts gzip gets gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies smaller than this are sent as they are; below about a kilobyte
+# the headers and the CPU cost outweigh what compression saves
+MIN_SIZE = 1024
+
+COMPRESSIBLE = {"text/html", "application/json", "text/plain", "text/css"}
+
+# fast levels: the pages are small and built per request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# -----------------------------------------------------------------------
+
+
+# Returns "br", "gzip" or None for an Accept-Encoding header value
+def choose_encoding(accept_encoding):
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+# -----------------------------------------------------------------------
+
+
+# Compresses every eligible response: a 200 with an HTML or JSON body of
+# at least MIN_SIZE bytes, not streamed and not already encoded. Flask
+# runs after_request hooks in reverse order, so call this before the
+# other init_app functions to compress the final body.
+def init_app(app):
+    @app.after_request
+    def _compress(response):
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        encoding = choose_encoding(flask.request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < MIN_SIZE:
+            return response
+
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        # the compressed bytes differ, but the page is the same, so
+        # conditional requests with the old validator keep working
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -3,25 +3,189 @@
 # Database engine and session management for SQLAlchemy
 # -----------------------------------------------------------------------
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
+import contextvars
+import functools
 import os
+import time
+import flask
 from dotenv import load_dotenv
 
+from src import errors
+from src import instrumentation
+from src import metrics
+
 load_dotenv()
 DATABASE_URL = os.environ["DATABASE_URL"]
 
+# optional streaming replica for @read_only helpers; unset means every
+# query goes to DATABASE_URL
+REPLICA_DATABASE_URL = os.environ.get("REPLICA_DATABASE_URL") or None
+
+# how long after a user's own write their reads stay on the primary, so
+# they do not see a replica that has not caught up yet
+REPLICA_STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "30"))
+
+# connections per worker. The Procfile runs 32 threads, of which up to
+# EVENTS_MAX_STREAMS (8) sit in /events streams that use no connection,
+# so 24 threads can want one at once: a pool of 10 plus 14 overflow
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "14"))
+
 # -----------------------------------------------------------------------
 
 # Create engine
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
+instrumentation.instrument_engine(engine)
 
 # Create session factory
 SessionLocal = scoped_session(
     sessionmaker(autocommit=False, autoflush=False, bind=engine)
 )
 
+# The replica connections are read-only, so a helper wrongly marked
+# @read_only fails loudly instead of writing to a hot standby
+if REPLICA_DATABASE_URL is not None:
+    replica_engine = create_engine(
+        REPLICA_DATABASE_URL,
+        echo=False,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        execution_options={"postgresql_readonly": True},
+    )
+    instrumentation.instrument_engine(replica_engine)
+    ReplicaSessionLocal = scoped_session(
+        sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    )
+else:
+    replica_engine = None
+    ReplicaSessionLocal = None
+
+# Flags a connection that ran anything other than a read, so
+# transactional() only asks for a transaction id when there was a write
+def _note_statement(conn, cursor, statement, parameters, context, executemany):
+    verb = statement.lstrip().split(None, 1)[0].upper()
+    if verb not in ("SELECT", "SET", "SHOW"):
+        conn.info["db_wrote"] = True
+
+
+def _clear_write_flag(conn, *args):
+    conn.info.pop("db_wrote", None)
+
+
+def _clear_write_flag_on_checkin(dbapi_connection, connection_record):
+    connection_record.info.pop("db_wrote", None)
+
+
+event.listen(engine, "before_cursor_execute", _note_statement)
+event.listen(engine, "commit", _clear_write_flag)
+event.listen(engine, "rollback", _clear_write_flag)
+event.listen(engine, "checkin", _clear_write_flag_on_checkin)
+
+# "replica" while a @read_only function runs, "primary" inside
+# primary_reads(); the outermost setting wins
+_read_target = contextvars.ContextVar("read_target", default=None)
+
+# cookie holding the time of the user's last write; it expires with the
+# read-your-writes window, and is separate from the session so a write
+# does not rewrite the session cookie or the session store
+_LAST_WRITE_COOKIE = "db_last_write"
+
+# -----------------------------------------------------------------------
+
+
+# Starts the current user's read-your-writes window. Called by the
+# actions that write something the user reads back straight away (their
+# score, their challenges); a no-op without a replica.
+def note_write():
+    if ReplicaSessionLocal is not None and flask.has_request_context():
+        flask.g.db_last_write = time.time()
+
+
+# Sends the cookie for note_write() with the response
+def init_app(app):
+    @app.after_request
+    def _last_write_cookie(response):
+        last_write = flask.g.get("db_last_write")
+        if last_write is not None:
+            response.set_cookie(
+                _LAST_WRITE_COOKIE,
+                repr(last_write),
+                max_age=int(REPLICA_STICKY_SECONDS),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+# Returns whether reads in the current request must see the primary
+def _sticky():
+    if not flask.has_request_context():
+        return False
+    last_write = flask.g.get("db_last_write")
+    if last_write is None:
+        try:
+            last_write = float(flask.request.cookies.get(_LAST_WRITE_COOKIE, ""))
+        except ValueError:
+            return False
+    return time.time() - last_write < REPLICA_STICKY_SECONDS
+
+
+# Returns the session factory get_session() should use right now
+def _session_factory():
+    if ReplicaSessionLocal is None or _read_target.get() != "replica":
+        return SessionLocal
+    if _sticky():
+        metrics.DB_READ_SESSIONS.inc(target="primary")
+        return SessionLocal
+    metrics.DB_READ_SESSIONS.inc(target="replica")
+    return ReplicaSessionLocal
+
+
+def read_only(func):
+    """
+    Decorator for helpers that only read. Their get_session() calls go
+    to the replica when REPLICA_DATABASE_URL is set, unless the current
+    user wrote something in the last REPLICA_STICKY_SECONDS or the call
+    is inside primary_reads().
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _read_target.get() is not None:
+            return func(*args, **kwargs)
+        token = _read_target.set("replica")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _read_target.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """
+    Sends @read_only helpers called inside the block to the primary,
+    e.g. when filling a cache entry that every user will be served.
+    """
+    token = _read_target.set("primary")
+    try:
+        yield
+    finally:
+        _read_target.reset(token)
+
+
 # -----------------------------------------------------------------------
 
 
@@ -35,13 +199,14 @@ def get_session():
         with get_session() as session:
             user = session.query(User).filter_by(username='test').first()
     """
-    session = SessionLocal()
+    session = _session_factory()()
+    instrumentation.record_session()
     try:
         yield session
         session.commit()
-    except Exception as e:
+    except Exception:
+        # logged with its traceback where it is translated (errors.py)
         session.rollback()
-        print(f"Database error: {e}")
         raise
     finally:
         session.close()
@@ -50,6 +215,108 @@ def get_session():
 # -----------------------------------------------------------------------
 
 
+def transactional(func=None, *, retries=3, backoff=0.05, isolation_level=None):
+    """
+    Decorator that runs func as one unit of work.
+
+    func receives a fresh session as its first argument; callers leave
+    it out. The transaction is committed when func returns and retried
+    from the start, up to `retries` times with jittered exponential
+    backoff, on a serialization failure (40001), a deadlock (40P01) or a
+    dropped connection. Other errors are raised as errors.DatabaseError.
+
+    Retrying is only safe while nothing has committed, so a transaction
+    that wrote reads its id before COMMIT; read-only ones skip the query
+    and are retried as they are. If the connection drops during COMMIT,
+    txid_status() on a new connection tells whether it went through: if
+    it did, func's result is returned instead of running func again.
+    Writes should still be idempotent where they can be (see
+    versus_database.record_round).
+
+    Usage:
+        @transactional
+        def add_points(session, username, points):
+            user = session.query(User).filter_by(username=username).one()
+            user.points += points
+
+        add_points("test", 100)
+    """
+    if func is None:
+        return functools.partial(
+            transactional,
+            retries=retries,
+            backoff=backoff,
+            isolation_level=isolation_level,
+        )
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            session = SessionLocal()
+            instrumentation.record_session()
+            try:
+                if isolation_level is not None:
+                    session.connection(
+                        execution_options={"isolation_level": isolation_level}
+                    )
+                result = func(session, *args, **kwargs)
+                # only a transaction that wrote can have committed in
+                # doubt; a read-only one is simply retried
+                xid = None
+                session.flush()
+                if session.in_transaction() and session.connection().info.get(
+                    "db_wrote"
+                ):
+                    xid = session.execute(
+                        text("SELECT txid_current_if_assigned()")
+                    ).scalar()
+                try:
+                    session.commit()
+                except SQLAlchemyError as error:
+                    if errors.retry_reason(error) != "disconnect" or xid is None:
+                        raise
+                    outcome = _transaction_status(xid)
+                    if outcome == "committed":
+                        metrics.DB_RECOVERED_COMMITS.inc(operation=func.__name__)
+                        return result
+                    if outcome != "aborted":
+                        errors.logger.exception("%s: commit lost", func.__name__)
+                        raise errors.CommitOutcomeUnknownError(
+                            f"{func.__name__}: transaction {xid} is {outcome}"
+                        ) from error
+                    raise
+                return result
+            except SQLAlchemyError as error:
+                session.rollback()
+                reason = errors.retry_reason(error)
+                if reason is None or attempt >= retries:
+                    errors.logger.exception("%s failed", func.__name__)
+                    raise errors.translate(error) from error
+                attempt += 1
+                errors.log_retry(func.__name__, reason, attempt, error)
+            finally:
+                session.close()
+            time.sleep(errors.backoff_delay(attempt, backoff))
+
+    return wrapper
+
+
+# Returns "committed", "aborted" or "in progress" for transaction xid,
+# asked over a new connection; None if the server cannot be reached
+def _transaction_status(xid):
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                text("SELECT txid_status(:xid)"), {"xid": xid}
+            ).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+# -----------------------------------------------------------------------
+
+
 def get_db():
     """
     Dependency for getting a database session.
@@ -2,19 +2,27 @@
 # distance_func.py
 # This file contains functions relating distance calculation
 # -----------------------------------------------------------------------
-import psycopg2
-from geopy.distance import geodesic
 
 # -----------------------------------------------------------------------
 
+# geopy is only needed when a guess is scored, so it is imported on the
+# first call rather than when a worker boots
+_geodesic = None
+
 # -----------------------------------------------------------------------
 
 
 # Using the geopy library, we calculate the distance between two coordinates using the Haversine formula
 # Measuring in meters
 def calc_distance(lat1, lon1, coor2):
+    global _geodesic
+    if _geodesic is None:
+        from geopy.distance import geodesic
+
+        _geodesic = geodesic
+
     coor1 = (lat1, lon1)
-    distance = geodesic(coor1, coor2).meters
+    distance = _geodesic(coor1, coor2).meters
     return round(distance)
 
 
@@ -0,0 +1,134 @@
+# -----------------------------------------------------------------------
+# errors.py
+# Database exception hierarchy and the decorator that applies it
+# -----------------------------------------------------------------------
+
+import functools
+import logging
+import random
+import time
+
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+
+from src import metrics
+
+logger = logging.getLogger("tigerspot.db")
+
+# PostgreSQL error codes that mean "try the transaction again"
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+TRANSIENT_SQLSTATES = {SERIALIZATION_FAILURE, DEADLOCK_DETECTED}
+
+# -----------------------------------------------------------------------
+
+
+class DatabaseError(Exception):
+    """
+    A database operation failed. app.py renders contact_admin.html for
+    any DatabaseError that reaches a route.
+    """
+
+
+class TransientDatabaseError(DatabaseError):
+    """
+    The operation failed for a reason that may not recur: a serialization
+    failure, a deadlock or a dropped connection. Safe to retry.
+    """
+
+
+class RecordNotFoundError(DatabaseError):
+    """A row the operation depends on does not exist."""
+
+
+class CommitOutcomeUnknownError(DatabaseError):
+    """
+    The connection dropped during COMMIT and the server could not tell
+    whether the transaction committed. Not retried, so that a write is
+    never applied twice.
+    """
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns the SQLSTATE of a driver error, or None
+def sqlstate(error):
+    return getattr(getattr(error, "orig", None), "pgcode", None)
+
+
+# Returns why error is worth retrying ("serialization", "deadlock" or
+# "disconnect"), or None if it is not
+def retry_reason(error):
+    code = sqlstate(error)
+    if code == SERIALIZATION_FAILURE:
+        return "serialization"
+    if code == DEADLOCK_DETECTED:
+        return "deadlock"
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return "disconnect"
+    # lost connections surface as OperationalError without a SQLSTATE
+    if isinstance(error, OperationalError) and code is None:
+        return "disconnect"
+    return None
+
+
+# Returns whether error is worth retrying
+def is_transient(error):
+    return retry_reason(error) is not None
+
+
+# Wraps a SQLAlchemy error in the matching DatabaseError subclass
+def translate(error):
+    cls = TransientDatabaseError if is_transient(error) else DatabaseError
+    return cls(str(error).splitlines()[0])
+
+
+# Returns the seconds to wait before retry number attempt (1, 2, ...):
+# exponential in attempt, capped, with jitter so that the transactions
+# that just collided do not collide again
+def backoff_delay(attempt, backoff, max_backoff=2.0):
+    return min(max_backoff, backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+# -----------------------------------------------------------------------
+
+
+def database_operation(func=None, *, retries=2, backoff=0.05):
+    """
+    Decorator for the Databases/* functions.
+
+    SQLAlchemy errors are logged with their traceback and re-raised as
+    DatabaseError. Transient errors are retried up to `retries` times
+    with exponential backoff first. Pass retries=0 for writes that are
+    not safe to repeat (e.g. adding to a running total), since a dropped
+    connection can hide whether the first attempt committed.
+    """
+    if func is None:
+        return functools.partial(database_operation, retries=retries, backoff=backoff)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except SQLAlchemyError as error:
+                translated = translate(error)
+                reason = retry_reason(error)
+                if reason is not None and attempt < retries:
+                    attempt += 1
+                    log_retry(func.__name__, reason, attempt, translated)
+                    time.sleep(backoff_delay(attempt, backoff))
+                    continue
+                logger.exception("%s failed", func.__name__)
+                raise translated from error
+
+    return wrapper
+
+
+# Logs and counts one retry of operation
+def log_retry(operation, reason, attempt, error):
+    metrics.DB_RETRIES.inc(operation=operation, reason=reason)
+    logger.warning(
+        "%s: retrying after %s (attempt %d): %s", operation, reason, attempt, error
+    )
@@ -0,0 +1,171 @@
+# -----------------------------------------------------------------------
+# events.py
+# Pushes challenge state changes to open /events streams, using
+# Postgres LISTEN/NOTIFY to reach every gunicorn worker
+# -----------------------------------------------------------------------
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from src import metrics
+
+load_dotenv()
+# streams one worker keeps open at once. Each holds one of the worker's
+# gunicorn threads (32 in the Procfile), so this stays well below the
+# thread count; the remaining threads, and db.py's connection pool, are
+# for ordinary requests.
+MAX_STREAMS = int(os.environ.get("EVENTS_MAX_STREAMS", "8"))
+
+# a stream is closed after this long and the browser reconnects, so a
+# worker's threads are never held by tabs left open overnight
+STREAM_SECONDS = 300
+
+# seconds between keepalive comments, below common proxy idle timeouts
+HEARTBEAT_SECONDS = 15
+
+CHANNEL = "challenge_events"
+
+# created, accepted, declined, finished (one player is done), completed
+EVENT_TYPES = ("created", "accepted", "declined", "finished", "completed")
+
+# -----------------------------------------------------------------------
+
+
+# Queues a challenge event for both players. pg_notify is transactional,
+# so listeners only hear about it once session commits, and not at all
+# if it rolls back.
+def notify(session, event, challenge, **extra):
+    payload = {
+        "type": event,
+        "challenge_id": challenge.id,
+        "challenger_id": challenge.challenger_id,
+        "challengee_id": challenge.challengee_id,
+        **extra,
+    }
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANNEL, "payload": json.dumps(payload)},
+    )
+
+
+# -----------------------------------------------------------------------
+
+# One LISTEN connection per worker, shared by every stream it serves.
+# Subscribers are queues keyed by username.
+
+_subscribers = {}
+_lock = threading.Lock()
+_listener = None
+
+
+def _dispatch(payload):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return
+    metrics.CHALLENGE_EVENTS.inc(type=event.get("type", "unknown"))
+    with _lock:
+        targets = [
+            subscriber
+            for username in {event.get("challenger_id"), event.get("challengee_id")}
+            for subscriber in _subscribers.get(username, ())
+        ]
+    for subscriber in targets:
+        subscriber.put(event)
+
+
+def _listen():
+    # imported here so importing events does not open a connection
+    from src.db import engine
+
+    while True:
+        pooled = None
+        try:
+            # a dedicated connection, taken out of the pool for good
+            pooled = engine.raw_connection()
+            pooled.detach()
+            connection = pooled.dbapi_connection
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                readable, _, _ = select.select([connection], [], [], HEARTBEAT_SECONDS)
+                if not readable:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    _dispatch(connection.notifies.pop(0).payload)
+        except Exception:
+            # events sent while reconnecting are missed; streams carry on
+            # and the next reload of /requests shows the current state
+            metrics.CHALLENGE_EVENTS.inc(type="listener_error")
+            if pooled is not None:
+                # detached, so this closes the connection rather than
+                # returning it to the pool
+                try:
+                    pooled.close()
+                except Exception:
+                    pass
+            time.sleep(5)
+
+
+def _ensure_listener():
+    global _listener
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(
+                target=_listen, name="challenge-events", daemon=True
+            )
+            _listener.start()
+
+
+# Registers a queue for username's events and returns it, or None if
+# this worker already serves MAX_STREAMS streams
+def subscribe(username):
+    _ensure_listener()
+    with _lock:
+        if sum(len(queues) for queues in _subscribers.values()) >= MAX_STREAMS:
+            return None
+        subscriber = queue.Queue()
+        _subscribers.setdefault(username, []).append(subscriber)
+        metrics.EVENT_STREAMS.set(sum(len(queues) for queues in _subscribers.values()))
+    return subscriber
+
+
+def unsubscribe(username, subscriber):
+    with _lock:
+        queues = _subscribers.get(username, [])
+        if subscriber in queues:
+            queues.remove(subscriber)
+        if not queues:
+            _subscribers.pop(username, None)
+        metrics.EVENT_STREAMS.set(sum(len(queues) for queues in _subscribers.values()))
+
+
+# -----------------------------------------------------------------------
+
+
+# Yields the text/event-stream body for subscriber: one "challenge" event
+# per change, keepalive comments in between, then closes after
+# STREAM_SECONDS so the browser reconnects
+def stream(username, subscriber):
+    try:
+        # browsers reconnect this many milliseconds after the stream ends
+        yield "retry: 3000\n\n"
+        deadline = time.monotonic() + STREAM_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                event = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: challenge\ndata: {json.dumps(event)}\n\n"
+    finally:
+        unsubscribe(username, subscriber)
@@ -0,0 +1,222 @@
+# -----------------------------------------------------------------------
+# game.py
+# Game actions shared by the HTML routes in app.py and the JSON API in
+# api.py. Each function does the database work for one player action
+# and returns plain values; rendering is left to the caller.
+# -----------------------------------------------------------------------
+
+import logging
+
+import distance_func
+import points
+from Databases import challenges_database
+from Databases import daily_user_database
+from Databases import matches_database
+from Databases import pictures_database
+from Databases import seen_database
+from Databases import versus_database
+from src import cache
+from src import db
+from src import metrics
+from src import throttle
+
+logger = logging.getLogger("tigerspot.game")
+
+# -----------------------------------------------------------------------
+
+
+# Returns a challenge's five pictures in round order (see
+# challenges_database.get_versus_pictures), or None if it cannot be
+# played. The list never changes once the challenge is accepted, so one
+# query serves every round and the stats page for both players.
+def versus_pictures(challenge_id):
+    if not challenge_id:
+        return None
+    pictures = cache.cached_value(
+        "versus_pictures",
+        lambda: challenges_database.get_versus_pictures(challenge_id),
+        tags=("pictures",),
+        challenge_id=str(challenge_id),
+    )
+    if pictures is None:
+        return None
+
+    # Fallback for invalid picture IDs from old challenges
+    result = []
+    fallback = None
+    for picture in pictures:
+        if picture["link"] is None:
+            logger.warning(
+                "Picture %s not found. Using fallback.", picture["pictureid"]
+            )
+            if fallback is None:
+                fallback = pictures_database.get_picture(1)
+            picture = fallback
+        result.append(picture)
+    return result
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns today's picture id and whether username has played it, with
+# their points and distance for today. link is the picture to show, or
+# None once they have played.
+def daily_state(username):
+    pictureid = pictures_database.pic_of_day()
+    played = daily_user_database.player_played(username)
+    return {
+        "pictureid": pictureid,
+        "played": played,
+        "points": daily_user_database.get_daily_points(username),
+        "distance": daily_user_database.get_daily_distance(username),
+        "link": None if played else pictures_database.get_pic_info("link", pictureid),
+    }
+
+
+# Scores username's guess at today's picture and adds the points to
+# their totals. Returns the distance, points, coordinates and place, or
+# None if they have already played today. A repeat of the same guess
+# (a double click, a retry after a timeout) gets the first result.
+def submit_daily(username, lat, lon):
+    pictureid = pictures_database.pic_of_day()
+    return throttle.coalesce(
+        f"daily:{username}:{pictureid}",
+        lambda: _submit_daily(username, pictureid, lat, lon),
+    )
+
+
+def _submit_daily(username, pictureid, lat, lon):
+    if daily_user_database.player_played(username):
+        return None
+
+    coordinates = pictures_database.get_pic_info("coordinates", pictureid)
+    place = pictures_database.get_pic_info("place", pictureid)
+    distance = distance_func.calc_distance(lat, lon, coordinates)
+    today_points = points.calculate_today_points(distance)
+    recorded = daily_user_database.update_player_daily(
+        username, today_points, distance
+    )
+    if recorded == "already_played":
+        # another submit for today committed first
+        return None
+    seen_database.mark_seen(username, pictureid)
+
+    db.note_write()
+
+    # leaderboards, ranks and the top player all derive from points
+    cache.invalidate("scores")
+    metrics.DAILY_SUBMISSIONS.inc()
+
+    return {
+        "distance": distance,
+        "points": today_points,
+        "coordinates": coordinates,
+        "place": place,
+    }
+
+
+# -----------------------------------------------------------------------
+
+
+# Presses username's Play button on challenge_id. The first press starts
+# the challenge ("started"); a second press forfeits every round left
+# ("forfeited"), so a player cannot restart after seeing the pictures.
+# Returns None if username is not in the challenge.
+def start_challenge(challenge_id, username):
+    status = challenges_database.get_playbutton_status(challenge_id, username)
+    if status is None:
+        return None
+    if status is False:
+        challenges_database.update_playbutton_status(challenge_id, username)
+        db.note_write()
+        return "started"
+
+    versus_database.forfeit_rounds(challenge_id, username)
+    finish_challenge(challenge_id, username)
+    return "forfeited"
+
+
+# Returns whether username has pressed Play on challenge_id, which every
+# round requires
+def has_started(challenge_id, username):
+    return challenges_database.get_playbutton_status(challenge_id, username) is True
+
+
+# Records username's answer for round index (0-based) of challenge_id:
+# a guess at lat, lon made after seconds, or no guess when lat or lon is
+# missing. Returns the round, points, distance (None without a guess),
+# coordinates, place and whether it was already answered, in which case
+# nothing changes and points is None. Returns None if username cannot
+# play the round. Like submit_daily, a repeat gets the first result.
+def submit_round(username, challenge_id, index, lat=None, lon=None, seconds=None):
+    return throttle.coalesce(
+        f"round:{username}:{challenge_id}:{index}",
+        lambda: _submit_round(username, challenge_id, index, lat, lon, seconds),
+    )
+
+
+def _submit_round(username, challenge_id, index, lat, lon, seconds):
+    pictures = versus_pictures(challenge_id)
+    if pictures is None or not 0 <= index < len(pictures):
+        return None
+    picture = pictures[index]
+
+    answered = versus_database.get_versus_pic_status(
+        challenge_id, username, index + 1
+    )
+    if answered is None:
+        return None
+    seen_database.mark_seen(username, picture["pictureid"])
+
+    distance = None
+    if lat and lon:
+        distance = round(
+            distance_func.calc_distance(lat, lon, picture["coordinates"])
+        )
+    result = {
+        "round": index,
+        "rounds": len(pictures),
+        "points": None,
+        "distance": distance,
+        "coordinates": picture["coordinates"],
+        "place": picture["place"],
+        "already_submitted": answered,
+    }
+    if answered:
+        return result
+
+    score = 0
+    if distance is not None:
+        score = round(versus_database.calculate_versus(distance, int(seconds or 0)))
+    recorded = versus_database.record_round(challenge_id, username, index + 1, score)
+    if recorded is None:
+        return None
+    if recorded == "already_submitted":
+        # another submit of this round committed first
+        result["already_submitted"] = True
+        return result
+
+    db.note_write()
+    result["points"] = score
+    return result
+
+
+# Marks username as done with challenge_id and, once both players are,
+# records the match. Returns "finished" when the match is complete,
+# "unfinished" while the opponent is still playing, or None if username
+# is not in the challenge.
+def finish_challenge(challenge_id, username):
+    if challenges_database.update_finish_status(challenge_id, username) is None:
+        return None
+    db.note_write()
+    status = challenges_database.check_finish_status(challenge_id)
+    if status["status"] == "finished":
+        result = challenges_database.get_challenge_results(challenge_id)
+        matches_database.complete_match(
+            challenge_id,
+            result["winner"],
+            result["challenger_points"],
+            result["challengee_points"],
+        )
+    return status["status"]
@@ -0,0 +1,69 @@
+# -----------------------------------------------------------------------
+# images.py
+# Responsive Cloudinary image URLs for the game pages
+# -----------------------------------------------------------------------
+
+import re
+
+# widths offered in srcset; the game image is at most 35vw on desktop
+# and 80vw on phones, so 1600 covers a 2x display at 800 css pixels
+WIDTHS = (480, 800, 1200, 1600)
+
+# the width used for src, for browsers that ignore srcset
+DEFAULT_WIDTH = 1200
+
+# matches the .game-image rules in static/styles/styles.css
+GAME_IMAGE_SIZES = "(max-width: 1000px) 80vw, 35vw"
+
+# c_limit never upscales, f_auto serves AVIF or WebP to browsers that
+# accept them and q_auto picks the quality; all computed by the CDN
+TRANSFORMATION = "c_limit,w_{width},f_auto,q_auto"
+
+_UPLOAD_URL = re.compile(
+    r"^https?://(?P<host>res\.cloudinary\.com/[^/]+/image/upload/)(?P<rest>.+)$"
+)
+
+# -----------------------------------------------------------------------
+
+
+# Returns the https delivery URL of link resized to at most width pixels.
+# Built from the stored link alone, so no Cloudinary API call is made.
+# Links that are not Cloudinary upload URLs are returned unchanged.
+def variant_url(link, width=DEFAULT_WIDTH):
+    if not link:
+        return link
+    match = _UPLOAD_URL.match(link)
+    if match is None:
+        return link
+    transformation = TRANSFORMATION.format(width=width)
+    return f"https://{match.group('host')}{transformation}/{match.group('rest')}"
+
+
+# Returns a srcset attribute value with one variant per width
+def srcset(link, widths=WIDTHS):
+    if not link or _UPLOAD_URL.match(link) is None:
+        return ""
+    return ", ".join(f"{variant_url(link, width)} {width}w" for width in widths)
+
+
+# -----------------------------------------------------------------------
+
+
+# Makes the helpers available to templates:
+#   <img src="{{ link | image_variant }}" srcset="{{ link | image_srcset }}"
+#        sizes="{{ GAME_IMAGE_SIZES }}">
+def init_app(app):
+    app.add_template_filter(variant_url, "image_variant")
+    app.add_template_filter(srcset, "image_srcset")
+    app.add_template_global(GAME_IMAGE_SIZES, "GAME_IMAGE_SIZES")
+
+
+# -----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    example = (
+        "http://res.cloudinary.com/demo/image/upload/v1700000001/"
+        "TigerSpot/Checked/IMG_0001.jpg"
+    )
+    print(variant_url(example))
+    print(srcset(example))
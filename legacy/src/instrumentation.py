@@ -0,0 +1,216 @@
+# -----------------------------------------------------------------------
+# instrumentation.py
+# Per-request SQL statistics gathered from SQLAlchemy engine events
+# -----------------------------------------------------------------------
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import flask
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+# send the statistics back as X-DB-* response headers (for development
+# and load tests); otherwise they are only logged
+SQL_STATS_HEADERS = os.environ.get("SQL_STATS_HEADERS", "") == "1"
+
+logger = logging.getLogger("tigerspot.sql")
+
+# every QueryStats currently collecting, innermost last; a request and a
+# query_budget around it both see the same statements
+_collectors = contextvars.ContextVar("sql_collectors", default=())
+
+# -----------------------------------------------------------------------
+
+
+class QueryStats:
+    """Statements, database time and sessions used by one unit of work."""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.sessions = 0
+        self._seen = Counter()
+
+    def record_statement(self, statement, parameters, seconds):
+        self.statements += 1
+        self.seconds += seconds
+        self._seen[(statement, repr(parameters))] += 1
+
+    # Returns how many statements repeated an earlier one exactly,
+    # parameters included, e.g. the same filter_by(username=...) lookup
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self._seen.values())
+
+    def duplicated_statements(self):
+        return [
+            (statement, parameters, count)
+            for (statement, parameters), count in self._seen.items()
+            if count > 1
+        ]
+
+    def as_dict(self):
+        return {
+            "statements": self.statements,
+            "db_ms": round(self.seconds * 1000, 2),
+            "sessions": self.sessions,
+            "duplicates": self.duplicates,
+        }
+
+
+# -----------------------------------------------------------------------
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    for stats in _collectors.get():
+        stats.record_statement(statement, parameters, elapsed)
+
+
+# A statement that fails gets no after_cursor_execute; its start time is
+# popped here so later statements are not timed against it. It still
+# counts: it was sent to the database.
+def _handle_error(context):
+    connection = context.connection
+    if connection is None:
+        return
+    starts = connection.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for stats in _collectors.get():
+        stats.record_statement(context.statement, context.parameters, elapsed)
+
+
+# Hooks statement timing onto an engine's cursor events
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# Counts a session opened by get_session() against every active collector
+def record_session():
+    for stats in _collectors.get():
+        stats.sessions += 1
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Collects statistics for the statements run inside the block.
+
+    Usage:
+        with instrumentation.collect() as stats:
+            user_database.get_points("test")
+        print(stats.statements)
+    """
+    stats = QueryStats()
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+# -----------------------------------------------------------------------
+
+
+# Collects statistics for every request the app serves, then returns them
+# as X-DB-* headers (SQL_STATS_HEADERS=1) and logs them as one JSON line
+def init_app(app):
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def _start_collecting():
+        stats = QueryStats()
+        flask.g.sql_stats = stats
+        flask.g.sql_stats_token = _collectors.set(_collectors.get() + (stats,))
+
+    @app.after_request
+    def _report(response):
+        stats = flask.g.get("sql_stats")
+        if stats is None:
+            return response
+        if SQL_STATS_HEADERS or app.debug:
+            response.headers["X-DB-Statements"] = str(stats.statements)
+            response.headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+            response.headers["X-DB-Sessions"] = str(stats.sessions)
+            response.headers["X-DB-Duplicates"] = str(stats.duplicates)
+        if stats.statements:
+            record = stats.as_dict()
+            record.update(
+                {
+                    "endpoint": flask.request.endpoint,
+                    "method": flask.request.method,
+                    "status": response.status_code,
+                }
+            )
+            logger.info(json.dumps(record))
+        return response
+
+    @app.teardown_request
+    def _stop_collecting(error=None):
+        token = flask.g.pop("sql_stats_token", None)
+        if token is not None:
+            _collectors.reset(token)
+
+
+# -----------------------------------------------------------------------
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by query_budget when a block runs too many statements."""
+
+
+class query_budget(contextlib.ContextDecorator):
+    """
+    Fails when the wrapped test or block issues more than max_statements
+    SQL statements, listing the duplicated ones to point at the fix.
+
+    Usage:
+        @query_budget(10)
+        def test_menu(client):
+            client.get("/menu")
+    """
+
+    def __init__(self, max_statements):
+        self.max_statements = max_statements
+        self.stats = None
+        self._collect = None
+
+    def __enter__(self):
+        self._collect = collect()
+        self.stats = self._collect.__enter__()
+        return self.stats
+
+    def __exit__(self, *exc):
+        self._collect.__exit__(*exc)
+        if exc[0] is None and self.stats.statements > self.max_statements:
+            duplicated = "".join(
+                f"\n  {count}x {statement} {parameters}"
+                for statement, parameters, count in self.stats.duplicated_statements()
+            )
+            message = (
+                f"{self.stats.statements} SQL statements issued, "
+                f"budget is {self.max_statements}"
+            )
+            if duplicated:
+                message += "; repeated:" + duplicated
+            raise QueryBudgetExceeded(message)
+        return False
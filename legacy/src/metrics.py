@@ -0,0 +1,408 @@
+# -----------------------------------------------------------------------
+# metrics.py
+# Prometheus-style metrics shared across gunicorn worker processes
+# -----------------------------------------------------------------------
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import flask
+from dotenv import load_dotenv
+
+load_dotenv()
+# directory where each worker writes its metric snapshot so that whichever
+# worker serves /metrics can report the totals of all of them; unset means
+# a single process and in-memory values only
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+
+# seconds between snapshot writes from a worker whose values changed
+FLUSH_INTERVAL = 1.0
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# -----------------------------------------------------------------------
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.changed()
+
+
+class Gauge(_Metric):
+    """Per-process value; reported with a pid label when multi-process."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._registry.lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            # one count per bucket, then the +Inf count and the sum
+            counts = self._values.setdefault(
+                key, [0] * (len(self.buckets) + 1) + [0.0]
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[len(self.buckets)] += 1
+            counts[-1] += value
+        self._registry.changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+# -----------------------------------------------------------------------
+
+
+class Registry:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.metrics = []
+        self._collect_hooks = []
+        self._dirty = False
+        # (pid, start time in ms) of the process that owns the snapshot
+        # file, and so of the flusher thread; a forked worker gets its own
+        self._owner = None
+        if directory is not None:
+            atexit.register(self.flush)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    # fn runs before every snapshot and scrape, e.g. to sample pool gauges
+    def add_collect_hook(self, fn):
+        self._collect_hooks.append(fn)
+
+    def _snapshot(self):
+        for hook in self._collect_hooks:
+            hook()
+        with self.lock:
+            return {
+                metric.name: [
+                    [list(key), value] for key, value in metric._values.items()
+                ]
+                for metric in self.metrics
+            }
+
+    # Marks the values as changed; the flusher thread writes them within
+    # FLUSH_INTERVAL, so the last counts of a worker that goes idle still
+    # reach the other workers' scrapes
+    def changed(self):
+        if self.directory is None:
+            return
+        self._dirty = True
+        self._own_file()
+
+    # Returns this process's snapshot file, named by pid and start time
+    # so a reused pid never overwrites an exited process's totals, and
+    # starts the flusher thread on first use in each process
+    def _own_file(self):
+        pid = os.getpid()
+        owner = self._owner
+        if owner is None or owner[0] != pid:
+            with self.lock:
+                if self._owner is None or self._owner[0] != pid:
+                    self._owner = (pid, int(time.time() * 1000))
+                    threading.Thread(
+                        target=self._flush_loop, name="metrics-flush", daemon=True
+                    ).start()
+                owner = self._owner
+        return os.path.join(self.directory, f"metrics-{owner[0]}-{owner[1]}.json")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    # Writes this process's values to its own file; the rename keeps
+    # readers consistent. Also runs at exit.
+    def flush(self):
+        if self.directory is None:
+            return
+        self._dirty = False
+        path = self._own_file()
+        snapshot = self._snapshot()
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+
+    # Returns (pid, start, snapshot) for every live process. The files of
+    # exited workers (their pid is gone, or reused by a newer process)
+    # are deleted, so recycled workers do not pile up in the totals.
+    def _collect_all(self):
+        if self.directory is None:
+            return [(os.getpid(), 0, self._snapshot())]
+
+        self.flush()
+        files = []
+        for path in glob.glob(os.path.join(self.directory, "metrics-*-*.json")):
+            name = os.path.basename(path)[len("metrics-") : -len(".json")]
+            try:
+                pid, start = (int(part) for part in name.split("-"))
+            except ValueError:
+                continue
+            files.append((pid, start, path))
+
+        # a live pid may have been reused; its newest file is the live one
+        newest = {}
+        for pid, start, _ in files:
+            newest[pid] = max(start, newest.get(pid, start))
+
+        snapshots = []
+        for pid, start, path in files:
+            try:
+                if start != newest[pid] or not _alive(pid):
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append((pid, start, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    # Returns every metric in the Prometheus text exposition format.
+    # Counters and histograms are summed over the live processes; when a
+    # worker exits its counts leave the totals, which Prometheus reads as
+    # a counter reset. Gauges are reported per process.
+    def render(self):
+        snapshots = self._collect_all()
+        lines = []
+        for metric in self.metrics:
+            merged = {}
+            for pid, start, snapshot in snapshots:
+                for key, value in snapshot.get(metric.name, []):
+                    if metric.kind == "gauge":
+                        merged[tuple(key) + (str(pid),)] = value
+                    elif metric.kind == "counter":
+                        merged[tuple(key)] = merged.get(tuple(key), 0) + value
+                    else:
+                        totals = merged.setdefault(tuple(key), [0] * len(value))
+                        for i, count in enumerate(value):
+                            totals[i] += count
+
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            labelnames = metric.labelnames
+            if metric.kind == "gauge":
+                labelnames = labelnames + ("pid",)
+            for key, value in sorted(merged.items()):
+                if metric.kind == "histogram":
+                    lines.extend(_histogram_lines(metric, key, value))
+                else:
+                    lines.append(f"{metric.name}{_labels(labelnames, key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _histogram_lines(metric, key, counts):
+    # observe() counts a value in every bucket it fits, so the bucket
+    # counts are already cumulative as the exposition format expects
+    lines = []
+    for bound, count in zip(metric.buckets, counts):
+        le = (("le", repr(bound)),)
+        labels = _labels(metric.labelnames, key, le)
+        lines.append(f"{metric.name}_bucket{labels} {count}")
+    total = counts[len(metric.buckets)]
+    le = (("le", "+Inf"),)
+    lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, key, le)} {total}")
+    lines.append(f"{metric.name}_sum{_labels(metric.labelnames, key)} {counts[-1]}")
+    lines.append(f"{metric.name}_count{_labels(metric.labelnames, key)} {total}")
+    return lines
+
+
+# -----------------------------------------------------------------------
+
+if METRICS_DIR:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+REGISTRY = Registry(METRICS_DIR)
+
+REQUEST_SECONDS = Histogram(
+    REGISTRY,
+    "tigerspot_request_duration_seconds",
+    "Time spent handling a request, by Flask endpoint.",
+    ["endpoint", "method"],
+)
+REQUESTS = Counter(
+    REGISTRY,
+    "tigerspot_requests_total",
+    "Requests handled, by Flask endpoint and status code.",
+    ["endpoint", "method", "status"],
+)
+DATABASE_ERRORS = Counter(
+    REGISTRY,
+    "tigerspot_database_errors_total",
+    "Requests that fell back to contact_admin.html after a database error.",
+    ["endpoint"],
+)
+DB_RETRIES = Counter(
+    REGISTRY,
+    "tigerspot_db_retries_total",
+    "Database operations retried after a serialization failure, deadlock or "
+    "dropped connection, by operation and reason.",
+    ["operation", "reason"],
+)
+DB_RECOVERED_COMMITS = Counter(
+    REGISTRY,
+    "tigerspot_db_recovered_commits_total",
+    "Transactions whose connection dropped during COMMIT but which had "
+    "committed, so were not run again.",
+    ["operation"],
+)
+DB_READ_SESSIONS = Counter(
+    REGISTRY,
+    "tigerspot_db_read_sessions_total",
+    "Sessions opened by @read_only helpers, by the engine they were routed to.",
+    ["target"],
+)
+CAS_VALIDATION_SECONDS = Histogram(
+    REGISTRY,
+    "tigerspot_cas_validation_seconds",
+    "Time spent validating a CAS ticket.",
+    ["outcome"],
+)
+DAILY_SUBMISSIONS = Counter(
+    REGISTRY,
+    "tigerspot_daily_submissions_total",
+    "Daily game guesses scored; rate() * 60 gives submissions per minute.",
+)
+CHALLENGE_EVENTS = Counter(
+    REGISTRY,
+    "tigerspot_challenge_events_total",
+    "Challenge events received from LISTEN/NOTIFY, by type.",
+    ["type"],
+)
+RATE_LIMITED = Counter(
+    REGISTRY,
+    "tigerspot_rate_limited_total",
+    "Submissions refused with a 429, by rate limit bucket.",
+    ["bucket"],
+)
+COALESCED_REQUESTS = Counter(
+    REGISTRY,
+    "tigerspot_coalesced_requests_total",
+    "Duplicate submissions answered with the first submission's result.",
+)
+EVENT_STREAMS = Gauge(
+    REGISTRY, "tigerspot_event_streams", "Open /events streams in this worker."
+)
+DB_POOL_SIZE = Gauge(
+    REGISTRY, "tigerspot_db_pool_size", "Configured size of the connection pool."
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    REGISTRY, "tigerspot_db_pool_checked_out", "Connections currently in use."
+)
+DB_POOL_CHECKED_IN = Gauge(
+    REGISTRY, "tigerspot_db_pool_checked_in", "Idle connections in the pool."
+)
+DB_POOL_OVERFLOW = Gauge(
+    REGISTRY,
+    "tigerspot_db_pool_overflow",
+    "Connections open beyond the pool size (negative while below it).",
+)
+
+# -----------------------------------------------------------------------
+
+
+# Samples the engine's QueuePool into the pool gauges
+def watch_pool(engine):
+    def sample():
+        pool = engine.pool
+        DB_POOL_SIZE.set(pool.size())
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_CHECKED_IN.set(pool.checkedin())
+        DB_POOL_OVERFLOW.set(pool.overflow())
+
+    REGISTRY.add_collect_hook(sample)
+
+
+# Times every request and serves the metrics at /metrics
+def init_app(app, engine):
+    watch_pool(engine)
+
+    @app.before_request
+    def _start_timer():
+        flask.g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = flask.g.get("metrics_start")
+        if start is not None and flask.request.endpoint != "metrics":
+            endpoint = flask.request.endpoint or "unknown"
+            method = flask.request.method
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, endpoint=endpoint, method=method
+            )
+            REQUESTS.inc(endpoint=endpoint, method=method, status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        response = flask.make_response(REGISTRY.render())
+        response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+        return response
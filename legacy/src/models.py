@@ -3,7 +3,19 @@
 # SQLAlchemy ORM models for TigerSpot database tables
 # -----------------------------------------------------------------------
 
-from sqlalchemy import Column, Integer, String, Boolean, Date, ARRAY, Float
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Boolean,
+    Date,
+    DateTime,
+    ARRAY,
+    Float,
+    LargeBinary,
+    Index,
+    func,
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -54,8 +66,14 @@ class Picture(Base):
 
     pictureid = Column(Integer, primary_key=True, autoincrement=False)
     coordinates = Column(ARRAY(Float, dimensions=1), nullable=False)
-    link = Column(String(255), nullable=False)
+    link = Column(String(255), nullable=False, unique=True)
     place = Column(String(255), nullable=False)
+    # sha1 of the Cloudinary metadata the row was built from
+    checksum = Column(String(40), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    # set when the image leaves the Cloudinary folder; the row is kept so
+    # old challenges can still show it
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     def __repr__(self):
         return f"<Picture(id={self.pictureid}, place={self.place})>"
@@ -92,6 +110,15 @@ class Challenge(Base):
     )
     playger_button_status = Column(Boolean, default=False)
     playgee_button_status = Column(Boolean, default=False)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    # one index per side, so a user's inbox is read newest first from id
+    __table_args__ = (
+        Index("ix_challenges_challenger_id_id", "challenger_id", "id"),
+        Index("ix_challenges_challengee_id_id", "challengee_id", "id"),
+    )
 
     def __repr__(self):
         return f"<Challenge(id={self.id}, challenger={self.challenger_id}, challengee={self.challengee_id}, status={self.status})>"
@@ -106,10 +133,75 @@ class Match(Base):
     __tablename__ = "matches"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    challenge_id = Column(Integer, nullable=False)
+    challenge_id = Column(Integer, nullable=False, index=True)
     winner_id = Column(String(255), nullable=True)
     challenger_score = Column(Integer, nullable=False)
     challengee_score = Column(Integer, nullable=False)
 
     def __repr__(self):
         return f"<Match(id={self.id}, challenge_id={self.challenge_id}, winner={self.winner_id})>"
+
+
+# -----------------------------------------------------------------------
+
+
+class ChallengeArchive(Base):
+    """Model for challenges_archive table - stores past challenges with their match result"""
+
+    __tablename__ = "challenges_archive"
+
+    # the id the challenge had in challenges
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    challenger_id = Column(String(255), nullable=False)
+    challengee_id = Column(String(255), nullable=False)
+    status = Column(String(255), nullable=False)
+    challenger_points = Column(Integer, default=0)
+    challengee_points = Column(Integer, default=0)
+    versuslist = Column(ARRAY(Integer, dimensions=1))
+    winner_id = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_challenges_archive_challenger_id_id", "challenger_id", "id"),
+        Index("ix_challenges_archive_challengee_id_id", "challengee_id", "id"),
+    )
+
+    def __repr__(self):
+        return f"<ChallengeArchive(id={self.id}, challenger={self.challenger_id}, challengee={self.challengee_id}, status={self.status})>"
+
+
+# -----------------------------------------------------------------------
+
+
+class SeenPictures(Base):
+    """Model for user_seen_pictures table - stores which pictures a user has played"""
+
+    __tablename__ = "user_seen_pictures"
+
+    username = Column(String(255), primary_key=True)
+    # bit n (byte n // 8, least significant bit first) is set once the
+    # user has played picture n; the same order as Postgres set_bit
+    seen = Column(LargeBinary, nullable=False, default=b"")
+
+    def __repr__(self):
+        return f"<SeenPictures(username={self.username}, bytes={len(self.seen or b'')})>"
+
+
+# -----------------------------------------------------------------------
+
+
+class DailyPicture(Base):
+    """Model for daily_pictures table - stores the picture shown on each date"""
+
+    __tablename__ = "daily_pictures"
+
+    # the Eastern date; the row is written when the date's picture is
+    # first asked for and never changed, so catalog edits cannot swap it
+    date = Column(Date, primary_key=True)
+    pictureid = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<DailyPicture(date={self.date}, pictureid={self.pictureid})>"
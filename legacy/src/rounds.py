@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------
+# rounds.py
+# Picks the pictures for a versus challenge from an in-memory bitmap of
+# the catalog, skipping pictures the players have already seen
+# -----------------------------------------------------------------------
+
+import logging
+import os
+import random
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from src import cache
+from src.models import Picture, SeenPictures
+
+load_dotenv()
+# when set, every challenge's pictures depend only on this value and the
+# challenge id, so tests and load tests can be replayed exactly
+ROUND_SEED = os.environ.get("ROUND_SEED") or None
+
+ROUNDS = 5
+
+logger = logging.getLogger("tigerspot.rounds")
+
+# below one available id in SPARSE across the id range, list the
+# available ids instead of drawing random ones until enough hit
+SPARSE = 8
+
+# shared by unseeded selections; random.seed() on every call is not needed
+_rng = random.Random()
+
+# -----------------------------------------------------------------------
+
+
+# Returns a bitmap of the given ids as an int: bit n is set for id n
+def bitmap(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for pictureid in ids:
+        data[pictureid // 8] |= 1 << (pictureid % 8)
+    return int.from_bytes(data, "little")
+
+
+# Returns the ids whose bit is set in bitmap, in increasing order
+def bitmap_ids(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    return [
+        index * 8 + bit
+        for index, byte in enumerate(data)
+        if byte
+        for bit in range(8)
+        if byte >> bit & 1
+    ]
+
+
+# Returns (lowest id, highest id, number of live pictures, bitmap of live
+# ids), cached until the catalog changes
+def catalog(session):
+    def load():
+        ids = session.scalars(
+            select(Picture.pictureid).where(
+                Picture.deleted_at.is_(None), Picture.pictureid >= 0
+            )
+        ).all()
+        if not ids:
+            return (0, 0, 0, 0)
+        return (min(ids), max(ids), len(ids), bitmap(ids))
+
+    return cache.cached_value("picture_catalog", load, tags=("pictures",))
+
+
+# Returns the union of players' seen bitmaps (see seen_database.py)
+def seen_by(session, players):
+    if not players:
+        return 0
+    union = 0
+    for seen in session.scalars(
+        select(SeenPictures.seen).where(SeenPictures.username.in_(players))
+    ):
+        union |= int.from_bytes(seen or b"", "little")
+    return union
+
+
+# Returns the random generator for a challenge: reproducible when a seed
+# is given or ROUND_SEED is set, shared otherwise
+def rng_for(challenge_id=None, seed=None):
+    if seed is None and ROUND_SEED is not None and challenge_id is not None:
+        seed = f"{ROUND_SEED}:{challenge_id}"
+    if seed is None:
+        return _rng
+    return random.Random(str(seed))
+
+
+# -----------------------------------------------------------------------
+
+
+def select_rounds(session, k=ROUNDS, rng=None, avoid=0):
+    """
+    Returns k distinct live picture ids, avoiding those set in the avoid
+    bitmap.
+
+    The live ids come from the cached catalog() bitmap, so the pictures
+    left to play are `live & ~avoid`: a few big-int operations over
+    catalog/64 words and no query. Ids drawn from the id range are kept
+    when their bit is set; when fewer than one id in SPARSE is left, the
+    set bits are listed and sampled instead. avoid is ignored if it would
+    leave fewer than k pictures; ids only repeat if the whole catalog is
+    smaller than k.
+    """
+    rng = rng or _rng
+    low, high, count, live = catalog(session)
+    if count == 0:
+        logger.warning("No pictures found in database.")
+        return [1] * k
+
+    available = live & ~avoid
+    remaining = available.bit_count()
+    if remaining < k:
+        # a player who has seen almost everything still gets a game
+        available, remaining = live, count
+
+    wanted = min(k, remaining)
+    if remaining * SPARSE < high - low + 1:
+        chosen = rng.sample(bitmap_ids(available), wanted)
+    else:
+        chosen = []
+        while len(chosen) < wanted:
+            pictureid = rng.randint(low, high)
+            if available >> pictureid & 1 and pictureid not in chosen:
+                chosen.append(pictureid)
+
+    # a catalog smaller than k cannot fill every round with a new picture
+    distinct = len(chosen)
+    while len(chosen) < k:
+        chosen.append(chosen[len(chosen) % distinct])
+
+    return chosen
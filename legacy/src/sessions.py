@@ -0,0 +1,178 @@
+# -----------------------------------------------------------------------
+# sessions.py
+# Optional server-side sessions: the cookie holds only a random session
+# id and the data lives in a cache backend (see cache.py)
+#
+# Usage (revocation needs a shared backend such as Redis):
+#   python -m src.sessions revoke-user <netid>
+#   python -m src.sessions revoke <session id>
+# -----------------------------------------------------------------------
+
+import os
+import re
+import secrets
+import sys
+import time
+
+from dotenv import load_dotenv
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from src import cache
+
+load_dotenv()
+# memory:// or redis://host:port/db; unset keeps Flask's signed cookie
+SESSION_STORE = os.environ.get("SESSION_STORE") or None
+
+# seconds a session lives after it was last written
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))
+
+# an unchanged session is written back at most this often, to push its
+# expiry forward without a write on every request
+REFRESH_SECONDS = 3600
+
+# sessions kept by the memory store before the least recently used go
+MEMORY_SESSIONS = 100000
+
+_SID = re.compile(r"^[A-Za-z0-9_-]{24}$")
+
+# -----------------------------------------------------------------------
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data loaded from the store, with the id it is kept under."""
+
+    def __init__(self, initial=None, sid=None, new=False, written_at=0, generation=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.written_at = written_at
+        self.generation = generation
+        # the user the session belonged to when it was loaded
+        self.loaded_username = self.get("username")
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Keeps session data in backend under "session:<id>" for ttl seconds.
+
+    The cookie is a 24 character random id, so nothing is signed or
+    verified per request. Each session records its user's generation
+    counter when it is first saved; revoke_user() bumps the counter,
+    which turns every older session of that user into a new, empty one.
+    """
+
+    def __init__(self, backend, ttl=SESSION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, sid):
+        return "session:" + sid
+
+    def _generation(self, username):
+        return self.backend.get_counter("session_gen:" + username)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID.match(sid):
+            entry = self.backend.get(self._key(sid))
+            if entry is not None:
+                data, written_at, generation = entry
+                username = data.get("username")
+                if username is None or generation >= self._generation(username):
+                    return ServerSession(
+                        data, sid=sid, written_at=written_at, generation=generation
+                    )
+        return ServerSession(sid=secrets.token_urlsafe(18), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # logged out: forget the stored data and the cookie
+            if session.modified and not session.new:
+                self.backend.delete(self._key(session.sid))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        username = session.get("username")
+        if username != session.loaded_username and not session.new:
+            # a new id on login, so an id known before it is worthless
+            self.backend.delete(self._key(session.sid))
+            session.sid = secrets.token_urlsafe(18)
+            session.new = True
+            session.generation = None
+
+        now = time.time()
+        if not (session.modified or session.new) and now - session.written_at < REFRESH_SECONDS:
+            return
+
+        generation = session.generation
+        if generation is None:
+            generation = self._generation(username) if username else 0
+        self.backend.set(
+            self._key(session.sid), (dict(session), now, generation), self.ttl
+        )
+        if session.new or session.modified:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns the store backend for url; the memory store holds many more
+# entries than the page cache's default
+def create_backend(url):
+    if url.startswith("memory://"):
+        return cache.MemoryBackend(max_entries=MEMORY_SESSIONS)
+    return cache.create_backend(url)
+
+
+# Switches app to server-side sessions when SESSION_STORE is set
+def init_app(app, url=SESSION_STORE):
+    if url is None:
+        return
+    app.session_interface = ServerSideSessionInterface(create_backend(url))
+
+
+# Ends one session
+def revoke(backend, sid):
+    backend.delete("session:" + sid)
+
+
+# Ends every current session of username, on every worker sharing backend
+def revoke_user(backend, username):
+    backend.incr("session_gen:" + username)
+
+
+# -----------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if SESSION_STORE is None or len(sys.argv) != 3:
+        print("Usage: SESSION_STORE=redis://... python -m src.sessions revoke-user|revoke <value>")
+        raise SystemExit(1)
+    backend = create_backend(SESSION_STORE)
+    command, value = sys.argv[1], sys.argv[2]
+    if command == "revoke-user":
+        revoke_user(backend, value)
+    elif command == "revoke":
+        revoke(backend, value)
+    else:
+        print(f"Unknown command: {command}")
+        raise SystemExit(1)
+    print("Revoked.")
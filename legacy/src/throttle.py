@@ -0,0 +1,182 @@
+# -----------------------------------------------------------------------
+# throttle.py
+# Per-user rate limiting and coalescing of duplicate submissions, kept
+# in their own backend so page caching never evicts them: per worker
+# with memory://, shared by every worker with redis://
+# -----------------------------------------------------------------------
+
+import functools
+import math
+import os
+import threading
+import time
+
+import flask
+from dotenv import load_dotenv
+
+from src import cache
+from src import metrics
+
+load_dotenv()
+# submissions a user may make in a burst, and how fast the allowance
+# comes back; a double click or a retry fits well within the burst
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "1"))
+
+# memory:// or redis://host:port/db; defaults to the page cache's server
+THROTTLE_URL = os.environ.get("THROTTLE_URL") or cache.CACHE_URL
+
+# buckets and results kept by the memory store before the least recently
+# used go; one bucket per active user, so far more than the page cache
+MEMORY_ENTRIES = 100000
+
+# how long a duplicate submission is answered with the first result
+RESULT_TTL = 60
+
+# how long a duplicate waits for the first request before running itself
+WAIT_SECONDS = 10
+POLL_SECONDS = 0.02
+
+# The GCRA step below, run inside Redis so that concurrent workers see
+# each other's tokens. It uses the server's clock, and returns a string
+# because Redis truncates Lua numbers to integers.
+_TAKE_TOKEN = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local allowance = tonumber(ARGV[2])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+if full_at - now > allowance then
+    return tostring(full_at - now - allowance)
+end
+full_at = full_at + interval
+redis.call('SET', KEYS[1], tostring(full_at), 'EX', math.ceil(full_at - now) + 1)
+return '0'
+"""
+
+# makes the memory store's check-then-set atomic within the process,
+# which is all a per-process store needs
+_bucket_lock = threading.Lock()
+
+# -----------------------------------------------------------------------
+
+
+# Returns the store backend for url
+def create_backend(url):
+    if url.startswith("memory://"):
+        return cache.MemoryBackend(max_entries=MEMORY_ENTRIES)
+    return cache.create_backend(url)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Returns the process-wide throttle store configured by THROTTLE_URL
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(THROTTLE_URL)
+    return _backend
+
+
+# Replaces the process-wide throttle store (used by tests)
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+# -----------------------------------------------------------------------
+
+
+# Takes one token from name's bucket for username. The bucket is stored
+# as the time it will be full again (the GCRA form of a token bucket),
+# so it is one key per user and needs no refill job. Returns 0 if the
+# request may go ahead, otherwise the seconds until a token is free.
+def take_token(name, username, burst=RATE_LIMIT_BURST, rate=RATE_LIMIT_PER_SECOND):
+    backend = get_backend()
+    key = f"bucket:{name}:{username}"
+    interval = 1 / rate
+    # full_at - now is how many tokens are in use, in seconds
+    allowance = (burst - 1) * interval
+    if isinstance(backend, cache.RedisBackend):
+        return float(backend.run_script(_TAKE_TOKEN, [key], [interval, allowance]))
+
+    with _bucket_lock:
+        now = time.time()
+        full_at = max(backend.get(key) or now, now)
+        if full_at - now > allowance:
+            return full_at - now - allowance
+        full_at += interval
+        backend.set(key, full_at, ttl=math.ceil(full_at - now) + 1)
+    return 0
+
+
+# Decorator for routes: answers 429 with Retry-After once the signed-in
+# user has used up their bucket called name. Routes doing the same thing
+# (an HTML form and its API twin) share a name and so share the bucket.
+def rate_limited(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            username = flask.session.get("username")
+            if username is not None:
+                wait = take_token(name, username)
+                if wait:
+                    metrics.RATE_LIMITED.inc(bucket=name)
+                    return _too_many(wait)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _too_many(wait):
+    if flask.request.blueprint == "api":
+        response = flask.jsonify({"error": "too many requests"})
+    else:
+        response = flask.make_response("Too many submissions; try again in a moment.")
+    response.status_code = 429
+    response.headers["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+# -----------------------------------------------------------------------
+
+
+# Returns fn(), running it once for every call with the same key within
+# RESULT_TTL seconds. The first call claims the key with the backend's
+# add() and stores its result; calls made while it runs wait for that
+# result, and later calls reuse it. If the first call fails, nothing is
+# stored and a waiting call runs fn itself.
+def coalesce(key, fn):
+    backend = get_backend()
+    result_key = "coalesce:result:" + key
+    lock_key = "coalesce:lock:" + key
+
+    entry = backend.get(result_key)
+    if entry is not None:
+        metrics.COALESCED_REQUESTS.inc()
+        return entry[0]
+
+    if backend.add(lock_key, True, ttl=WAIT_SECONDS):
+        try:
+            value = fn()
+            backend.set(result_key, (value,), RESULT_TTL)
+            return value
+        finally:
+            backend.delete(lock_key)
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = backend.get(result_key)
+        if entry is not None:
+            metrics.COALESCED_REQUESTS.inc()
+            return entry[0]
+        if backend.get(lock_key) is None:
+            break
+    return fn()
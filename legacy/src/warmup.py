@@ -0,0 +1,69 @@
+# -----------------------------------------------------------------------
+# warmup.py
+# Template bytecode cache and startup warmup for the Flask app
+# -----------------------------------------------------------------------
+
+import logging
+import os
+import tempfile
+import time
+
+from dotenv import load_dotenv
+from jinja2 import FileSystemBytecodeCache
+from jinja2.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tigerspot-jinja")
+)
+
+# -----------------------------------------------------------------------
+
+
+# Stores compiled templates on disk so a recycled worker (or a new one
+# on the same machine) loads bytecode instead of recompiling sources.
+def configure_bytecode_cache(app, directory=TEMPLATE_CACHE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    # room for every template, so precompiled ones are never evicted,
+    # while the cache stays bounded
+    templates = len(app.jinja_env.list_templates(extensions=["html"]))
+    app.jinja_env.cache = LRUCache(max(templates, app.jinja_env.cache.capacity))
+    return directory
+
+
+# -----------------------------------------------------------------------
+
+
+# Loads every template in the app's template folder so none is compiled
+# lazily on a player's request. Returns (template name, seconds) pairs.
+def precompile_templates(app):
+    timings = []
+    for name in sorted(app.jinja_env.list_templates(extensions=["html"])):
+        start = time.perf_counter()
+        app.jinja_env.get_template(name)
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+
+# -----------------------------------------------------------------------
+
+
+# Logs how long each startup phase took, slowest templates first, at
+# info level; like the SQL statistics, it gets its own stderr handler
+# when logging is not configured, so it shows under gunicorn
+def report(phases, timings):
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    log = logger.info
+    log("[startup] pid %d", os.getpid())
+    for phase, seconds in phases:
+        log("[startup]   %-28s %8.1f ms", phase, seconds * 1000)
+    slowest = sorted(timings, key=lambda timing: timing[1], reverse=True)[:5]
+    for name, seconds in slowest:
+        log("[startup]     %-26s %8.1f ms", name, seconds * 1000)
@@ -0,0 +1,293 @@
+# -----------------------------------------------------------------------
+# test_api.py
+# Tests for the /api/v1 routes, on a Flask app with only the API
+# blueprint and the Databases functions replaced by an in-memory game
+# -----------------------------------------------------------------------
+
+import flask
+import pytest
+
+from src import api
+from src import game
+from src import throttle
+
+PRINCETON = (40.3487, -74.6593)
+LINK = "https://example.com/picture.jpg"
+
+# -----------------------------------------------------------------------
+
+
+# One daily picture and one accepted five-round challenge between
+# "player" and "opponent", with the writes the game makes recorded
+class FakeDatabase:
+    def __init__(self):
+        self.played = False
+        self.daily_points = 0
+        self.total_points = 100
+        self.writes = []
+        self.seen = []
+        self.pictures = [
+            {
+                "pictureid": pictureid,
+                "link": f"https://example.com/{pictureid}.jpg",
+                "coordinates": PRINCETON,
+                "place": f"Place {pictureid}",
+            }
+            for pictureid in range(1, 6)
+        ]
+        self.started = {"player": False, "opponent": False}
+        self.answered = {"player": [False] * 5, "opponent": [False] * 5}
+        self.finished = set()
+
+    # pictures_database
+    def pic_of_day(self):
+        return 7
+
+    def get_pic_info(self, column, pictureid):
+        return {"link": LINK, "coordinates": PRINCETON, "place": "Nassau Hall"}[column]
+
+    # daily_user_database
+    def player_played(self, username):
+        return self.played
+
+    def get_daily_points(self, username):
+        return self.daily_points
+
+    def get_daily_distance(self, username):
+        return 0
+
+    def update_player_daily(self, username, points, distance):
+        if self.played:
+            return "already_played"
+        self.writes.append(("update_player_daily", username, points))
+        self.played = True
+        self.daily_points = points
+        self.total_points += points
+        return "success"
+
+    # seen_database
+    def mark_seen(self, username, pictureid):
+        self.seen.append((username, pictureid))
+
+    # challenges_database, versus_database and matches_database
+    def get_versus_pictures(self, challenge_id):
+        if challenge_id != 1:
+            return None
+        return [dict(picture) for picture in self.pictures]
+
+    def get_playbutton_status(self, challenge_id, username):
+        if challenge_id != 1:
+            return None
+        return self.started.get(username)
+
+    def update_playbutton_status(self, challenge_id, username):
+        self.started[username] = True
+
+    def get_versus_pic_status(self, challenge_id, username, index):
+        return self.answered[username][index - 1]
+
+    def forfeit_rounds(self, challenge_id, username):
+        self.answered[username] = [True] * 5
+        return "success"
+
+    def record_round(self, challenge_id, username, index, points):
+        if self.answered[username][index - 1]:
+            return "already_submitted"
+        self.writes.append(("record_round", username, index, points))
+        self.answered[username][index - 1] = True
+        return "success"
+
+    def update_finish_status(self, challenge_id, username):
+        self.finished.add(username)
+        return True
+
+    def check_finish_status(self, challenge_id):
+        done = self.finished == {"player", "opponent"}
+        return {"status": "finished" if done else "unfinished"}
+
+
+STUBBED = {
+    game.pictures_database: ("pic_of_day", "get_pic_info"),
+    game.daily_user_database: (
+        "player_played",
+        "get_daily_points",
+        "get_daily_distance",
+        "update_player_daily",
+    ),
+    game.seen_database: ("mark_seen",),
+    game.challenges_database: (
+        "get_versus_pictures",
+        "get_playbutton_status",
+        "update_playbutton_status",
+        "update_finish_status",
+        "check_finish_status",
+    ),
+    game.versus_database: (
+        "get_versus_pic_status",
+        "forfeit_rounds",
+        "record_round",
+    ),
+}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = FakeDatabase()
+    for module, names in STUBBED.items():
+        for name in names:
+            monkeypatch.setattr(module, name, getattr(fake, name))
+    return fake
+
+
+@pytest.fixture
+def client(database):
+    app = flask.Flask(__name__)
+    app.secret_key = "tests"
+    app.register_blueprint(api.blueprint)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "player"
+    return client
+
+
+def guess(client, index, **body):
+    return client.post(f"/api/v1/challenges/1/rounds/{index}", json=body)
+
+
+# -----------------------------------------------------------------------
+
+
+def test_requires_a_session(database):
+    app = flask.Flask(__name__)
+    app.secret_key = "tests"
+    app.register_blueprint(api.blueprint)
+    response = app.test_client().get("/api/v1/daily")
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "not signed in"}
+
+
+def test_daily_state(client):
+    response = client.get("/api/v1/daily")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "played": False,
+        "points": 0,
+        "distance": 0,
+        "picture": {"src": LINK, "srcset": ""},
+    }
+
+
+def test_daily_guess(client, database):
+    response = client.post("/api/v1/daily", json={"lat": 40.3487, "lon": -74.6593})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["points"] == 1500
+    assert result["place"] == "Nassau Hall"
+    assert database.total_points == 1600
+    assert database.seen == [("player", 7)]
+
+    assert client.get("/api/v1/daily").get_json()["picture"] is None
+
+
+def test_repeated_daily_guess_gets_the_first_result(client, database):
+    first = client.post("/api/v1/daily", json={"lat": 40.3487, "lon": -74.6593})
+    second = client.post("/api/v1/daily", json={"lat": 40.3487, "lon": -74.6593})
+    assert second.get_json() == first.get_json()
+    assert [write[0] for write in database.writes] == ["update_player_daily"]
+
+
+def test_daily_guess_after_playing_is_a_conflict(client, database):
+    database.played = True
+    response = client.post("/api/v1/daily", json={"lat": 40.3487, "lon": -74.6593})
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "already played today"}
+
+
+def test_daily_guess_recorded_by_another_request_first(client, database, monkeypatch):
+    # both requests passed the played check; the row lock let the other
+    # one commit first
+    monkeypatch.setattr(
+        game.daily_user_database,
+        "update_player_daily",
+        lambda username, points, distance: "already_played",
+    )
+    response = client.post("/api/v1/daily", json={"lat": 40.3487, "lon": -74.6593})
+    assert response.status_code == 409
+    assert database.total_points == 100
+    assert database.seen == []
+
+
+@pytest.mark.parametrize("body", [{}, {"lat": 40.3487}, [40.3487, -74.6593]])
+def test_daily_guess_needs_lat_and_lon(client, body):
+    assert client.post("/api/v1/daily", json=body).status_code == 400
+
+
+# -----------------------------------------------------------------------
+
+
+def test_rounds_need_play_pressed(client):
+    assert client.get("/api/v1/challenges/1/rounds/0").status_code == 409
+    response = guess(client, 0, lat=40.3487, lon=-74.6593, time=5)
+    assert response.status_code == 409
+    assert response.get_json() == {"error": "press play first"}
+
+
+def test_unknown_challenge(client):
+    assert client.post("/api/v1/challenges/2/start").status_code == 404
+
+
+def test_play_through_a_challenge(client, database):
+    response = client.post("/api/v1/challenges/1/start")
+    assert response.get_json() == {
+        "status": "started",
+        "rounds": 5,
+        "next": {
+            "round": 0,
+            "picture": {"src": database.pictures[0]["link"], "srcset": ""},
+        },
+    }
+
+    picture = client.get("/api/v1/challenges/1/rounds/2").get_json()
+    assert picture["picture"]["src"] == database.pictures[2]["link"]
+    assert client.get("/api/v1/challenges/1/rounds/5").status_code == 404
+
+    for index in range(4):
+        result = guess(client, index, lat=40.3487, lon=-74.6593, time=5).get_json()
+        assert result["points"] == 1000
+        assert result["already_submitted"] is False
+        assert result["next"]["round"] == index + 1
+
+    # the timer ran out on the last round
+    result = guess(client, 4).get_json()
+    assert result["points"] == 0
+    assert result["distance"] is None
+    assert result["next"] is None
+    assert result["challenge"] == "unfinished"
+    assert database.answered["player"] == [True] * 5
+    assert database.seen == [("player", pictureid) for pictureid in range(1, 6)]
+
+
+def test_repeated_round_is_not_scored_twice(client, database):
+    client.post("/api/v1/challenges/1/start")
+    first = guess(client, 0, lat=40.3487, lon=-74.6593, time=5).get_json()
+    # within RESULT_TTL the first result comes back as it was
+    assert guess(client, 0, lat=40.3487, lon=-74.6593, time=5).get_json() == first
+
+    # after it, the round reads as answered and scores nothing
+    throttle.set_backend(throttle.create_backend("memory://"))
+    again = guess(client, 0, lat=40.3487, lon=-74.6593, time=5).get_json()
+    assert again["already_submitted"] is True
+    assert again["points"] is None
+    assert [write for write in database.writes if write[0] == "record_round"] == [
+        ("record_round", "player", 1, 1000)
+    ]
+    # marking a picture seen again is harmless, so it is not guarded
+    assert set(database.seen) == {("player", 1)}
+
+
+def test_second_press_forfeits(client, database):
+    client.post("/api/v1/challenges/1/start")
+    response = client.post("/api/v1/challenges/1/start")
+    assert response.get_json() == {"status": "forfeited"}
+    assert database.answered["player"] == [True] * 5
+    assert database.finished == {"player"}
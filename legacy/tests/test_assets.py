@@ -0,0 +1,86 @@
+# -----------------------------------------------------------------------
+# test_assets.py
+# Tests for content-hashed static file names and their caching headers
+# -----------------------------------------------------------------------
+
+import gzip
+
+import flask
+import pytest
+
+from src import assets
+
+# -----------------------------------------------------------------------
+
+STYLES = b"body { color: orange; }\n" * 50
+
+
+@pytest.fixture
+def app(tmp_path):
+    static = tmp_path / "static"
+    (static / "styles").mkdir(parents=True)
+    (static / "styles" / "styles.css").write_bytes(STYLES)
+    (static / "logo.png").write_bytes(b"\x89PNG not really")
+    app = flask.Flask(__name__, static_folder=str(static))
+    assets.init_app(app)
+    return app
+
+
+def static_url(app, filename):
+    with app.test_request_context():
+        return flask.url_for("static", filename=filename)
+
+
+# -----------------------------------------------------------------------
+
+
+def test_url_for_uses_the_hashed_name(app):
+    url = static_url(app, "styles/styles.css")
+    digest = assets.build_manifest(app.static_folder)["styles/styles.css"]
+    assert url == f"/static/styles/styles.{digest}.css"
+    # files not in the manifest keep their name
+    assert static_url(app, "missing.js") == "/static/missing.js"
+
+
+def test_hash_changes_with_the_content(app, tmp_path):
+    before = assets.build_manifest(app.static_folder)["styles/styles.css"]
+    (tmp_path / "static" / "styles" / "styles.css").write_bytes(STYLES + b"p {}")
+    after = assets.build_manifest(app.static_folder)["styles/styles.css"]
+    assert before != after
+
+
+def test_hashed_file_is_immutable(app):
+    client = app.test_client()
+    response = client.get(static_url(app, "logo.png"))
+    assert response.status_code == 200
+    assert response.get_data() == b"\x89PNG not really"
+    cache_control = response.cache_control
+    assert cache_control.public
+    assert cache_control.immutable
+    assert cache_control.max_age == assets.IMMUTABLE_MAX_AGE
+    assert "Content-Encoding" not in response.headers
+
+
+def test_hashed_stylesheet_is_gzipped(app):
+    client = app.test_client()
+    url = static_url(app, "styles/styles.css")
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.mimetype == "text/css"
+    assert gzip.decompress(response.get_data()) == STYLES
+
+    plain = client.get(url)
+    assert "Content-Encoding" not in plain.headers
+    assert plain.get_data() == STYLES
+
+
+@pytest.mark.parametrize(
+    "url", ["/static/styles/styles.css", "/static/styles/styles.0123456789.css"]
+)
+def test_plain_and_stale_names_are_not_immutable(app, url):
+    # a stale hash is a name from an old deploy: the current file is sent
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.get_data() == STYLES
+    assert not response.cache_control.immutable
@@ -0,0 +1,132 @@
+# -----------------------------------------------------------------------
+# test_cas.py
+# Tests for the CAS ticket client against the fake CAS server, and
+# against servers that refuse or never answer
+# -----------------------------------------------------------------------
+
+import socket
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from src.CAS import fake_cas
+from src.CAS.client import CASClient, CASUnavailableError
+
+SERVICE = "http://localhost/menu"
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def cas():
+    server = fake_cas.start()
+    yield server, f"http://127.0.0.1:{server.server_port}/cas/"
+    server.shutdown()
+    server.server_close()
+
+
+# Logs netid in to the fake CAS and returns the ticket it issues
+def login(base_url, netid):
+    query = urllib.parse.urlencode({"service": SERVICE, "netid": netid})
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+    try:
+        opener.open(base_url + "login?" + query)
+    except urllib.error.HTTPError as redirect:
+        location = redirect.headers["Location"]
+    return urllib.parse.parse_qs(urllib.parse.urlsplit(location).query)["ticket"][0]
+
+
+# A server that accepts connections and reads requests but never answers
+@pytest.fixture
+def silent_server():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    accepted = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            accepted.append(conn)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}/cas/", accepted
+    listener.close()
+    for conn in accepted:
+        conn.close()
+
+
+# -----------------------------------------------------------------------
+
+
+def test_valid_ticket_returns_the_netid(cas):
+    server, base_url = cas
+    client = CASClient(base_url)
+    assert client.validate(SERVICE, login(base_url, "alice")) == "alice"
+    assert client.validate(SERVICE, login(base_url, "bob")) == "bob"
+
+
+def test_rejected_ticket_is_remembered(cas):
+    server, base_url = cas
+    client = CASClient(base_url, retries=0)
+    ticket = login(base_url, "alice")
+    assert client.validate(SERVICE, ticket) == "alice"
+    # tickets are single use
+    assert client.validate(SERVICE, ticket) is None
+
+    # answered from the negative cache, without asking CAS
+    server.shutdown()
+    server.server_close()
+    assert client.validate(SERVICE, ticket) is None
+
+
+def test_unreachable_cas_is_retried_then_fails():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    client = CASClient(f"http://127.0.0.1:{port}/cas/", retries=2, backoff=0)
+    with pytest.raises(CASUnavailableError):
+        client.validate(SERVICE, "ST-1")
+
+
+def test_read_timeout_is_not_retried(silent_server):
+    base_url, accepted = silent_server
+    client = CASClient(base_url, read_timeout=0.2, retries=2, backoff=0)
+    with pytest.raises(CASUnavailableError):
+        client.validate(SERVICE, "ST-1")
+    # the ticket was sent once; sending it again could only fail
+    assert len(accepted) == 1
+
+
+def pooled(client):
+    return [conn for conn, _ in client._pool.queue]
+
+
+def test_connections_are_reused(cas):
+    server, base_url = cas
+    client = CASClient(base_url)
+    assert client.validate(SERVICE, login(base_url, "alice")) == "alice"
+    first = pooled(client)
+    assert client.validate(SERVICE, login(base_url, "bob")) == "bob"
+    assert pooled(client) == first
+
+
+def test_idle_pooled_connections_are_not_reused(cas):
+    server, base_url = cas
+    client = CASClient(base_url, idle_timeout=0)
+    assert client.validate(SERVICE, login(base_url, "alice")) == "alice"
+    [first] = pooled(client)
+    assert client.validate(SERVICE, login(base_url, "bob")) == "bob"
+    assert pooled(client) != [first]
+    assert first.sock is None
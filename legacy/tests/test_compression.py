@@ -0,0 +1,117 @@
+# -----------------------------------------------------------------------
+# test_compression.py
+# Tests for compressing HTML and JSON responses
+# -----------------------------------------------------------------------
+
+import gzip
+
+import flask
+import pytest
+
+import app as tigerspot
+from src import compression
+
+# -----------------------------------------------------------------------
+
+PAGE = "<p>" + "Nassau Hall " * 200 + "</p>"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # the gzip path is the one every deploy has
+    monkeypatch.setattr(compression, "brotli", None)
+    app = flask.Flask(__name__)
+    compression.init_app(app)
+
+    @app.route("/page")
+    def page():
+        return PAGE
+
+    @app.route("/small")
+    def small():
+        return "<p>hi</p>"
+
+    @app.route("/json")
+    def json():
+        return {"places": ["Nassau Hall"] * 100}
+
+    @app.route("/missing")
+    def missing():
+        return PAGE, 404
+
+    @app.route("/stream")
+    def stream():
+        return flask.Response((PAGE for _ in range(2)), mimetype="text/html")
+
+    @app.route("/etag")
+    def etag():
+        response = flask.make_response(PAGE)
+        response.set_etag("abc")
+        return response
+
+    return app.test_client()
+
+
+GZIP = {"Accept-Encoding": "gzip, deflate"}
+
+
+# -----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "header, encoding",
+    [
+        ("gzip, deflate, br", "gzip"),
+        ("br;q=1.0, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding_without_brotli(monkeypatch, header, encoding):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.choose_encoding(header) == encoding
+
+
+@pytest.mark.parametrize("path", ["/page", "/json"])
+def test_large_responses_are_gzipped(client, path):
+    plain = client.get(path)
+    response = client.get(path, headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+    assert len(response.get_data()) < len(plain.get_data())
+
+
+def test_without_accept_encoding_nothing_is_compressed(client):
+    response = client.get("/page")
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data(as_text=True) == PAGE
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+@pytest.mark.parametrize("path", ["/small", "/missing", "/stream"])
+def test_ineligible_responses_are_sent_as_they_are(client, path):
+    response = client.get(path, headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compressed_etag_is_weak(client):
+    response = client.get("/etag", headers=GZIP)
+    assert response.headers["ETag"] == 'W/"abc"'
+    assert "Content-Encoding" not in client.get("/etag").headers
+    assert client.get("/etag").headers["ETag"] == '"abc"'
+
+
+def test_cached_page_revalidates_after_compression(monkeypatch):
+    # the index page is smaller than MIN_SIZE
+    monkeypatch.setattr(compression, "MIN_SIZE", 0)
+    client = tigerspot.app.test_client()
+    response = client.get("/", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] in ("gzip", "br")
+    etag = response.headers["ETag"]
+    assert etag.startswith("W/")
+
+    again = client.get("/", headers={"If-None-Match": etag, **GZIP})
+    assert again.status_code == 304
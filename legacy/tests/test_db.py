@@ -0,0 +1,218 @@
+# -----------------------------------------------------------------------
+# test_db.py
+# Tests for the unit of work in src/db.py and the error handling in
+# src/errors.py: what is retried, what is not, and what a commit lost in
+# doubt turns into. Runs on an in-memory SQLite engine hooked up like
+# the app's, with the Postgres transaction id functions stubbed.
+# -----------------------------------------------------------------------
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src import db
+from src import errors
+
+# -----------------------------------------------------------------------
+
+
+class PgError(Exception):
+    def __init__(self, pgcode=None):
+        super().__init__(f"pgcode {pgcode}")
+        self.pgcode = pgcode
+
+
+def serialization_failure():
+    return OperationalError("UPDATE users", {}, PgError(errors.SERIALIZATION_FAILURE))
+
+
+# a dropped connection: an OperationalError without a SQLSTATE
+def disconnect():
+    return OperationalError("COMMIT", {}, PgError())
+
+
+# A session whose next commits fail with the errors queued in fail_commits
+class FlakySession(Session):
+    fail_commits = []
+
+    def commit(self):
+        if FlakySession.fail_commits:
+            super().rollback()
+            raise FlakySession.fail_commits.pop(0)
+        super().commit()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+    @event.listens_for(engine, "connect")
+    def add_txid_function(dbapi_connection, connection_record):
+        dbapi_connection.create_function("txid_current_if_assigned", 0, lambda: 42)
+
+    event.listen(engine, "before_cursor_execute", db._note_statement)
+    event.listen(engine, "commit", db._clear_write_flag)
+    event.listen(engine, "rollback", db._clear_write_flag)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE scores (name TEXT, points INTEGER)"))
+
+    FlakySession.fail_commits = []
+    monkeypatch.setattr(
+        db, "SessionLocal", sessionmaker(bind=engine, class_=FlakySession)
+    )
+    return engine
+
+
+def rows(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT name, points FROM scores")).all()
+
+
+# Returns a @transactional function that adds a row and counts its calls,
+# raising the errors queued in fail first
+def add_score(fail=()):
+    fail = list(fail)
+    calls = []
+
+    @db.transactional(backoff=0)
+    def add(session, name, points):
+        calls.append(name)
+        session.execute(
+            text("INSERT INTO scores VALUES (:name, :points)"),
+            {"name": name, "points": points},
+        )
+        if fail:
+            raise fail.pop(0)
+        return "success"
+
+    return add, calls
+
+
+# -----------------------------------------------------------------------
+
+
+def test_commits_once_and_returns_the_result(engine):
+    add, calls = add_score()
+    assert add("alice", 10) == "success"
+    assert calls == ["alice"]
+    assert rows(engine) == [("alice", 10)]
+
+
+def test_serialization_failure_is_retried(engine):
+    add, calls = add_score(fail=[serialization_failure()])
+    assert add("alice", 10) == "success"
+    assert len(calls) == 2
+    # the failed attempt was rolled back, so the row is written once
+    assert rows(engine) == [("alice", 10)]
+
+
+def test_retries_are_bounded(engine):
+    add, calls = add_score(fail=[serialization_failure()] * 4)
+    with pytest.raises(errors.TransientDatabaseError):
+        add("alice", 10)
+    assert len(calls) == 4
+    assert rows(engine) == []
+
+
+def test_other_errors_are_not_retried(engine):
+    add, calls = add_score(fail=[IntegrityError("INSERT", {}, PgError("23505"))])
+    with pytest.raises(errors.DatabaseError) as error:
+        add("alice", 10)
+    assert not isinstance(error.value, errors.TransientDatabaseError)
+    assert len(calls) == 1
+
+
+def test_commit_lost_but_committed_is_not_run_again(engine, monkeypatch):
+    asked = []
+
+    def committed(xid):
+        asked.append(xid)
+        return "committed"
+
+    monkeypatch.setattr(db, "_transaction_status", committed)
+    FlakySession.fail_commits = [disconnect()]
+    add, calls = add_score()
+    assert add("alice", 10) == "success"
+    assert calls == ["alice"]
+    assert asked == [42]
+
+
+def test_commit_in_doubt_is_not_retried(engine, monkeypatch):
+    monkeypatch.setattr(db, "_transaction_status", lambda xid: None)
+    FlakySession.fail_commits = [disconnect()]
+    add, calls = add_score()
+    with pytest.raises(errors.CommitOutcomeUnknownError):
+        add("alice", 10)
+    assert calls == ["alice"]
+
+
+def test_commit_lost_and_aborted_is_retried(engine, monkeypatch):
+    monkeypatch.setattr(db, "_transaction_status", lambda xid: "aborted")
+    FlakySession.fail_commits = [disconnect()]
+    add, calls = add_score()
+    assert add("alice", 10) == "success"
+    assert len(calls) == 2
+    assert rows(engine) == [("alice", 10)]
+
+
+def test_read_only_transaction_skips_the_txid_and_is_retried(engine, monkeypatch):
+    def no_status(xid):
+        raise AssertionError("a read-only transaction has no id to look up")
+
+    monkeypatch.setattr(db, "_transaction_status", no_status)
+    FlakySession.fail_commits = [disconnect()]
+    calls = []
+
+    @db.transactional(backoff=0)
+    def count(session):
+        calls.append(1)
+        return session.execute(text("SELECT count(*) FROM scores")).scalar()
+
+    assert count() == 0
+    assert len(calls) == 2
+
+
+# -----------------------------------------------------------------------
+
+
+def test_database_operation_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(errors.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    @errors.database_operation
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise serialization_failure()
+        return "success"
+
+    assert flaky() == "success"
+    assert len(attempts) == 2
+
+
+def test_database_operation_without_retries(monkeypatch):
+    monkeypatch.setattr(errors.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    @errors.database_operation(retries=0)
+    def add_points():
+        attempts.append(1)
+        raise disconnect()
+
+    with pytest.raises(errors.TransientDatabaseError):
+        add_points()
+    assert len(attempts) == 1
+
+
+def test_get_session_rolls_back_and_reraises(engine):
+    with pytest.raises(ZeroDivisionError):
+        with db.get_session() as session:
+            session.execute(text("INSERT INTO scores VALUES ('alice', 10)"))
+            1 / 0
+    assert rows(engine) == []
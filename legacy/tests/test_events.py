@@ -0,0 +1,61 @@
+# -----------------------------------------------------------------------
+# test_events.py
+# Tests for the challenge event listener's connection handling
+# -----------------------------------------------------------------------
+
+import pytest
+
+from src import db
+from src import events
+
+# -----------------------------------------------------------------------
+
+
+class StopListening(Exception):
+    pass
+
+
+# A raw connection whose LISTEN fails, as after a dropped connection
+class BrokenConnection:
+    def __init__(self):
+        self.detached = False
+        self.closed = False
+        self.dbapi_connection = self
+
+    def detach(self):
+        self.detached = True
+
+    def cursor(self):
+        raise OSError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine:
+    def __init__(self):
+        self.connections = []
+
+    def raw_connection(self):
+        connection = BrokenConnection()
+        self.connections.append(connection)
+        return connection
+
+
+def test_listener_closes_its_connection_before_reconnecting(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(db, "engine", engine)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise StopListening
+
+    monkeypatch.setattr(events.time, "sleep", sleep)
+    with pytest.raises(StopListening):
+        events._listen()
+
+    assert len(engine.connections) == 3
+    assert all(connection.detached for connection in engine.connections)
+    assert all(connection.closed for connection in engine.connections)
@@ -0,0 +1,83 @@
+# -----------------------------------------------------------------------
+# test_instrumentation.py
+# Tests for query_budget and the statement counting behind it, on an
+# in-memory SQLite engine hooked up like the app's
+# -----------------------------------------------------------------------
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src import instrumentation
+from src.instrumentation import QueryBudgetExceeded, query_budget
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    instrumentation.instrument_engine(engine)
+    return engine
+
+
+@pytest.fixture
+def connection(engine):
+    with engine.connect() as connection:
+        yield connection
+
+
+def run(connection, times, value=1):
+    for _ in range(times):
+        connection.execute(text("SELECT :value"), {"value": value})
+
+
+def test_within_budget_passes(connection):
+    with query_budget(3) as stats:
+        run(connection, 3)
+    assert stats.statements == 3
+
+
+def test_over_budget_fails_and_lists_repeats(connection):
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(2):
+            run(connection, 3)
+    message = str(error.value)
+    assert "3 SQL statements issued, budget is 2" in message
+    assert "3x SELECT ?" in message
+
+
+def test_decorator_form(connection):
+    @query_budget(1)
+    def two_queries():
+        run(connection, 2)
+
+    with pytest.raises(QueryBudgetExceeded):
+        two_queries()
+
+
+def test_error_inside_block_is_not_masked(connection):
+    with pytest.raises(ZeroDivisionError):
+        with query_budget(0):
+            run(connection, 1)
+            1 / 0
+
+
+def test_nested_collectors_see_the_same_statements(connection):
+    with instrumentation.collect() as outer:
+        with query_budget(5) as inner:
+            run(connection, 2, value=1)
+            run(connection, 1, value=2)
+        run(connection, 1)
+    assert inner.statements == 3
+    assert inner.duplicates == 1
+    assert outer.statements == 4
+
+
+def test_failed_statement_leaves_no_stale_start(connection):
+    with instrumentation.collect() as stats:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing_table"))
+        run(connection, 1)
+    assert stats.statements == 2
+    assert connection.info["query_start"] == []
@@ -0,0 +1,108 @@
+# -----------------------------------------------------------------------
+# test_leaderboard.py
+# Tests for the cached leaderboard pages: a repeat visit makes no
+# database calls, and a score change or a daily reset refreshes them
+# -----------------------------------------------------------------------
+
+import collections
+
+import pytest
+
+import app as tigerspot
+from src import cache
+
+# -----------------------------------------------------------------------
+
+
+STUBBED = {
+    tigerspot.user_database: {
+        "get_top_players": [{"username": "alice", "points": 900}],
+        "get_points": 120,
+        "get_rank": 4,
+    },
+    tigerspot.daily_user_database: {
+        "get_daily_top_players": [{"username": "bob", "points": 1500}],
+        "get_daily_points": 60,
+        "get_daily_rank": 2,
+        "get_streak": 3,
+    },
+}
+
+
+# Replaces the leaderboard queries with canned answers and returns how
+# often each one was called
+@pytest.fixture
+def calls(monkeypatch):
+    calls = collections.Counter()
+    for module, answers in STUBBED.items():
+        for name, answer in answers.items():
+
+            def stub(*args, name=name, answer=answer):
+                calls[name] += 1
+                return answer
+
+            monkeypatch.setattr(module, name, stub)
+    return calls
+
+
+@pytest.fixture
+def client(calls):
+    client = tigerspot.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "carol"
+    return client
+
+
+# -----------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("path", ["/totalboard", "/leaderboard"])
+def test_repeat_visit_is_served_from_cache(client, calls, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    queries = sum(calls.values())
+    assert queries > 0
+
+    second = client.get(path)
+    assert second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert sum(calls.values()) == queries
+
+    # a conditional GET is answered without a body
+    etag = second.headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert sum(calls.values()) == queries
+
+
+def test_score_change_refreshes_the_page(client, calls, monkeypatch):
+    client.get("/totalboard")
+    assert calls["get_points"] == 1
+
+    monkeypatch.setattr(
+        tigerspot.user_database,
+        "get_points",
+        lambda username: calls.update(["get_points"]) or 1620,
+    )
+    cache.invalidate("scores")
+    response = client.get("/totalboard")
+    assert calls["get_points"] == 2
+    assert calls["get_top_players"] == 2
+    assert b"1620" in response.get_data()
+
+
+def test_standing_is_cached_per_user(client, calls):
+    client.get("/totalboard")
+    other = tigerspot.app.test_client()
+    with other.session_transaction() as session:
+        session["username"] = "dave"
+    other.get("/totalboard")
+    assert calls["get_points"] == 2
+    assert calls["get_top_players"] == 1
+
+
+def test_player_tag_refreshes_only_that_player(client, calls):
+    client.get("/totalboard")
+    cache.invalidate("player:carol")
+    client.get("/totalboard")
+    assert calls["get_points"] == 2
+    assert calls["get_top_players"] == 1
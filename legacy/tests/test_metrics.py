@@ -0,0 +1,84 @@
+# -----------------------------------------------------------------------
+# test_metrics.py
+# Tests for multi-process metrics: snapshot files of exited workers
+# leave the totals and are removed
+# -----------------------------------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src import metrics
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = metrics.Registry(str(tmp_path))
+    requests = metrics.Counter(registry, "requests_total", "Requests.", ["status"])
+    streams = metrics.Gauge(registry, "streams", "Open streams.")
+    return registry, requests, streams
+
+
+# Returns the pid of a process that has exited
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write_snapshot(directory, pid, start, requests, streams=None):
+    snapshot = {"requests_total": [[["200"], requests]]}
+    if streams is not None:
+        snapshot["streams"] = [[[], streams]]
+    path = os.path.join(directory, f"metrics-{pid}-{start}.json")
+    with open(path, "w") as f:
+        json.dump(snapshot, f)
+    return path
+
+
+# -----------------------------------------------------------------------
+
+
+def test_live_workers_are_summed(registry, tmp_path):
+    registry, requests, streams = registry
+    requests.inc(status="200")
+    # the parent of the test run stands in for another live worker
+    write_snapshot(str(tmp_path), os.getppid(), 1, 4, streams=2)
+    output = registry.render()
+    assert 'requests_total{status="200"} 5' in output
+    assert f'streams{{pid="{os.getppid()}"}} 2' in output
+
+
+def test_exited_workers_leave_the_totals(registry, tmp_path):
+    registry, requests, streams = registry
+    requests.inc(status="200")
+    dead = write_snapshot(str(tmp_path), exited_pid(), 1, 100, streams=3)
+    output = registry.render()
+    assert 'requests_total{status="200"} 1' in output
+    assert "streams{" not in output
+    assert not os.path.exists(dead)
+
+
+def test_reused_pid_keeps_only_the_newest_file(registry, tmp_path):
+    registry, requests, streams = registry
+    pid = os.getppid()
+    old = write_snapshot(str(tmp_path), pid, 1, 100)
+    new = write_snapshot(str(tmp_path), pid, 2, 4)
+    requests.inc(status="200")
+    assert 'requests_total{status="200"} 5' in registry.render()
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+
+
+def test_flush_writes_this_process_file(registry, tmp_path):
+    registry, requests, streams = registry
+    requests.inc(status="500")
+    registry.flush()
+    [path] = tmp_path.glob(f"metrics-{os.getpid()}-*.json")
+    with open(path) as f:
+        assert json.load(f)["requests_total"] == [[["500"], 1]]
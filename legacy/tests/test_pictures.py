@@ -0,0 +1,62 @@
+# -----------------------------------------------------------------------
+# test_pictures.py
+# Tests for the picture of the day: it comes from the date's pinned row,
+# and database errors reach the caller
+# -----------------------------------------------------------------------
+
+import datetime
+
+import pytest
+
+from src import cache
+from src.errors import DatabaseError
+from Databases import pictures_database
+
+TODAY = datetime.date(2026, 10, 19)
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def pinned(monkeypatch):
+    rows = {}
+    calls = []
+
+    # stands in for the daily_pictures row: written once, then read back
+    def pin(date):
+        calls.append(date)
+        return rows.setdefault(date, 40 + len(rows))
+
+    monkeypatch.setattr(pictures_database, "get_current_date", lambda: TODAY)
+    monkeypatch.setattr(pictures_database, "_pin_pic_for_day", pin)
+    return calls
+
+
+def test_picture_is_read_once_per_day(pinned):
+    assert pictures_database.pic_of_day() == 40
+    assert pictures_database.pic_of_day() == 40
+    assert pinned == [TODAY]
+
+
+def test_catalog_change_keeps_the_pinned_picture(pinned):
+    first = pictures_database.pic_of_day()
+    cache.invalidate("pictures")
+    assert pictures_database.pic_of_day() == first
+    assert pinned == [TODAY, TODAY]
+
+
+def test_empty_catalog_serves_picture_one(monkeypatch, caplog):
+    monkeypatch.setattr(pictures_database, "get_current_date", lambda: TODAY)
+    monkeypatch.setattr(pictures_database, "_pin_pic_for_day", lambda date: None)
+    assert pictures_database.pic_of_day() == 1
+    assert "No pictures found" in caplog.text
+
+
+def test_database_errors_propagate(monkeypatch):
+    def broken(date):
+        raise DatabaseError("connection refused")
+
+    monkeypatch.setattr(pictures_database, "get_current_date", lambda: TODAY)
+    monkeypatch.setattr(pictures_database, "_pin_pic_for_day", broken)
+    with pytest.raises(DatabaseError):
+        pictures_database.pic_of_day()
@@ -0,0 +1,104 @@
+# -----------------------------------------------------------------------
+# test_players.py
+# Tests for creating a player's rows: one upsert statement, made at most
+# once per session per day from the menu
+# -----------------------------------------------------------------------
+
+import collections
+import contextlib
+import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app as tigerspot
+from Databases import user_database
+
+# -----------------------------------------------------------------------
+
+TODAY = datetime.date(2026, 3, 2)
+
+
+# Replaces the menu's database calls with stubs and returns how often
+# each one was called
+@pytest.fixture
+def calls(monkeypatch):
+    calls = collections.Counter()
+    stubbed = {
+        tigerspot.user_database: {"ensure_player": "success"},
+        tigerspot.daily_user_database: {
+            "get_last_played_date": TODAY,
+            "reset_player": "success",
+            "player_played": False,
+        },
+        tigerspot.pictures_database: {"pic_of_day": 1, "get_current_date": TODAY},
+    }
+    for module, answers in stubbed.items():
+        for name, answer in answers.items():
+
+            def stub(*args, name=name, answer=answer):
+                calls[name] += 1
+                return answer
+
+            monkeypatch.setattr(module, name, stub)
+    return calls
+
+
+@pytest.fixture
+def client(calls):
+    client = tigerspot.app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "carol"
+    return client
+
+
+# -----------------------------------------------------------------------
+
+
+def test_menu_ensures_the_player_once_a_day(client, calls):
+    assert client.get("/menu").status_code == 200
+    assert client.get("/menu").status_code == 200
+    assert calls["ensure_player"] == 1
+    assert calls["reset_player"] == 0
+
+
+def test_menu_ensures_the_player_again_the_next_day(client, calls, monkeypatch):
+    client.get("/menu")
+    tomorrow = TODAY + datetime.timedelta(days=1)
+    monkeypatch.setattr(
+        tigerspot.pictures_database, "get_current_date", lambda: tomorrow
+    )
+    client.get("/menu")
+    assert calls["ensure_player"] == 2
+    # last played yesterday, so today's daily row is reset
+    assert calls["reset_player"] == 1
+
+
+def test_each_session_ensures_the_player(client, calls):
+    client.get("/menu")
+    other = tigerspot.app.test_client()
+    with other.session_transaction() as session:
+        session["username"] = "carol"
+    other.get("/menu")
+    assert calls["ensure_player"] == 2
+
+
+def test_ensure_player_is_one_statement(monkeypatch):
+    executed = []
+
+    class RecordingSession:
+        def execute(self, statement):
+            executed.append(statement)
+
+    @contextlib.contextmanager
+    def get_session():
+        yield RecordingSession()
+
+    monkeypatch.setattr(user_database, "get_session", get_session)
+    assert user_database.ensure_player("carol") == "success"
+
+    [statement] = executed
+    sql = " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+    assert sql.startswith("WITH new_user AS (INSERT INTO users")
+    assert "INSERT INTO usersdaily" in sql
+    assert sql.count("ON CONFLICT (username) DO NOTHING") == 2
@@ -0,0 +1,129 @@
+# -----------------------------------------------------------------------
+# test_rounds.py
+# Tests for versus round selection, with a stub session standing in for
+# the catalog and seen_pictures queries
+# -----------------------------------------------------------------------
+
+import pytest
+
+from src import rounds
+
+# -----------------------------------------------------------------------
+
+
+# Answers session.scalars() with the rows given for each table
+class StubSession:
+    def __init__(self, ids=(), seen=()):
+        self.ids = list(ids)
+        self.seen = list(seen)
+        self.queries = 0
+
+    def scalars(self, statement):
+        self.queries += 1
+        table = statement.get_final_froms()[0].name
+        return StubResult(self.ids if table == "pictures" else self.seen)
+
+
+class StubResult(list):
+    def all(self):
+        return list(self)
+
+
+def seen_bytes(ids):
+    value = rounds.bitmap(ids)
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+# -----------------------------------------------------------------------
+
+
+def test_bitmap_round_trip():
+    ids = [0, 1, 7, 8, 63, 64, 1000]
+    assert rounds.bitmap_ids(rounds.bitmap(ids)) == ids
+    assert rounds.bitmap([]) == 0
+    assert rounds.bitmap_ids(0) == []
+
+
+def test_catalog_is_cached():
+    session = StubSession(ids=[3, 5, 9])
+    assert rounds.catalog(session) == (3, 9, 3, rounds.bitmap([3, 5, 9]))
+    rounds.catalog(session)
+    assert session.queries == 1
+
+
+def test_seen_by_unions_bitmaps():
+    session = StubSession(seen=[seen_bytes([1, 2]), None, seen_bytes([2, 70])])
+    assert rounds.bitmap_ids(rounds.seen_by(session, ["a", "b", "c"])) == [1, 2, 70]
+    assert rounds.seen_by(session, []) == 0
+
+
+def test_rounds_are_distinct_live_ids():
+    ids = list(range(1, 41))
+    chosen = rounds.select_rounds(StubSession(ids=ids), rng=rounds.rng_for(seed=1))
+    assert len(chosen) == rounds.ROUNDS
+    assert len(set(chosen)) == rounds.ROUNDS
+    assert set(chosen) <= set(ids)
+
+
+def test_avoid_is_respected():
+    ids = list(range(1, 41))
+    avoid = rounds.bitmap(range(1, 31))
+    for seed in range(20):
+        chosen = rounds.select_rounds(
+            StubSession(ids=ids), rng=rounds.rng_for(seed=seed), avoid=avoid
+        )
+        assert all(pictureid > 30 for pictureid in chosen)
+
+
+def test_avoid_is_ignored_when_too_few_remain():
+    ids = list(range(1, 11))
+    avoid = rounds.bitmap(range(1, 8))
+    chosen = rounds.select_rounds(
+        StubSession(ids=ids), rng=rounds.rng_for(seed=2), avoid=avoid
+    )
+    assert len(set(chosen)) == rounds.ROUNDS
+    assert set(chosen) <= set(ids)
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        # dense: every id in the range is live, so random draws are kept
+        list(range(1, 101)),
+        # sparse: a handful of ids spread over a wide range are listed
+        [1, 5000, 10000, 15000, 20000, 25000, 30000],
+    ],
+    ids=["dense", "sparse"],
+)
+def test_dense_and_sparse_catalogs(ids):
+    chosen = rounds.select_rounds(StubSession(ids=ids), rng=rounds.rng_for(seed=3))
+    assert len(set(chosen)) == rounds.ROUNDS
+    assert set(chosen) <= set(ids)
+
+
+def test_small_catalog_repeats_ids():
+    chosen = rounds.select_rounds(StubSession(ids=[4, 9]), rng=rounds.rng_for(seed=4))
+    assert len(chosen) == rounds.ROUNDS
+    assert set(chosen) == {4, 9}
+
+
+def test_empty_catalog_falls_back_to_picture_one():
+    assert rounds.select_rounds(StubSession()) == [1] * rounds.ROUNDS
+
+
+def test_round_seed_makes_challenges_reproducible(monkeypatch):
+    monkeypatch.setattr(rounds, "ROUND_SEED", "load-test")
+    ids = list(range(1, 201))
+
+    def pick(challenge_id):
+        return rounds.select_rounds(
+            StubSession(ids=ids), rng=rounds.rng_for(challenge_id)
+        )
+
+    assert pick(7) == pick(7)
+    assert pick(7) != pick(8)
+
+
+def test_unseeded_rng_is_shared(monkeypatch):
+    monkeypatch.setattr(rounds, "ROUND_SEED", None)
+    assert rounds.rng_for(7) is rounds.rng_for(8)
@@ -0,0 +1,112 @@
+# -----------------------------------------------------------------------
+# test_seen.py
+# Tests for the per-user seen-pictures bitmap: how it is written, and
+# that new challenges draw pictures neither player has seen
+# -----------------------------------------------------------------------
+
+import contextlib
+import types
+
+import pytest
+
+from src import rounds
+from Databases import challenges_database
+from Databases import seen_database
+
+# -----------------------------------------------------------------------
+
+
+# Records the statements a get_session() block executes
+class RecordingSession:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement, parameters=None):
+        self.executed.append((str(statement), parameters))
+
+
+@pytest.fixture
+def session(monkeypatch):
+    recording = RecordingSession()
+
+    @contextlib.contextmanager
+    def get_session():
+        yield recording
+
+    monkeypatch.setattr(seen_database, "get_session", get_session)
+    return recording
+
+
+# Answers the catalog and seen_pictures queries of rounds.py
+class CatalogSession:
+    def __init__(self, ids, seen):
+        self.ids = list(ids)
+        self.seen = seen
+
+    def scalars(self, statement):
+        table = statement.get_final_froms()[0].name
+        return Rows(self.ids if table == "pictures" else self.seen)
+
+
+class Rows(list):
+    def all(self):
+        return list(self)
+
+
+# Returns bitmap bytes with the bits Postgres set_bit(seen, n, 1) sets:
+# bit n % 8 of byte n // 8
+def set_bits(ids):
+    data = bytearray(max(ids) // 8 + 1)
+    for pictureid in ids:
+        data[pictureid // 8] |= 1 << (pictureid % 8)
+    return bytes(data)
+
+
+def challenge(challenge_id=1):
+    return types.SimpleNamespace(
+        id=challenge_id, challenger_id="alice", challengee_id="bob"
+    )
+
+
+# -----------------------------------------------------------------------
+
+
+def test_mark_seen_is_one_upsert(session):
+    assert seen_database.mark_seen("alice", 70) == "success"
+    [(statement, parameters)] = session.executed
+    assert "ON CONFLICT (username) DO UPDATE" in statement
+    assert "set_bit" in statement
+    assert parameters == {"username": "alice", "pictureid": 70}
+
+
+@pytest.mark.parametrize("pictureid", [None, -1])
+def test_mark_seen_skips_pictures_without_an_id(session, pictureid):
+    assert seen_database.mark_seen("alice", pictureid) == "success"
+    assert session.executed == []
+
+
+def test_bitmap_matches_postgres_set_bit():
+    ids = [0, 7, 8, 70, 1000]
+    assert rounds.bitmap(ids) == int.from_bytes(set_bits(ids), "little")
+
+
+def test_challenge_avoids_pictures_either_player_saw():
+    ids = list(range(1, 51))
+    # alice saw 1-20 and bob 21-40, so only 41-50 are new to both
+    seen = [set_bits(range(1, 21)), set_bits(range(21, 41))]
+    for challenge_id in range(10):
+        chosen = challenges_database.create_random_versus(
+            CatalogSession(ids, seen), challenge(challenge_id)
+        )
+        assert len(set(chosen)) == rounds.ROUNDS
+        assert all(pictureid > 40 for pictureid in chosen)
+
+
+def test_players_who_saw_almost_everything_still_get_a_game():
+    ids = list(range(1, 51))
+    seen = [set_bits(range(1, 48)), set_bits([48])]
+    chosen = challenges_database.create_random_versus(
+        CatalogSession(ids, seen), challenge()
+    )
+    assert len(set(chosen)) == rounds.ROUNDS
+    assert set(chosen) <= set(ids)
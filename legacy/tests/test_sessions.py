@@ -0,0 +1,142 @@
+# -----------------------------------------------------------------------
+# test_sessions.py
+# Tests for server-side sessions: the cookie is only an id, the id
+# changes on login, and sessions can be revoked
+# -----------------------------------------------------------------------
+
+import flask
+import pytest
+
+from src import sessions
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def backend():
+    return sessions.create_backend("memory://")
+
+
+@pytest.fixture
+def app(backend):
+    app = flask.Flask(__name__)
+    app.secret_key = "tests"
+    app.session_interface = sessions.ServerSideSessionInterface(backend)
+
+    @app.route("/login/<username>")
+    def login(username):
+        flask.session["username"] = username
+        return "ok"
+
+    @app.route("/logout")
+    def logout():
+        flask.session.clear()
+        return "ok"
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        flask.session["value"] = value
+        return "ok"
+
+    @app.route("/whoami")
+    def whoami():
+        return flask.jsonify(
+            {
+                "username": flask.session.get("username"),
+                "value": flask.session.get("value"),
+            }
+        )
+
+    return app
+
+
+def sid(client):
+    cookie = client.get_cookie("session")
+    return cookie.value if cookie else None
+
+
+# -----------------------------------------------------------------------
+
+
+def test_cookie_holds_only_an_id(app, backend):
+    client = app.test_client()
+    client.get("/set/secret")
+    value = sid(client)
+    assert sessions._SID.match(value)
+    assert "secret" not in value
+    data, _, _ = backend.get("session:" + value)
+    assert data == {"value": "secret"}
+
+
+def test_data_round_trips(app):
+    client = app.test_client()
+    client.get("/login/alice")
+    client.get("/set/42")
+    assert client.get("/whoami").get_json() == {"username": "alice", "value": "42"}
+
+
+def test_unchanged_session_sets_no_cookie(app):
+    client = app.test_client()
+    client.get("/login/alice")
+    response = client.get("/whoami")
+    assert "Set-Cookie" not in response.headers
+
+
+def test_forged_or_unknown_ids_get_a_fresh_session(app):
+    client = app.test_client()
+    for value in ("not-a-valid-id", "A" * 24):
+        client.set_cookie("session", value)
+        assert client.get("/whoami").get_json()["username"] is None
+
+
+def test_login_rotates_the_id(app, backend):
+    client = app.test_client()
+    client.get("/set/before")
+    before = sid(client)
+    client.get("/login/alice")
+    after = sid(client)
+    assert after != before
+    assert backend.get("session:" + before) is None
+
+    # the id known before login does not carry the login
+    other = app.test_client()
+    other.set_cookie("session", before)
+    assert other.get("/whoami").get_json()["username"] is None
+
+
+def test_logout_deletes_the_data(app, backend):
+    client = app.test_client()
+    client.get("/login/alice")
+    value = sid(client)
+    client.get("/logout")
+    assert backend.get("session:" + value) is None
+    assert sid(client) is None
+
+
+def test_revoke_ends_one_session(app, backend):
+    first, second = app.test_client(), app.test_client()
+    first.get("/login/alice")
+    second.get("/login/alice")
+    sessions.revoke(backend, sid(first))
+    assert first.get("/whoami").get_json()["username"] is None
+    assert second.get("/whoami").get_json()["username"] == "alice"
+
+
+def test_revoke_user_ends_older_sessions(app, backend):
+    alice, bob = app.test_client(), app.test_client()
+    alice.get("/login/alice")
+    bob.get("/login/bob")
+    sessions.revoke_user(backend, "alice")
+    assert alice.get("/whoami").get_json()["username"] is None
+    assert bob.get("/whoami").get_json()["username"] == "bob"
+
+    # signing in again after the revocation works
+    alice.get("/login/alice")
+    assert alice.get("/whoami").get_json()["username"] == "alice"
+
+
+def test_init_app_keeps_cookie_sessions_without_a_store():
+    app = flask.Flask(__name__)
+    default = app.session_interface
+    sessions.init_app(app, url=None)
+    assert app.session_interface is default
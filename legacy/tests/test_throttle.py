@@ -0,0 +1,122 @@
+# -----------------------------------------------------------------------
+# test_throttle.py
+# Tests for src/throttle.py: the per-user token bucket and coalescing of
+# duplicate submissions
+# -----------------------------------------------------------------------
+
+import threading
+import time
+
+import flask
+import pytest
+
+from src import cache
+from src import throttle
+
+# -----------------------------------------------------------------------
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+    app.secret_key = "tests"
+
+    @app.route("/submit", methods=["POST"])
+    @throttle.rate_limited("daily")
+    def submit():
+        return "ok"
+
+    api = flask.Blueprint("api", __name__, url_prefix="/api/v1")
+
+    @api.route("/daily", methods=["POST"])
+    @throttle.rate_limited("daily")
+    def daily_guess():
+        return flask.jsonify({"ok": True})
+
+    app.register_blueprint(api)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["username"] = "player"
+    return client
+
+
+def test_burst_then_429_with_retry_after(client):
+    for _ in range(throttle.RATE_LIMIT_BURST):
+        assert client.post("/submit").status_code == 200
+
+    response = client.post("/submit")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_html_route_and_api_twin_share_the_bucket(client):
+    for _ in range(throttle.RATE_LIMIT_BURST):
+        assert client.post("/submit").status_code == 200
+
+    response = client.post("/api/v1/daily")
+    assert response.status_code == 429
+    assert response.get_json() == {"error": "too many requests"}
+
+
+def test_tokens_come_back_at_the_rate():
+    for _ in range(2):
+        assert throttle.take_token("daily", "player", burst=2, rate=20) == 0
+    assert throttle.take_token("daily", "player", burst=2, rate=20) > 0
+    time.sleep(0.06)
+    assert throttle.take_token("daily", "player", burst=2, rate=20) == 0
+
+
+def test_users_have_separate_buckets():
+    assert throttle.take_token("daily", "a", burst=1) == 0
+    assert throttle.take_token("daily", "a", burst=1) > 0
+    assert throttle.take_token("daily", "b", burst=1) == 0
+
+
+def test_page_cache_churn_does_not_evict_buckets():
+    assert throttle.take_token("daily", "player", burst=1) == 0
+    page_cache = cache.get_backend()
+    for i in range(page_cache.max_entries * 2):
+        page_cache.set(f"page:{i}", i)
+    assert throttle.take_token("daily", "player", burst=1) > 0
+
+
+# -----------------------------------------------------------------------
+
+
+def test_concurrent_coalesce_runs_fn_once():
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"points": 900}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(throttle.coalesce("k", slow)))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.append(throttle.coalesce("k", slow)))
+    second.start()
+    first.join()
+    second.join()
+
+    assert len(calls) == 1
+    assert results == [{"points": 900}, {"points": 900}]
+
+
+def test_later_duplicate_reuses_the_result():
+    calls = []
+    throttle.coalesce("k", lambda: calls.append(1) or "first")
+    assert throttle.coalesce("k", lambda: calls.append(1) or "second") == "first"
+    assert len(calls) == 1
+
+
+def test_failed_call_stores_nothing():
+    def boom():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        throttle.coalesce("k", boom)
+    assert throttle.coalesce("k", lambda: "retried") == "retried"